@@ -4,19 +4,14 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+from startup import Startup, timed_import
+
 import streamlit as st
-import pandas as pd
 import numpy as np
 import time
-import plotly.graph_objects as go
-import plotly.express as px
-import networkx as nx
-from datetime import datetime
 
-# Direct imports
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
-from neo4j import GraphDatabase
+# Heavy packages (sentence_transformers/torch, pinecone, neo4j, plotly, networkx) are
+# imported lazily with timed_import: in the startup loaders, or where a graph is drawn
 
 # --- 1. ENTERPRISE DASHBOARD CSS ---
 st.set_page_config(
@@ -60,6 +55,10 @@ st.markdown("""
     .search-wrapper { display: flex; gap: 0.5rem; align-items: center; }
     
     .hint-pills { display: flex; gap: 0.5rem; margin-top: 1rem; flex-wrap: wrap; }
+    .status-row { display: flex; gap: 0.4rem; margin: -0.5rem 0 1rem; flex-wrap: wrap; }
+    .status-chip { background: #f8fafc; color: #64748b; padding: 0.2rem 0.8rem; border-radius: 30px; font-size: 0.7rem; border: 1px solid #e2e8f0; }
+    .status-ready { color: #047857; border-color: #a7f3d0; }
+    .status-failed { color: #b91c1c; border-color: #fecaca; }
     .pill { background: #f1f5f9; color: #475569; padding: 0.4rem 1.2rem; border-radius: 30px; font-size: 0.8rem; border: 1px solid #e2e8f0; transition: all 0.2s; cursor: pointer; }
     .pill:hover { background: #0f172a; color: white; border-color: #0f172a; }
     
@@ -115,6 +114,11 @@ else:
     os.environ['PINECONE_API_KEY'] = 'pcsk_2Z2XfF_2fHGYkbAZRLjxFZcYZB7RW6cFSr9WrKxdR5pYpqkawSEKJdpxnA4UcnY3jTu7dp'
 
 PINECONE_INDEX = "enron-enterprise-kg"
+SEARCH_RESULTS = 5
+# Hits taken from each retriever (vector, BM25) before rank fusion
+HYBRID_CANDIDATES = 20
+# Graphs with more nodes than this show names on hover only
+GRAPH_LABEL_LIMIT = 60
 
 if "NEO4J_URI" in st.secrets:
     NEO4J_URI = st.secrets["NEO4J_URI"]
@@ -130,36 +134,163 @@ if 'searched' not in st.session_state: st.session_state.searched = False
 if 'query' not in st.session_state: st.session_state.query = ""
 if 'entity' not in st.session_state: st.session_state.entity = None
 if 'results' not in st.session_state: st.session_state.results = []
+if 'neighborhoods' not in st.session_state: st.session_state.neighborhoods = {}
+if 'timings' not in st.session_state: st.session_state.timings = {}
 if 'hint_index' not in st.session_state:
     st.session_state.hint_index = 0
     st.session_state.last_hint = time.time()
 
 # --- 4. SYSTEM INIT ---
-@st.cache_resource
-def load_systems():
-    systems = {"model": None, "pinecone": None, "neo4j": None}
+# Every subsystem loads on a background thread; the page renders with whatever is ready
+NEO4J_CONNECT_TIMEOUT = 10
+# How long a search waits for a still-loading model / index before running without it
+SEARCH_WARMUP_WAIT = 30
+
+def load_model(startup):
+    SentenceTransformer = timed_import('sentence_transformers').SentenceTransformer
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model.encode("warm-up")  # first inference pays for lazy kernel init; do it before a user does
+    return model
+
+def connect_pinecone(startup):
+    return timed_import('pinecone').Pinecone(api_key=os.environ['PINECONE_API_KEY'])
+
+def load_vector_stores(startup):
+    # Vector stores in query order: the configured backend first, the other as fallback
+    vector_store = timed_import('vector_store')
+    stores = {}
+    pc = startup.wait('pinecone')
+    if pc:
+        stores['pinecone'] = vector_store.PineconeStore(PINECONE_INDEX, client=pc)
     try:
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        systems["model"] = model
+        stores['faiss'] = vector_store.FaissStore()
     except Exception: pass
-    
+    order = sorted(stores, key=lambda name: name != vector_store.DEFAULT_BACKEND)
+    return [stores[name] for name in order] or None
+
+def connect_neo4j(startup):
+    GraphDatabase = timed_import('neo4j').GraphDatabase
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), connection_timeout=NEO4J_CONNECT_TIMEOUT)
+    driver.verify_connectivity()
+    return driver
+
+def load_local_graph(startup):
+    # In-process CSR graph over the corpus edge table, used when Neo4j is unavailable
+    return timed_import('csr_graph').load_graph()
+
+def load_entities(startup):
+    # Person directory + display-name aliases for entity detection, rebuilt when the graph changes
+    graph = startup.wait('local_graph')
+    return timed_import('entity_index').load_entity_index(graph) if graph is not None else None
+
+def load_rollups(startup):
+    # Day/week/month message counts for the trend KPIs, caught up with the corpus first
+    temporal_rollups = timed_import('temporal_rollups')
     try:
-        pc = Pinecone(api_key=os.environ['PINECONE_API_KEY'])
-        systems["pinecone"] = pc
+        temporal_rollups.update_rollups()
     except Exception: pass
-    
+    return temporal_rollups.open_rollups()
+
+def load_lexical(startup):
+    # BM25 keyword index (built with the embeddings), fused with the vector results
+    import path_config
+    return timed_import('lexical_index').LexicalIndex.load(path_config.LEXICAL_INDEX_DIR)
+
+def load_thread_index(startup):
+    # Reconstructed conversation threads, joined to search results by msg_id
+    return timed_import('thread_index').load_threads()
+
+SUBSYSTEMS = {
+    "model": ("Embedding model", load_model),
+    "pinecone": ("Pinecone", connect_pinecone),
+    "vector_stores": ("Vector stores", load_vector_stores),
+    "neo4j": ("Neo4j", connect_neo4j),
+    "local_graph": ("Local graph", load_local_graph),
+    "entities": ("Entity index", load_entities),
+    "rollups": ("Rollups", load_rollups),
+    "lexical": ("BM25 index", load_lexical),
+    "threads": ("Threads", load_thread_index),
+}
+
+@st.cache_resource
+def get_startup():
+    """Starts every subsystem loader once per process"""
     try:
-        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-        driver.verify_connectivity()
-        systems["neo4j"] = driver
-    except Exception: pass
-    
-    return systems
+        import path_config
+        log_file = path_config.STARTUP_LOG_FILE
+    except Exception:
+        log_file = None
+    return Startup({name: loader for name, (_, loader) in SUBSYSTEMS.items()}, log_file=log_file).start()
+
+@st.cache_resource
+def load_edge_table():
+    """Pre-split sender->recipient edges from the corpus, sorted by msg_id"""
+    try:
+        import path_config
+        edges = path_config.load_corpus(columns=['msg_id', 'sender', 'recipient'], table='edges')
+        return edges.sort_values('msg_id', kind='stable').reset_index(drop=True)
+    except Exception:
+        return None
+
+def message_edges(edges, msg_id):
+    """(sender, recipient) pairs of one message, found by binary search on msg_id"""
+    ids = edges['msg_id'].values
+    lo, hi = np.searchsorted(ids, msg_id, 'left'), np.searchsorted(ids, msg_id, 'right')
+    return list(zip(edges['sender'].values[lo:hi], edges['recipient'].values[lo:hi]))
+
+@st.cache_resource
+def get_query_cache():
+    """Query embedding / search result caches shared by every session in this process"""
+    from query_cache import QueryCache
+    return QueryCache()
+
+def match_to_result(match):
+    """Search result row for the dashboard from a vector-store / BM25 match"""
+    metadata = match.get('metadata', {})
+    # BUG FIX 2: Catch-all for metadata keys regardless of capitalization
+    return {
+        'from': metadata.get('From', metadata.get('from', metadata.get('Sender', 'Unknown'))),
+        'to': metadata.get('To', metadata.get('to', metadata.get('Receiver', 'Unknown'))),
+        'subject': metadata.get('Subject', metadata.get('subject', 'No Subject')),
+        'date': metadata.get('Date', metadata.get('date', 'Unknown')),
+        'content': metadata.get('text', metadata.get('Body', metadata.get('body', '')))[:500],
+        'score': match.get('score', 0.0),
+        'msg_id': metadata.get('msg_id')
+    }
+
+@st.cache_resource
+def get_search_pipeline():
+    """Concurrent search (vector + BM25 + graph prefetch) shared by every session.
+
+    One pipeline for the life of the process; each run swaps in the backends
+    that are ready (set_backends), so no pool is ever orphaned.
+    """
+    from search_pipeline import SearchPipeline
+    try:
+        import path_config
+        timings_file = path_config.SEARCH_TIMINGS_FILE
+    except Exception:
+        timings_file = None
+    return SearchPipeline(cache=get_query_cache(), top_k=SEARCH_RESULTS, candidates=HYBRID_CANDIDATES,
+                          timings_file=timings_file)
+
+@st.cache_resource
+def get_graph_layout():
+    """Layout engine shared by every session: cached by graph fingerprint, warm-started between views"""
+    from graph_layout import GraphLayout
+    return GraphLayout()
 
-systems = load_systems()
+startup = get_startup()
+systems = startup.snapshot()
+query_cache = get_query_cache()
 model = systems["model"]
-pinecone_client = systems["pinecone"]
+vector_stores = systems["vector_stores"] or []
 neo4j_driver = systems["neo4j"]
+local_graph = systems["local_graph"]
+rollups = systems["rollups"]
+threads = systems["threads"]
+lexical = systems["lexical"]
+entities = systems["entities"]
 
 hints = [
     "🔍 Try: jeff dasovich energy trading",
@@ -172,58 +303,65 @@ hints = [
 def detect_entity(results):
     if not results: return None
     # BUG FIX 1: We must return the full email so Neo4j can find them!
-    entity_keywords = {
-        "jeff.dasovich@enron.com": ["jeff", "dasovich"],
-        "kenneth.lay@enron.com": ["kenneth", "lay", "ken lay"],
-        "jeff.skilling@enron.com": ["skilling"],
-        "sherron.watkins@enron.com": ["sherron", "watkins"],
-        "andy.zipper@enron.com": ["zipper", "andy"],
-        "greg.whalley@enron.com": ["whalley", "greg"],
-        "john.arnold@enron.com": ["arnold", "john"]
-    }
-    
-    scores = {e: 0 for e in entity_keywords}
-    for r in results:
-        text = f"{r.get('subject', '')} {r.get('content', '')}".lower()
-        sender = r.get('from', '').lower()
-        for entity, keywords in entity_keywords.items():
-            for k in keywords:
-                if k in sender: scores[entity] += 3
-                elif k in text: scores[entity] += 1
-                
-    if max(scores.values()) > 0:
-        return max(scores.items(), key=lambda x: x[1])[0]
-    return None
+    # Every person in the graph, matched by address, name and header display names in one pass
+    if entities is not None:
+        return entities.detect(results)
 
-def get_graph_data(entity_name=None, search_results=None):
-    G = nx.Graph()
-    
-    # 1. Try fetching real relations from Neo4j
-    if neo4j_driver and entity_name:
+    # No entity index: the most frequent sender of the results
+    senders = [str(r.get('from', '')).strip().lower() for r in results]
+    senders = [s for s in senders if '@' in s]
+    return max(set(senders), key=senders.count) if senders else None
+
+def fetch_neighborhood(email):
+    """[(source, target, weight)] of a person's heaviest contacts: Neo4j first, else the local graph"""
+    edges = []
+    if neo4j_driver:
         try:
             with neo4j_driver.session() as session:
                 query = """
-                MATCH (p:Person {email: $email})-[r:SENT]-(connected)
-                RETURN p.email as source, connected.email as target, count(r) as weight
+                MATCH (p:Person {email: $email})-[c:COMMUNICATES]-(connected)
+                RETURN p.email as source, connected.email as target, sum(c.count) as weight
+                ORDER BY weight DESC
                 LIMIT 25
                 """
-                result = session.run(query, email=entity_name)
-                for record in result:
-                    G.add_edge(record['source'], record['target'], weight=record.get('weight', 1))
+                result = session.run(query, email=email)
+                edges = [(record['source'], record['target'], record.get('weight', 1)) for record in result]
         except: pass
 
+    # No Neo4j: the same neighborhood from the local graph engine
+    if not edges and local_graph is not None:
+        edges = [(email, target, weight) for target, weight in local_graph.neighbors(email, limit=25)]
+    return edges
+
+def get_graph_data(entity_name=None, search_results=None, neighborhood=None):
+    """neighborhood: the entity's edges if the search pipeline already fetched them"""
+    nx = timed_import('networkx')
+    G = nx.Graph()
+    
+    # 1. Real relations of the entity (Neo4j, else the local graph engine)
+    if entity_name:
+        if neighborhood is None:
+            neighborhood = fetch_neighborhood(entity_name)
+        for source, target, weight in neighborhood:
+            G.add_edge(source, target, weight=weight)
+
     # BUG FIX 3: Dynamic Graph Fallback! If Neo4j is empty, build a graph from Pinecone search results!
     if len(G.nodes()) == 0 and search_results:
+        edges = load_edge_table()
         for res in search_results:
-            src = res.get('from', 'Unknown')
-            tgt = res.get('to', 'Unknown')
-            if src != 'Unknown' and tgt != 'Unknown':
-                # Target can sometimes be a comma-separated list
-                targets = [t.strip() for t in str(tgt).split(',')] if tgt else []
-                for t in targets[:3]: # Limit to avoid massive tangles
-                    if src and t and src != t:
-                        if G.has_edge(src, t): G[src][t]['weight'] += 1
-                        else: G.add_edge(src, t, weight=1)
+            if edges is not None and res.get('msg_id') is not None:
+                # Recipients were already split and normalized by milestone 1
+                pairs = message_edges(edges, int(res['msg_id']))
+            else:
+                src = res.get('from', 'Unknown')
+                tgt = res.get('to', 'Unknown')
+                if src == 'Unknown' or tgt == 'Unknown': continue
+                # Legacy vectors without msg_id: target can be a comma-separated list
+                pairs = [(src, t.strip()) for t in str(tgt).split(',')] if tgt else []
+            for src, t in pairs[:3]: # Limit to avoid massive tangles
+                if src and t and src != t:
+                    if G.has_edge(src, t): G[src][t]['weight'] += 1
+                    else: G.add_edge(src, t, weight=1)
 
     # 3. Final Fallback (If both databases fail)
     if len(G.nodes()) == 0:
@@ -248,10 +386,54 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-st.markdown("""
+@st.experimental_fragment(run_every=None if startup.settled else 1)
+def readiness():
+    """Per-subsystem status; refreshes itself until startup settles, then reruns the page once"""
+    chips = []
+    for name, state, seconds, error in startup.status():
+        label = SUBSYSTEMS[name][0]
+        if state == 'ready':
+            chips.append(f'<span class="status-chip status-ready">● {label} · {seconds:.1f}s</span>')
+        elif state == 'loading':
+            chips.append(f'<span class="status-chip">◌ {label} · loading</span>')
+        else:
+            title = error or 'not configured'
+            css = 'status-failed' if state == 'failed' else ''
+            chips.append(f'<span class="status-chip {css}" title="{title}">✕ {label} · {state}</span>')
+    st.markdown(f'<div class="status-row">{"".join(chips)}</div>', unsafe_allow_html=True)
+    # Startup moved on since this page run: rerun the page so it uses the new subsystems
+    if (startup.ready(), startup.settled) != page_state:
+        st.rerun()
+
+page_state = (startup.ready(), startup.settled)
+readiness()
+
+def trend(value, suffix=""):
+    """Up/down arrow span for a KPI delta"""
+    if value is None:
+        return '<span>→ n/a</span>'
+    if value == 0:
+        return '<span>→ stable</span>'
+    css, arrow = ("trend-up", "↑") if value > 0 else ("trend-down", "↓")
+    amount = f"{abs(value):,.1f}" if isinstance(value, float) else f"{abs(value):,}"
+    return f'<span class="{css}">{arrow} {amount}{suffix}</span>'
+
+try:
+    kpis = rollups.kpis() if rollups else None
+except Exception:
+    kpis = None
+
+if kpis:
+    communications_card = f'<div class="kpi-card"><div class="kpi-label">Total Communications</div><div class="kpi-value">{kpis["total"]:,}</div><div class="kpi-trend">{trend(kpis["month_change_pct"], "%")} vs last month</div></div>'
+    participants_card = f'<div class="kpi-card"><div class="kpi-label">Active Participants</div><div class="kpi-value">{kpis["active_people"]:,}</div><div class="kpi-trend">{trend(kpis["new_people_week"])} new this week</div></div>'
+else:
+    communications_card = '<div class="kpi-card"><div class="kpi-label">Total Communications</div><div class="kpi-value">2,547</div><div class="kpi-trend"><span class="trend-up">↑ 12.3%</span> vs last month</div></div>'
+    participants_card = '<div class="kpi-card"><div class="kpi-label">Active Participants</div><div class="kpi-value">158</div><div class="kpi-trend"><span class="trend-up">↑ 8</span> new this week</div></div>'
+
+st.markdown(f"""
 <div class="kpi-grid">
-    <div class="kpi-card"><div class="kpi-label">Total Communications</div><div class="kpi-value">2,547</div><div class="kpi-trend"><span class="trend-up">↑ 12.3%</span> vs last month</div></div>
-    <div class="kpi-card"><div class="kpi-label">Active Participants</div><div class="kpi-value">158</div><div class="kpi-trend"><span class="trend-up">↑ 8</span> new this week</div></div>
+    {communications_card}
+    {participants_card}
     <div class="kpi-card"><div class="kpi-label">Key Topics</div><div class="kpi-value">24</div><div class="kpi-trend"><span>→ stable</span></div></div>
     <div class="kpi-card"><div class="kpi-label">Risk Score</div><div class="kpi-value">35%</div><div class="kpi-trend"><span class="trend-up">↑ 5%</span> increase</div></div>
 </div>
@@ -273,37 +455,49 @@ if search and query:
     st.session_state.searched = True
     st.session_state.query = query
     
+    # First search on a fresh process: give the model and indexes a bounded chance to finish loading
+    if not all(startup.subsystems[name].done.is_set() for name in ('model', 'vector_stores', 'lexical')):
+        with st.spinner("⏳ Warming up search..."):
+            deadline = time.time() + SEARCH_WARMUP_WAIT
+            for name in ('model', 'vector_stores', 'lexical'):
+                startup.wait(name, timeout=max(0.0, deadline - time.time()))
+        model, vector_stores, lexical = startup.get('model'), startup.get('vector_stores') or [], startup.get('lexical')
+
     with st.spinner("🔍 Scanning Vector Space..."):
-        if model and pinecone_client:
-            try:
-                index = pinecone_client.Index(PINECONE_INDEX)
-                query_embedding = model.encode(query).tolist()
-                pinecone_results = index.query(vector=query_embedding, top_k=5, include_metadata=True)
-                
-                results = []
-                for match in pinecone_results.get('matches', []):
-                    metadata = match.get('metadata', {})
-                    # BUG FIX 2: Catch-all for metadata keys regardless of capitalization
-                    results.append({
-                        'from': metadata.get('From', metadata.get('from', metadata.get('Sender', 'Unknown'))),
-                        'to': metadata.get('To', metadata.get('to', metadata.get('Receiver', 'Unknown'))),
-                        'subject': metadata.get('Subject', metadata.get('subject', 'No Subject')),
-                        'date': metadata.get('Date', metadata.get('date', 'Unknown')),
-                        'content': metadata.get('text', metadata.get('Body', metadata.get('body', '')))[:500],
-                        'score': match.get('score', 0.0)
-                    })
-                st.session_state.results = results
-            except Exception as e:
-                st.error(f"Pinecone Search Error: {e}")
+        if (model and vector_stores) or lexical is not None:
+            # Vector search, BM25 and the neighborhood prefetch run concurrently, each within its deadline
+            pipeline = get_search_pipeline()
+            pipeline.set_backends(model, vector_stores, lexical, fetch_neighborhood)
+            response = pipeline.run(query, entity_fn=lambda matches: detect_entity([match_to_result(m) for m in matches]))
+            st.session_state.timings = response.timings
+
+            if response.matches is None:
+                st.error(f"Vector Search Error: {'; '.join(response.errors)}")
                 st.session_state.results = []
+            else:
+                if response.errors:
+                    st.warning(f"Partial results: {'; '.join(response.errors)}")
+                results = [match_to_result(match) for match in response.matches[:SEARCH_RESULTS]]
+                # Thread size, participants and time span of each hit, looked up by msg_id
+                if threads is not None:
+                    msg_ids = [r['msg_id'] if r['msg_id'] is not None else -1 for r in results]
+                    thread_ids = threads.thread_of(msg_ids)
+                    rows = threads.lookup(thread_ids[thread_ids >= 0])
+                    for r, tid in zip(results, thread_ids):
+                        r['thread'] = rows.get(int(tid))
+                st.session_state.results = results
+            st.session_state.entity = response.entity
+            st.session_state.neighborhoods = response.neighborhoods
         else:
             st.warning("Models unavailable.")
-            
-    st.session_state.entity = detect_entity(st.session_state.results)
-    st.rerun()
+            st.session_state.entity = detect_entity(st.session_state.results)
+            st.session_state.neighborhoods = {}
 
 # ========== RENDER RESULTS ==========
 if st.session_state.searched and st.session_state.results:
+    nx = timed_import('networkx')
+    go = timed_import('plotly.graph_objects')
+    COMMUNITY_COLORS = timed_import('plotly.colors').qualitative.Safe
     st.markdown('<div class="dashboard-grid">', unsafe_allow_html=True)
     
     # --- LEFT PANE ---
@@ -313,6 +507,11 @@ if st.session_state.searched and st.session_state.results:
     for r in st.session_state.results:
         avatar = str(r['from'])[0].upper() if r['from'] and r['from'] != 'Unknown' else '?'
         clean_name = str(r['from']).split('@')[0] if '@' in str(r['from']) else r['from']
+        thread_tag = ""
+        if r.get('thread') and r['thread']['size'] > 1:
+            t = r['thread']
+            span = 0 if np.isnan(t['first_ts']) else (t['last_ts'] - t['first_ts']) / 86400
+            thread_tag = f'<span class="meta-tag">🧵 {t["size"]} messages · {t["participant_count"]} people · {span:.0f} days</span>'
         st.markdown(f"""
         <div class="result-item">
             <div class="result-header">
@@ -321,7 +520,7 @@ if st.session_state.searched and st.session_state.results:
             </div>
             <div class="result-subject">{r['subject']}</div>
             <div class="result-preview">{r['content'][:200]}...</div>
-            <div class="result-meta"><span class="meta-tag">📊 {r['score']*100:.0f}% match</span></div>
+            <div class="result-meta"><span class="meta-tag">📊 {r['score']*100:.0f}% match</span>{thread_tag}</div>
         </div>
         """, unsafe_allow_html=True)
     st.markdown('</div></div></div>', unsafe_allow_html=True)
@@ -331,15 +530,24 @@ if st.session_state.searched and st.session_state.results:
     
     # Generate Graph
     graph_entity = st.session_state.entity if st.session_state.entity else ""
-    G = get_graph_data(graph_entity, st.session_state.results)
+    G = get_graph_data(graph_entity, st.session_state.results, st.session_state.neighborhoods.get(graph_entity))
     
     st.markdown('<div class="card"><div class="card-header"><h3>🕸️ Knowledge Graph</h3><span class="card-badge">Live Topology</span></div><div class="card-body">', unsafe_allow_html=True)
     
+    # Precomputed Louvain communities: color by community, optionally keep only the entity's
+    community = {}
+    if local_graph is not None and local_graph.community is not None:
+        community = {node: local_graph.community_of(node) for node in G.nodes()}
+        entity_community = community.get(st.session_state.entity, -1)
+        if entity_community >= 0 and st.checkbox("Only show the entity's community", key="community_filter"):
+            G = G.subgraph([node for node, c in community.items() if c == entity_community]).copy()
+
     if len(G.nodes()) > 0:
-        pos = nx.spring_layout(G, k=1.5, iterations=50)
-        edge_trace = []
-        for e in G.edges():
-            edge_trace.append(go.Scatter(x=[pos[e[0]][0], pos[e[1]][0], None], y=[pos[e[0]][1], pos[e[1]][1], None], mode='lines', line=dict(width=1.5, color='#cbd5e1'), hoverinfo='none'))
+        pos = get_graph_layout().layout(G.nodes(), G.edges(data='weight', default=1))
+        # Every edge in one trace (segments separated by gaps) instead of a trace per edge
+        from graph_layout import edge_coordinates
+        edge_x, edge_y = edge_coordinates(pos, list(G.edges()))
+        edge_trace = [go.Scatter(x=edge_x, y=edge_y, mode='lines', line=dict(width=1.5, color='#cbd5e1'), hoverinfo='none')]
             
         node_x, node_y, node_text, node_color, node_size = [], [], [], [], []
         for node in G.nodes():
@@ -349,10 +557,16 @@ if st.session_state.searched and st.session_state.results:
             
             if st.session_state.entity and node == st.session_state.entity:
                 node_color.append('#ef4444'); node_size.append(35)
+            elif community.get(node, -1) >= 0:
+                node_color.append(COMMUNITY_COLORS[community[node] % len(COMMUNITY_COLORS)]); node_size.append(25)
             else:
                 node_color.append('#3b82f6'); node_size.append(25)
                 
-        node_trace = go.Scatter(x=node_x, y=node_y, mode='markers+text', text=node_text, textposition="top center", textfont=dict(size=10, color='#1e293b'), marker=dict(size=node_size, color=node_color, line=dict(width=2, color='white')))
+        # Large neighborhoods: names on hover only, smaller markers
+        labeled = len(node_x) <= GRAPH_LABEL_LIMIT
+        if not labeled:
+            node_size = [max(8, size // 3) for size in node_size]
+        node_trace = go.Scatter(x=node_x, y=node_y, mode='markers+text' if labeled else 'markers', text=node_text, hoverinfo='text', textposition="top center", textfont=dict(size=10, color='#1e293b'), marker=dict(size=node_size, color=node_color, line=dict(width=2 if labeled else 1, color='white')))
         
         fig = go.Figure(data=edge_trace + [node_trace], layout=go.Layout(showlegend=False, xaxis=dict(visible=False), yaxis=dict(visible=False), height=350, margin=dict(l=0, r=0, t=0, b=0), plot_bgcolor='white'))
         st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
@@ -364,14 +578,30 @@ if st.session_state.searched and st.session_state.results:
     stats = [{"label": "Network Size", "value": f"{len(G.nodes())} nodes", "desc": f"{len(G.edges())} edges"}, {"label": "Density", "value": f"{nx.density(G):.2f}", "desc": "Live Metric"}]
     for s in stats: st.markdown(f'<div class="stat-item"><div class="stat-label">{s["label"]}</div><div class="stat-value">{s["value"]}</div><div class="stat-desc">{s["desc"]}</div></div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
+
+    timings = st.session_state.timings
+    if timings:
+        if timings.get('cached'):
+            latency = f"⏱️ {timings['total']:.0f} ms · served from cache"
+        else:
+            latency = f"⏱️ {timings['total']:.0f} ms · vector {timings.get('vector', 0):.0f} · bm25 {timings.get('bm25', 0):.0f}"
+        if 'graph_wait' in timings:
+            latency += f" · graph {timings['graph_wait']:.0f} ({'prefetched' if timings.get('prefetch_hit') else 'on demand'})"
+        st.caption(latency)
     
     # Entity Panel
     if st.session_state.entity:
+        # Precomputed per-person scores: a binary search and two array reads
+        scores = local_graph.centrality(st.session_state.entity) if local_graph is not None else {}
+        score_rows = "".join(
+            f'<div class="entity-row"><span class="entity-label">{label}</span><span class="entity-value">{scores[key]:.2e}</span></div>'
+            for key, label in [('pagerank', 'PageRank'), ('betweenness', 'Betweenness')] if key in scores
+        ) or '<div class="entity-row"><span class="entity-label">Graph Presence</span><span class="entity-value">High</span></div>'
         st.markdown(f"""
         <div class="entity-panel">
             <h4>👤 Entity Intelligence: {st.session_state.entity.split('@')[0]}</h4>
             <div class="entity-row"><span class="entity-label">Identifier</span><span class="entity-value">{st.session_state.entity}</span></div>
-            <div class="entity-row"><span class="entity-label">Graph Presence</span><span class="entity-value">High</span></div>
+            {score_rows}
         </div>
         """, unsafe_allow_html=True)
         
@@ -381,6 +611,8 @@ if st.session_state.searched and st.session_state.results:
         st.session_state.searched = False
         st.session_state.query = ""
         st.session_state.results = []
+        st.session_state.neighborhoods = {}
+        st.session_state.timings = {}
         st.rerun()
 
 else:
@@ -392,4 +624,8 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
-st.markdown('<div class="footer"><div>© 2026 AI Graph Builder · Enterprise Edition</div></div></div>', unsafe_allow_html=True)
+cache_stats = query_cache.stats()
+cache_note = (f"Query cache · embeddings {cache_stats['embeddings']['hits']}/{cache_stats['embeddings']['hits'] + cache_stats['embeddings']['misses']} hits"
+              f" · results {cache_stats['results']['hits']}/{cache_stats['results']['hits'] + cache_stats['results']['misses']} hits")
+st.markdown(f'<div class="footer"><div>© 2026 AI Graph Builder · Enterprise Edition</div><div>{cache_note}</div></div></div>', unsafe_allow_html=True)
+startup.mark('first_paint')
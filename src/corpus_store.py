@@ -0,0 +1,156 @@
+# corpus_store.py - COLUMNAR CORPUS STORE (Arrow IPC)
+"""
+Shared on-disk corpus format used between the milestones.
+
+A corpus is a directory with one sub-directory per table (``messages`` for
+the cleaned emails). Each table is a sequence of Arrow IPC part files that
+are written once and never modified, so a writer can append safely and a
+reader can memory-map every part and only touch the columns it asks for.
+"""
+
+import os
+import glob
+import pandas as pd
+import pyarrow as pa
+
+MESSAGES_TABLE = 'messages'
+PART_PATTERN = 'part-{:05d}.arrow'
+
+def table_dir(corpus_dir, table=MESSAGES_TABLE):
+    """Directory holding the part files of one corpus table"""
+    return os.path.join(corpus_dir, table)
+
+def list_parts(corpus_dir, table=MESSAGES_TABLE):
+    """Part files of a table in write order"""
+    return sorted(glob.glob(os.path.join(table_dir(corpus_dir, table), 'part-*.arrow')))
+
+def truncate_parts(corpus_dir, keep, table=MESSAGES_TABLE):
+    """Delete part files beyond the first keep (left over from an interrupted write)"""
+    for path in list_parts(corpus_dir, table)[keep:]:
+        os.remove(path)
+    for path in glob.glob(os.path.join(table_dir(corpus_dir, table), '*.tmp')):
+        os.remove(path)
+
+def _infer_schema(df):
+    """Arrow schema for a chunk: numeric columns keep their type, the rest are strings"""
+    fields = []
+    for col in df.columns:
+        dtype = df[col].dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            fields.append(pa.field(col, pa.bool_()))
+        elif pd.api.types.is_integer_dtype(dtype):
+            fields.append(pa.field(col, pa.int64()))
+        elif pd.api.types.is_float_dtype(dtype):
+            fields.append(pa.field(col, pa.float64()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+def _to_arrow(df, schema):
+    """Convert a chunk to an Arrow table matching schema (missing columns become null)"""
+    arrays = []
+    for field in schema:
+        if field.name not in df.columns:
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+        values = df[field.name]
+        if pa.types.is_string(field.type):
+            values = values.where(values.isna(), values.astype(str))
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def _open_part(path, memory_map=True):
+    """Read one part file; with memory_map the buffers point straight into the file"""
+    source = pa.memory_map(path, 'r') if memory_map else pa.OSFile(path, 'rb')
+    return pa.ipc.open_file(source).read_all()
+
+class CorpusWriter:
+    """Appends DataFrame chunks to a corpus table, one part file per chunk"""
+
+    def __init__(self, corpus_dir, table=MESSAGES_TABLE, overwrite=False):
+        self.dir = table_dir(corpus_dir, table)
+        os.makedirs(self.dir, exist_ok=True)
+
+        if overwrite:
+            for path in glob.glob(os.path.join(self.dir, 'part-*.arrow')):
+                os.remove(path)
+
+        parts = list_parts(corpus_dir, table)
+        self.next_part = len(parts)
+        self.schema = _open_part(parts[0]).schema if parts else None
+        self.rows_written = 0
+
+    def write(self, df):
+        """Write one chunk as a new part file and return its path"""
+        if self.schema is None:
+            self.schema = _infer_schema(df)
+        table = _to_arrow(df, self.schema)
+
+        path = os.path.join(self.dir, PART_PATTERN.format(self.next_part))
+        tmp_path = path + '.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, self.schema) as writer:
+                writer.write_table(table)
+        # Rename last so readers never see a half-written part
+        os.replace(tmp_path, path)
+
+        self.next_part += 1
+        self.rows_written += len(df)
+        return path
+
+def open_corpus(corpus_dir, columns=None, rows=None, table=MESSAGES_TABLE, memory_map=True):
+    """Load a corpus table as a pyarrow Table.
+
+    columns: only these columns are selected; with memory_map the others are
+        never paged in from disk.
+    rows: optional (start, stop) range of global row numbers. Parts that fall
+        entirely outside the range are not opened.
+    """
+    parts = list_parts(corpus_dir, table)
+    if not parts:
+        raise FileNotFoundError(f"No corpus parts found in {table_dir(corpus_dir, table)}")
+
+    start, stop = rows if rows is not None else (0, None)
+    tables = []
+    offset = 0
+    for path in parts:
+        if stop is not None and offset >= stop:
+            break
+        part = _open_part(path, memory_map=memory_map)
+        part_start, part_stop = offset, offset + part.num_rows
+        offset = part_stop
+        if part_stop <= start:
+            continue
+        if columns is not None:
+            part = part.select(columns)
+        lo = max(start - part_start, 0)
+        hi = part.num_rows if stop is None else min(stop - part_start, part.num_rows)
+        tables.append(part.slice(lo, hi - lo))
+
+    if not tables:
+        schema = _open_part(parts[0], memory_map=memory_map).schema
+        if columns is not None:
+            schema = pa.schema([schema.field(c) for c in columns])
+        return schema.empty_table()
+    return pa.concat_tables(tables)
+
+def read_corpus(corpus_dir, columns=None, rows=None, table=MESSAGES_TABLE, memory_map=True):
+    """Same as open_corpus but returns a pandas DataFrame"""
+    return open_corpus(corpus_dir, columns, rows, table, memory_map).to_pandas()
+
+def iter_corpus(corpus_dir, columns=None, table=MESSAGES_TABLE, memory_map=True):
+    """Yield one DataFrame per part file, in order"""
+    for path in list_parts(corpus_dir, table):
+        part = _open_part(path, memory_map=memory_map)
+        if columns is not None:
+            part = part.select(columns)
+        yield part.to_pandas()
+
+def corpus_columns(corpus_dir, table=MESSAGES_TABLE):
+    """Column names available in a corpus table"""
+    parts = list_parts(corpus_dir, table)
+    return _open_part(parts[0]).schema.names if parts else []
+
+def corpus_num_rows(corpus_dir, table=MESSAGES_TABLE):
+    """Total number of rows in a corpus table"""
+    return sum(_open_part(path).num_rows for path in list_parts(corpus_dir, table))
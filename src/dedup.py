@@ -0,0 +1,163 @@
+# dedup.py - EXACT + NEAR-DUPLICATE EMAIL DETECTION
+"""
+Duplicate detection for the upload stage.
+
+1. Exact duplicates: one vectorized 64-bit hash per body (no Python loop).
+2. Near duplicates: MinHash signatures over word shingles, computed in
+   parallel over chunks, bucketed with LSH and verified against the
+   similarity threshold. Forwarded and replied copies of the same text end
+   up in the same cluster.
+
+Every row gets a cluster_id so callers can keep one representative per
+cluster and skip embedding the rest.
+"""
+
+import os
+import re
+import zlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+SHINGLE_SIZE = 5
+CHUNK_SIZE = 5000
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def exact_hashes(texts):
+    """One 64-bit hash per text, computed vectorized by pandas"""
+    return pd.util.hash_pandas_object(pd.Series(texts).fillna("").astype(str), index=False).values
+
+def _permutations(num_perm, seed=1):
+    """Coefficients of the num_perm universal hash functions a*x + b mod p"""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def _shingle_hashes(text, k=SHINGLE_SIZE):
+    """32-bit hashes of the distinct k-word shingles of a text"""
+    tokens = _TOKEN_RE.findall(str(text).lower())
+    if len(tokens) < k:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    # crc32 is stable across processes, unlike hash()
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams)))
+
+def minhash_signatures(texts, num_perm=DEFAULT_NUM_PERM, seed=1):
+    """MinHash signature matrix of shape (len(texts), num_perm)"""
+    a, b = _permutations(num_perm, seed)
+    signatures = np.full((len(texts), num_perm), MAX_HASH, dtype=np.uint64)
+    for i, text in enumerate(texts):
+        shingles = _shingle_hashes(text)
+        if len(shingles) == 0:
+            continue
+        # a, b and the shingle hashes are all < 2**32, so this cannot overflow uint64
+        hashed = (np.outer(a, shingles) + b[:, None]) % MERSENNE_PRIME
+        signatures[i] = hashed.min(axis=1) & MAX_HASH
+    return signatures
+
+def _signatures_task(args):
+    texts, num_perm, seed = args
+    return minhash_signatures(texts, num_perm, seed)
+
+def lsh_params(threshold, num_perm):
+    """Pick (bands, rows) so the LSH S-curve crosses 50% near the threshold"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if bands == 0:
+            break
+        crossing = (1.0 / bands) ** (1.0 / rows)
+        error = abs(crossing - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x, y):
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            # Keep the earliest row as the root so it becomes the representative
+            if rx < ry:
+                self.parent[ry] = rx
+            else:
+                self.parent[rx] = ry
+
+    def roots(self):
+        return np.array([self.find(i) for i in range(len(self.parent))])
+
+def near_duplicate_groups(signatures, threshold=DEFAULT_THRESHOLD):
+    """Root row index for every signature; rows sharing a root are near duplicates"""
+    n, num_perm = signatures.shape
+    bands, rows = lsh_params(threshold, num_perm)
+    uf = _UnionFind(n)
+
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        _, bucket = np.unique(keys, return_inverse=True)
+        order = np.argsort(bucket, kind='stable')
+        boundaries = np.flatnonzero(np.diff(bucket[order])) + 1
+        for members in np.split(order, boundaries):
+            if len(members) < 2:
+                continue
+            # Verify candidates: estimated Jaccard = fraction of equal MinHash values
+            head = members[0]
+            similarity = (signatures[members[1:]] == signatures[head]).mean(axis=1)
+            for other in members[1:][similarity >= threshold]:
+                uf.union(head, other)
+
+    return uf.roots()
+
+def cluster_emails(df, text_column='Body', threshold=DEFAULT_THRESHOLD,
+                   num_perm=DEFAULT_NUM_PERM, workers=None, chunk_size=CHUNK_SIZE):
+    """Assign every row a duplicate cluster.
+
+    Returns a copy of df with:
+      content_hash      - exact 64-bit hash of the text
+      cluster_id        - msg_id (or index label) of the cluster representative
+      cluster_size      - number of rows in the cluster
+      is_representative - True for the one row per cluster to keep
+    """
+    df = df.copy()
+    hashes = exact_hashes(df[text_column].values)
+    df['content_hash'] = hashes
+
+    # Exact duplicates collapse first, MinHash only runs on distinct texts
+    exact_codes, _ = pd.factorize(hashes)
+    unique_positions = pd.Series(np.arange(len(df))).groupby(exact_codes).first().values
+    texts = df[text_column].astype(str).values[unique_positions]
+
+    chunks = [(texts[i:i + chunk_size], num_perm, 1) for i in range(0, len(texts), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if len(chunks) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(_signatures_task, chunks))
+    else:
+        parts = [_signatures_task(c) for c in chunks]
+    signatures = np.vstack(parts) if parts else np.empty((0, num_perm), dtype=np.uint64)
+
+    roots = near_duplicate_groups(signatures, threshold)
+    representative_positions = unique_positions[roots[exact_codes]]
+    labels = df['msg_id'].values if 'msg_id' in df.columns else df.index.values
+    df['cluster_id'] = labels[representative_positions]
+    df['cluster_size'] = df.groupby('cluster_id')['cluster_id'].transform('size')
+    df['is_representative'] = representative_positions == np.arange(len(df))
+    return df
@@ -0,0 +1,164 @@
+# embedding_cache.py - PERSISTENT EMBEDDING CACHE
+"""
+On-disk cache of sentence embeddings keyed by content hash.
+
+Layout of one cache (one directory per model name + version, where the
+version identifies the weights: the checkpoint's Hub commit, or a hash of
+its config and weights, plus the embedding dimension):
+    keys.bin     - 16-byte blake2b digest of each text, one per row
+    vectors.f32  - float32 matrix, row i is the embedding of key i
+    meta.json    - model, version, dimension and committed row count
+
+The vector file is read through a memory map, so looking up embeddings for
+texts we have already seen costs no model inference and no full load.
+"""
+
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+KEY_BYTES = 16
+
+def text_key(text):
+    """Content hash used as the cache key"""
+    return hashlib.blake2b(str(text).encode('utf-8', errors='ignore'), digest_size=KEY_BYTES).digest()
+
+def _weights_hash(model):
+    """Hash of a loaded model's config and floating point weights"""
+    h = hashlib.blake2b(digest_size=8)
+    config = getattr(getattr(model[0], 'auto_model', None), 'config', None)
+    if config is not None:
+        h.update(config.to_json_string(use_diff=False).encode('utf-8'))
+    for name, tensor in sorted(model.state_dict().items()):
+        if hasattr(tensor, 'is_floating_point') and tensor.is_floating_point():
+            h.update(name.encode('utf-8'))
+            h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return h.hexdigest()
+
+def model_version(model=None):
+    """Version string of the encoder weights, part of the cache key.
+
+    The Hub commit the checkpoint was loaded from if known, else a hash of
+    its config and weights, plus the embedding dimension. Without a model
+    only the library version is known.
+    """
+    if model is None:
+        try:
+            import sentence_transformers
+            return f"st-{sentence_transformers.__version__}"
+        except ImportError:
+            return "unknown"
+    config = getattr(getattr(model[0], 'auto_model', None), 'config', None)
+    revision = getattr(config, '_commit_hash', None)
+    revision = revision[:12] if revision else _weights_hash(model)
+    return f"{revision}-d{model.get_sentence_embedding_dimension()}"
+
+class EmbeddingCache:
+    def __init__(self, cache_dir, model_name, version=None):
+        self.model_name = model_name
+        self.version = version or model_version()
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{model_name}__{self.version}")
+        self.dir = os.path.join(cache_dir, safe_name)
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.keys_path = os.path.join(self.dir, 'keys.bin')
+        self.vectors_path = os.path.join(self.dir, 'vectors.f32')
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+
+        meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        self.dim = meta.get('dim')
+        self.count = meta.get('count', 0)
+
+        # Rows past the committed count come from an interrupted write
+        for path, row_bytes in [(self.keys_path, KEY_BYTES), (self.vectors_path, (self.dim or 0) * 4)]:
+            if os.path.exists(path) and os.path.getsize(path) > self.count * row_bytes:
+                with open(path, 'r+b') as f:
+                    f.truncate(self.count * row_bytes)
+
+        self.index = {}
+        if self.count:
+            keys = np.fromfile(self.keys_path, dtype=f'S{KEY_BYTES}', count=self.count)
+            self.index = {k: i for i, k in enumerate(keys.tolist())}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    def vectors(self):
+        """Read-only memory map over all cached vectors"""
+        if not self.count:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self.count, self.dim))
+
+    def lookup(self, texts):
+        """Cache row for each text, -1 where it has not been embedded yet"""
+        return np.array([self.index.get(text_key(t), -1) for t in texts], dtype=np.int64)
+
+    def add(self, texts, vectors):
+        """Append embeddings for texts not already in the cache"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        keys, rows = [], []
+        for i, t in enumerate(texts):
+            key = text_key(t)
+            if key not in self.index:
+                self.index[key] = self.count + len(keys)
+                keys.append(key)
+                rows.append(i)
+        if not keys:
+            return
+
+        with open(self.keys_path, 'ab') as f:
+            f.write(b"".join(keys))
+        with open(self.vectors_path, 'ab') as f:
+            f.write(vectors[rows].tobytes())
+        self.count += len(keys)
+        # meta.json is written last: it is what marks the appended rows as committed
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'version': self.version,
+                       'dim': self.dim, 'count': self.count}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def get_or_compute(self, texts, encode_fn):
+        """Embeddings for texts in input order, encoding only unseen texts.
+
+        encode_fn takes a list of strings and returns an (n, dim) array.
+        """
+        texts = [str(t) for t in texts]
+        rows = self.lookup(texts)
+        missing = np.flatnonzero(rows < 0)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        print(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} to encode")
+
+        if len(missing):
+            # Encode each distinct unseen text once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            self.add(unique_texts, encode_fn(unique_texts))
+            rows = self.lookup(texts)
+
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self.vectors()[rows])
+
+def open_cache(model_name, cache_dir=None, backend='torch', model=None):
+    """Open the shared embedding cache for a model (defaults to data/embedding_cache).
+
+    model: the loaded encoder, whose weights are fingerprinted into the key.
+    Non-default encoder backends (int8, onnx) produce slightly different
+    vectors, so they get their own cache.
+    """
+    if cache_dir is None:
+        import path_config
+        cache_dir = path_config.EMBEDDING_CACHE_DIR
+    version = model_version(model)
+    version = version if backend == 'torch' else f"{version}-{backend}"
+    return EmbeddingCache(cache_dir, model_name, version)
@@ -0,0 +1,184 @@
+# embedding_engine.py - BATCH EMBEDDING ENGINE
+"""
+High-throughput embedding for corpus bodies.
+
+- Inputs are sorted by token length and cut into batches of similar length,
+  so short emails are not padded up to the longest one in their batch.
+- Batches can be sharded across a pool of worker processes, each with its
+  own copy of the encoder and a share of the CPU threads. The pool is
+  started (spawned) on the first multi-batch call and reused until close().
+- The encoder can run as plain torch, int8 dynamically quantized torch, or
+  an ONNX export (sentence-transformers >= 3.2).
+- Output order always matches input order, and every run reports docs/sec.
+
+Usage:
+    python embedding_engine.py bench [n_docs]   # compare backends on the corpus
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+BACKENDS = ('torch', 'int8', 'onnx')
+DEFAULT_BACKEND = os.getenv('EMBED_BACKEND', 'torch')
+DEFAULT_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+DEFAULT_WORKERS = int(os.getenv('EMBED_WORKERS', '1'))
+
+def load_encoder(model_name=MODEL_NAME, backend=DEFAULT_BACKEND):
+    """Load a SentenceTransformer for the given backend"""
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+    if backend == 'onnx':
+        try:
+            return SentenceTransformer(model_name, backend='onnx')
+        except TypeError:
+            raise RuntimeError("The ONNX backend needs sentence-transformers >= 3.2 with optimum installed")
+
+    model = SentenceTransformer(model_name, device='cpu' if backend == 'int8' else None)
+    if backend == 'int8':
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def token_lengths(model, texts, chunk=1024):
+    """Token count of each text (capped at the model's max length)"""
+    tokenizer = getattr(model, 'tokenizer', None)
+    if tokenizer is None:
+        return np.array([len(t) for t in texts])
+    max_length = getattr(model, 'max_seq_length', 512)
+    lengths = []
+    for i in range(0, len(texts), chunk):
+        encoded = tokenizer(texts[i:i + chunk], add_special_tokens=True, truncation=True, max_length=max_length)
+        lengths.extend(len(ids) for ids in encoded['input_ids'])
+    return np.array(lengths)
+
+def length_batches(lengths, batch_size):
+    """Index batches of similar length: sort by length, then cut every batch_size"""
+    order = np.argsort(lengths, kind='stable')
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+# --- worker process state (one encoder per process) ---
+_worker_model = None
+
+def _init_worker(model_name, backend, threads):
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = load_encoder(model_name, backend)
+
+def _encode_batches(batches):
+    """Encode a list of text batches in the worker; returns one array per batch"""
+    return [
+        _worker_model.encode(batch, batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False)
+        for batch in batches
+    ]
+
+class EmbeddingEngine:
+    def __init__(self, model_name=MODEL_NAME, backend=DEFAULT_BACKEND,
+                 batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        # The parent keeps one encoder for tokenizing and single-process encoding
+        self.model = load_encoder(model_name, backend)
+        self.last_docs_per_sec = None
+        self._pool = None
+
+    def _executor(self):
+        """The worker pool, started once on first use; every worker loads its encoder a single time"""
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # spawn: forking a parent that already runs torch threads can deadlock the workers
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker,
+                                             initargs=(self.model_name, self.backend, threads))
+        return self._pool
+
+    def close(self):
+        """Shut down the worker pool (a later encode starts a new one)"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def encode(self, texts):
+        """Embed texts and return an (n, dim) float32 array in input order"""
+        texts = [str(t) for t in texts]
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        start_time = time.time()
+
+        batches = length_batches(token_lengths(self.model, texts), self.batch_size)
+        text_batches = [[texts[i] for i in idx] for idx in batches]
+
+        if self.workers > 1 and len(batches) > 1:
+            # Round-robin so every worker gets a mix of short and long batches
+            shards = [text_batches[w::self.workers] for w in range(self.workers)]
+            shard_results = list(self._executor().map(_encode_batches, shards))
+            results = [None] * len(batches)
+            for w, shard in enumerate(shard_results):
+                results[w::self.workers] = shard
+        else:
+            results = [
+                self.model.encode(batch, batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False)
+                for batch in text_batches
+            ]
+
+        output = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for idx, vectors in zip(batches, results):
+            output[idx] = vectors
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        self.last_docs_per_sec = len(texts) / elapsed
+        print(f"Encoded {len(texts)} docs in {elapsed:.1f}s ({self.last_docs_per_sec:,.1f} docs/sec, "
+              f"backend={self.backend}, batch_size={self.batch_size}, workers={self.workers})")
+        return output
+
+def benchmark(texts, backends=BACKENDS, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+    """Encode the same texts with each backend and print docs/sec side by side"""
+    baseline = None
+    rows = []
+    for backend in backends:
+        try:
+            engine = EmbeddingEngine(backend=backend, batch_size=batch_size, workers=workers)
+        except Exception as e:
+            print(f"Skipping {backend}: {e}")
+            continue
+        with engine:
+            vectors = engine.encode(texts)
+        if baseline is None:
+            baseline = vectors
+            drift = 0.0
+        else:
+            # Cosine similarity to the first backend, to spot accuracy loss
+            a = baseline / np.linalg.norm(baseline, axis=1, keepdims=True)
+            b = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            drift = 1.0 - float((a * b).sum(axis=1).mean())
+        rows.append((backend, engine.last_docs_per_sec, drift))
+
+    print("\n" + "="*50)
+    print(f"{'backend':<10}{'docs/sec':>15}{'cosine drift':>20}")
+    for backend, speed, drift in rows:
+        print(f"{backend:<10}{speed:>15,.1f}{drift:>20.4f}")
+    print("="*50)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        import path_config
+        n_docs = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+        df = path_config.load_corpus(columns=['Body'], rows=(0, n_docs))
+        benchmark(df['Body'].astype(str).tolist())
+    else:
+        print(__doc__)
@@ -0,0 +1,261 @@
+# entity_index.py - ENTITY RECOGNITION OVER SEARCH RESULTS
+"""
+Finds which person a set of search results is about.
+
+The directory is every person in the communication graph. Each person gets
+these aliases, all lower-cased:
+
+    email address                    john.arnold@enron.com       EMAIL_WEIGHT
+    name from the address            john arnold                 NAME_WEIGHT
+    display names from From headers  john d arnold, arnold john  NAME_WEIGHT
+    surname (MIN_SURNAME+ letters)   arnold                      SURNAME_WEIGHT
+
+First names alone are never aliases, because "john" or "andy" fit dozens
+of people. An alias shared by several people splits its weight between
+them. An alias shared by more than MAX_OWNERS people is dropped.
+
+The aliases are compiled into an Aho-Corasick automaton over word tokens.
+Every alias is found in one left-to-right pass over the result text, so
+the cost depends on the text length, not on the number of people. A
+candidate's score is its mention weight (sender address SENDER_WEIGHT,
+each mention its alias weight) times a centrality boost from the stored
+PageRank. A well-connected person therefore wins ties over a rarely
+mailing namesake.
+
+An index directory holds aliases.json plus meta.json. meta.json records
+the graph it was built from (message count and build time), and
+load_entity_index rebuilds the index when the graph has changed.
+
+Usage:
+    python entity_index.py build            # mine aliases from the graph and corpus
+    python entity_index.py "text"           # ranked candidates for a piece of text
+"""
+
+import os
+import re
+import sys
+import json
+import time
+from collections import defaultdict, deque
+import numpy as np
+
+META_FILE = 'meta.json'
+ALIASES_FILE = 'aliases.json'
+
+EMAIL_WEIGHT = 3.0
+NAME_WEIGHT = 2.0
+SURNAME_WEIGHT = 1.0
+SENDER_WEIGHT = 3.0
+MIN_SURNAME = 3
+MAX_OWNERS = 5
+
+# Surnames that are also everyday words in business mail
+COMMON_WORDS = frozenset("""
+    all and any are back bank bill book call can case cash day deal east end fax for gas gold
+    good green hall hill house its king lay long may new north not now one our out over power
+    price rate read rich rose sale say see send set she ship short small south the this time top
+    trade under way west white will win with wood work year you young
+""".split())
+
+TOKEN_RE = re.compile(r"[\w.%+\-]+@[\w\-]+(?:\.[\w\-]+)+|[^\W\d_]+")
+
+def name_tokens(text):
+    """Lower-cased word tokens; email addresses are one token"""
+    return TOKEN_RE.findall(str(text).lower()) if text else []
+
+def display_name_tokens(name):
+    """Word tokens of a From display name; "Last, First" becomes first last"""
+    name = re.sub(r'\([^)]*\)|"', ' ', str(name or ''))
+    if name.count(',') == 1:
+        last, first = name.split(',')
+        name = f"{first} {last}"
+    return [t for t in name_tokens(name) if '@' not in t]
+
+def address_tokens(email):
+    """Name tokens of an address like jeff.dasovich@ or jeff_dasovich@ (empty if not name-shaped)"""
+    local = str(email).split('@')[0].lower()
+    parts = [p for p in re.split(r'[._\-]+', local) if p]
+    if len(parts) >= 2 and all(p.isalpha() for p in parts) and len(parts[-1]) > 1:
+        return parts
+    return []
+
+def person_aliases(email, display_names=()):
+    """{alias: weight} of one person"""
+    aliases = {email: EMAIL_WEIGHT}
+    names = [address_tokens(email)] + [display_name_tokens(n) for n in display_names]
+    for tokens in names:
+        if len(tokens) < 2:
+            continue
+        aliases[' '.join(tokens)] = max(aliases.get(' '.join(tokens), 0), NAME_WEIGHT)
+        # first + last without middle names/initials
+        aliases.setdefault(f"{tokens[0]} {tokens[-1]}", NAME_WEIGHT)
+        surname = tokens[-1]
+        if len(surname) >= MIN_SURNAME and surname not in COMMON_WORDS:
+            aliases.setdefault(surname, SURNAME_WEIGHT)
+    return aliases
+
+def build_aliases(emails, display_names=None):
+    """{alias: [[email, weight], ...]} for a directory; display_names maps email -> names seen"""
+    owners = defaultdict(dict)
+    for email in emails:
+        for alias, weight in person_aliases(email, (display_names or {}).get(email, ())).items():
+            owners[alias][email] = weight
+    aliases = {}
+    for alias, people in owners.items():
+        if len(people) > MAX_OWNERS:
+            continue
+        aliases[alias] = [[email, weight / len(people)] for email, weight in sorted(people.items())]
+    return aliases
+
+def mine_display_names(corpus_dir, min_count=1):
+    """{email: [display name, ...]} from the From / From_name columns of the corpus"""
+    from corpus_store import open_corpus, corpus_columns
+
+    if 'From_name' not in corpus_columns(corpus_dir):
+        return {}
+    table = open_corpus(corpus_dir, columns=['From', 'From_name'])
+    counts = table.group_by(['From', 'From_name']).aggregate([([], 'count_all')])
+    names = defaultdict(list)
+    for email, name, count in zip(counts['From'].to_pylist(), counts['From_name'].to_pylist(),
+                                  counts['count_all'].to_pylist()):
+        if email and name and count >= min_count:
+            names[str(email).strip().lower()].append(name)
+    return dict(names)
+
+class EntityIndex:
+    def __init__(self, aliases, boost=None, meta=None):
+        self.aliases = aliases
+        self.boost = boost or {}
+        self.meta = meta or {}
+        self._compile()
+
+    def _compile(self):
+        """Aho-Corasick automaton: goto (trie) / fail links / outputs over word tokens"""
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        self.owners = []
+        for alias, people in self.aliases.items():
+            state = 0
+            for token in alias.split(' '):
+                nxt = self.goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][token] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append([])
+                state = nxt
+            self.out[state].append(len(self.owners))
+            self.owners.append(people)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and token not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(token, 0) if self.goto[f].get(token) != nxt else 0
+                # Aliases ending here include those ending at the fail state (e.g. "arnold" in "john arnold")
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    @property
+    def num_people(self):
+        return len({email for people in self.owners for email, _ in people})
+
+    def mentions(self, text):
+        """Alias ids found in text, one per occurrence, in a single pass"""
+        goto, fail, out = self.goto, self.fail, self.out
+        found, state = [], 0
+        for token in name_tokens(text):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if out[state]:
+                found.extend(out[state])
+        return found
+
+    def candidates(self, results, k=5):
+        """[(email, score)] of the people the results are most about"""
+        weights = defaultdict(float)
+        for r in results:
+            sender = str(r.get('from', '')).strip().lower()
+            if sender in self.aliases:
+                for email, _ in self.aliases[sender]:
+                    weights[email] += SENDER_WEIGHT
+            for alias_id in self.mentions(f"{r.get('subject', '')} {r.get('content', '')}"):
+                for email, weight in self.owners[alias_id]:
+                    weights[email] += weight
+        scored = [(email, w * self.boost.get(email, 1.0)) for email, w in weights.items()]
+        return sorted(scored, key=lambda x: (-x[1], x[0]))[:k]
+
+    def detect(self, results):
+        """Email of the top candidate, or None"""
+        top = self.candidates(results, k=1)
+        return top[0][0] if top else None
+
+    # --- build / persistence ---
+    @staticmethod
+    def centrality_boost(graph):
+        """{email: 1 + log(1 + n * pagerank)}; the average person gets about 1.7"""
+        if graph is None or 'pagerank' not in graph.scores or not graph.num_nodes:
+            return {}
+        boost = 1.0 + np.log1p(np.asarray(graph.scores['pagerank']) * graph.num_nodes)
+        return dict(zip(map(str, graph.nodes), boost.tolist()))
+
+    @classmethod
+    def from_graph(cls, graph, corpus_dir=None):
+        display_names = mine_display_names(corpus_dir) if corpus_dir else {}
+        aliases = build_aliases(map(str, graph.nodes), display_names)
+        meta = {'graph_messages': graph.meta.get('messages'), 'graph_built_at': graph.meta.get('built_at'),
+                'people': int(graph.num_nodes), 'aliases': len(aliases),
+                'display_names': sum(len(v) for v in display_names.values()), 'built_at': time.time()}
+        return cls(aliases, cls.centrality_boost(graph), meta)
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        for name, data in ((ALIASES_FILE, self.aliases), (META_FILE, self.meta)):
+            path = os.path.join(index_dir, name)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=None if name == ALIASES_FILE else 2)
+            os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, index_dir, graph=None):
+        with open(os.path.join(index_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, ALIASES_FILE), 'r', encoding='utf-8') as f:
+            aliases = json.load(f)
+        return cls(aliases, cls.centrality_boost(graph), meta)
+
+def load_entity_index(graph=None, corpus_dir=None, index_dir=None, rebuild=False):
+    """Load the entity index, rebuilding it first if the graph has changed since"""
+    if corpus_dir is None or index_dir is None:
+        import path_config
+        corpus_dir = corpus_dir or path_config.CORPUS_DIR
+        index_dir = index_dir or path_config.ENTITY_INDEX_DIR
+    if graph is None:
+        from csr_graph import load_graph
+        graph = load_graph(corpus_dir)
+
+    if not rebuild and os.path.exists(os.path.join(index_dir, META_FILE)):
+        index = EntityIndex.load(index_dir, graph)
+        if index.meta.get('graph_messages') == graph.meta.get('messages') \
+                and index.meta.get('graph_built_at') == graph.meta.get('built_at'):
+            return index
+
+    start_time = time.time()
+    index = EntityIndex.from_graph(graph, corpus_dir)
+    index.save(index_dir)
+    print(f"Built entity index: {index.meta['people']} people, {index.meta['aliases']} aliases "
+          f"({index.meta['display_names']} display names) in {time.time() - start_time:.2f}s -> {index_dir}")
+    return index
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    if sys.argv[1] == 'build':
+        load_entity_index(rebuild=True)
+    else:
+        index = load_entity_index()
+        for email, score in index.candidates([{'content': ' '.join(sys.argv[1:])}], k=10):
+            print(f"{score:8.2f}  {email}")
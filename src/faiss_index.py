@@ -0,0 +1,274 @@
+# faiss_index.py - PERSISTED ANN INDEX
+"""
+Build, save and memory-map FAISS indexes for the email corpus.
+
+An index directory holds:
+    index.faiss  - the FAISS index over L2-normalized embeddings (inner product = cosine)
+    ids.npy      - position -> msg_id map (index position i is corpus row ids[i];
+                   TOMBSTONE for a deleted vector, dropped at the next full build)
+    meta.json    - index type, size, dimension and default search parameters
+    filters.npz  - sender / recipient / date id sets for filtered search
+
+Index types:
+    flat  - exact search, the baseline
+    ivf   - inverted lists, tune recall/latency with nprobe
+    hnsw  - graph index, tune recall/latency with efSearch
+"""
+
+import os
+import json
+import time
+import numpy as np
+import faiss
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+INDEX_FILE = 'index.faiss'
+IDS_FILE = 'ids.npy'
+META_FILE = 'meta.json'
+# ids.npy entry of a deleted vector (HNSW indexes cannot remove vectors in place)
+TOMBSTONE = -1
+
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+
+def normalize(vectors):
+    """Float32 copy with unit-length rows so inner product equals cosine similarity"""
+    vectors = np.array(vectors, dtype=np.float32, copy=True)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def build_index(vectors, index_type='hnsw', nlist=None, hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION):
+    """Build an inner-product index over already normalized vectors"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    n, dim = vectors.shape
+
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == 'ivf':
+        # ~4*sqrt(n) lists, but keep at least ~40 training points per list
+        nlist = nlist or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39 or 1))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample = vectors[np.random.RandomState(0).choice(n, min(n, nlist * 256), replace=False)]
+        index.train(sample)
+    else:
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+
+    index.add(vectors)
+    return index
+
+def _replace(path, write):
+    """write(tmp_path), then swap it in: readers may still have the old file memory-mapped"""
+    write(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def _save_npy(path, values):
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            np.save(f, values)
+    _replace(path, write)
+
+def save_ids(index_dir, ids):
+    """Write the position -> msg_id map"""
+    _save_npy(os.path.join(index_dir, IDS_FILE), np.asarray(ids, dtype=np.int64))
+
+def drop_tombstones(D, I, ids, k):
+    """First k hits per row that are not deleted vectors; search k + the tombstone count to fill them"""
+    ids = np.asarray(ids)
+    live = (I >= 0) & (ids[np.where(I >= 0, I, 0)] != TOMBSTONE)
+    order = np.argsort(~live, axis=1, kind='stable')[:, :k]
+    I = np.where(np.take_along_axis(live, order, 1), np.take_along_axis(I, order, 1), -1)
+    return np.take_along_axis(D, order, 1), I
+
+def save_index(index, ids, index_dir, index_type, params=None):
+    """Write index, id map and metadata to index_dir"""
+    os.makedirs(index_dir, exist_ok=True)
+    _replace(os.path.join(index_dir, INDEX_FILE), lambda tmp: faiss.write_index(index, tmp))
+    save_ids(index_dir, ids)
+    meta = {
+        'index_type': index_type,
+        'size': int(index.ntotal),
+        'dim': int(index.d),
+        'nprobe': DEFAULT_NPROBE,
+        'ef_search': DEFAULT_EF_SEARCH,
+        'built_at': time.time(),
+    }
+    meta.update(params or {})
+
+    def write(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+    _replace(os.path.join(index_dir, META_FILE), write)
+    return meta
+
+def load_index(index_dir, mmap=True):
+    """Load (index, ids, meta); the index and id map are memory-mapped when possible"""
+    path = os.path.join(index_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No FAISS index at {path} - run the build step first")
+
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type supports mmap in every FAISS build
+            index = None
+    if index is None:
+        index = faiss.read_index(path)
+
+    ids = np.load(os.path.join(index_dir, IDS_FILE), mmap_mode='r' if mmap else None)
+    with open(os.path.join(index_dir, META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    set_search_params(index, meta.get('nprobe'), meta.get('ef_search'))
+    return index, ids, meta
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Apply recall/latency knobs for IVF (nprobe) and HNSW (efSearch) indexes"""
+    if nprobe:
+        try:
+            faiss.extract_index_ivf(index).nprobe = int(nprobe)
+        except RuntimeError:
+            pass
+    if ef_search and hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = int(ef_search)
+
+FILTERS_FILE = 'filters.npz'
+
+def _group_positions(keys, positions):
+    """CSR-style grouping: sorted unique keys, offsets, and positions per key"""
+    keys = np.asarray(keys, dtype=object).astype(str)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    unique, starts = np.unique(sorted_keys, return_index=True)
+    offsets = np.append(starts, len(sorted_keys)).astype(np.int64)
+    return unique, offsets, np.asarray(positions, dtype=np.int64)[order]
+
+def save_filters(index_dir, ids, senders, edge_msg_ids, edge_recipients, timestamps):
+    """Precompute the id sets used for metadata filtering.
+
+    ids: position -> msg_id map of the index
+    senders / timestamps: one value per index position
+    edge_msg_ids / edge_recipients: one row per (message, recipient) edge
+    """
+    ids = np.asarray(ids)
+    # Deleted vectors (TOMBSTONE ids) are left out of every id set
+    live = ids != TOMBSTONE
+    positions = np.arange(len(ids))
+    sender_keys, sender_offsets, sender_positions = _group_positions(
+        np.asarray(senders, dtype=object)[live], positions[live])
+
+    # Map edges to index positions (messages that are not indexed are dropped)
+    id_to_position = dict(zip(ids[live].tolist(), positions[live].tolist()))
+    edge_positions = np.array([id_to_position.get(int(m), -1) for m in edge_msg_ids], dtype=np.int64)
+    mask = edge_positions >= 0
+    recipient_keys, recipient_offsets, recipient_positions = _group_positions(
+        np.asarray(edge_recipients, dtype=object)[mask], edge_positions[mask])
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    dated = np.flatnonzero(~np.isnan(timestamps) & live)
+    ts_order = dated[np.argsort(timestamps[dated], kind='stable')]
+
+    arrays = dict(sender_keys=sender_keys, sender_offsets=sender_offsets, sender_positions=sender_positions,
+                  recipient_keys=recipient_keys, recipient_offsets=recipient_offsets,
+                  recipient_positions=recipient_positions,
+                  ts_sorted=timestamps[ts_order], ts_positions=ts_order.astype(np.int64))
+
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+
+    _replace(os.path.join(index_dir, FILTERS_FILE), write)
+
+class SearchFilters:
+    """Precomputed sender / recipient / date id sets over index positions"""
+
+    def __init__(self, index_dir):
+        data = np.load(os.path.join(index_dir, FILTERS_FILE), allow_pickle=False)
+        self.data = {key: data[key] for key in data.files}
+
+    def _lookup(self, prefix, key):
+        keys = self.data[f'{prefix}_keys']
+        i = np.searchsorted(keys, key)
+        if i >= len(keys) or keys[i] != key:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.data[f'{prefix}_offsets']
+        return self.data[f'{prefix}_positions'][offsets[i]:offsets[i + 1]]
+
+    def by_sender(self, email):
+        return self._lookup('sender', email.strip().lower())
+
+    def by_recipient(self, email):
+        return np.unique(self._lookup('recipient', email.strip().lower()))
+
+    def by_date(self, start=None, stop=None):
+        """Positions with start <= timestamp < stop (epoch seconds)"""
+        ts = self.data['ts_sorted']
+        lo = 0 if start is None else np.searchsorted(ts, start, 'left')
+        hi = len(ts) if stop is None else np.searchsorted(ts, stop, 'left')
+        return self.data['ts_positions'][lo:hi]
+
+    def select(self, sender=None, recipient=None, date_from=None, date_to=None):
+        """Intersection of the requested filters, or None when no filter is set"""
+        selected = None
+        if sender:
+            selected = self.by_sender(sender)
+        if recipient:
+            positions = self.by_recipient(recipient)
+            selected = positions if selected is None else np.intersect1d(selected, positions)
+        if date_from is not None or date_to is not None:
+            positions = self.by_date(date_from, date_to)
+            selected = positions if selected is None else np.intersect1d(selected, positions)
+        return selected
+
+def search_params(index, selected_positions=None, nprobe=None, ef_search=None):
+    """SearchParameters restricting the search to selected_positions (None = no restriction)"""
+    if selected_positions is None:
+        return None
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(selected_positions, dtype=np.int64))
+    if hasattr(index, 'hnsw'):
+        params = faiss.SearchParametersHNSW(sel=selector)
+        params.efSearch = int(ef_search or index.hnsw.efSearch)
+    else:
+        try:
+            ivf = faiss.extract_index_ivf(index)
+            params = faiss.SearchParametersIVF(sel=selector)
+            params.nprobe = int(nprobe or ivf.nprobe)
+        except RuntimeError:
+            params = faiss.SearchParameters(sel=selector)
+    # Keep the selector alive as long as the params object
+    params._selector = selector
+    return params
+
+# Filters selecting at most this many vectors are answered by exact scoring
+EXACT_SUBSET_LIMIT = 20000
+
+def subset_search(index, queries, positions, k):
+    """Exact top-k restricted to positions, scoring their stored vectors directly.
+
+    Graph and IVF indexes can miss results when a filter is very selective, so
+    small subsets are scored exactly. Returns None if the index cannot
+    reconstruct stored vectors (caller falls back to a filtered index search).
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    try:
+        vectors = index.reconstruct_batch(positions)
+    except RuntimeError:
+        return None
+    scores = queries @ vectors.T
+    k = min(k, len(positions))
+    D = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    I = np.full((len(queries), k), -1, dtype=np.int64)
+    if k == 0:
+        return D, I
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    for row in range(len(queries)):
+        best = top[row][np.argsort(-scores[row, top[row]])]
+        D[row] = scores[row, best]
+        I[row] = positions[best]
+    return D, I
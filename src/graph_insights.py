@@ -1,7 +1,6 @@
 # graph_analytics.py - SECURED & BLINDED
 import pandas as pd
 from neo4j import GraphDatabase
-import networkx as nx
 from collections import Counter
 import plotly.graph_objects as go
 import plotly.express as px
@@ -11,6 +10,40 @@ from dotenv import load_dotenv  # Added for security shielding
 # 1. Load the Shield (Environment Variables)
 load_dotenv()
 
+def rollup_patterns(date_from=None, date_to=None, grain='day', limit=None):
+    """[{"date", "count"}] per bucket from the materialized rollups.
+
+    None if the rollups are not built (no database, or nothing counted yet),
+    so callers can tell that apart from a range with no messages ([]).
+    """
+    from temporal_rollups import open_rollups
+    try:
+        rollups = open_rollups()
+    except Exception:
+        return None
+    try:
+        if rollups.watermark == 0:
+            return None
+        series = rollups.series(grain, start=date_from, stop=date_to, limit=limit)
+    finally:
+        rollups.close()
+    return [{"date": str(pd.Timestamp(bucket, unit='s').date()), "count": count} for bucket, count in series]
+
+def write_graph_scores(driver, graph, batch_size=5000):
+    """Store a CSR graph's PageRank, betweenness and community on the Person nodes (used by milestone 2)"""
+    rows = [{"email": str(email), "pagerank": float(pr), "betweenness": float(bc), "community": int(c)}
+            for email, pr, bc, c in zip(graph.nodes, graph.scores['pagerank'],
+                                        graph.scores['betweenness'], graph.community)]
+    with driver.session() as session:
+        session.run("CREATE INDEX person_betweenness IF NOT EXISTS FOR (p:Person) ON (p.betweenness)").consume()
+        session.run("CREATE INDEX person_community IF NOT EXISTS FOR (p:Person) ON (p.community)").consume()
+        for i in range(0, len(rows), batch_size):
+            session.execute_write(lambda tx, batch: tx.run("""
+                UNWIND $batch AS row
+                MATCH (p:Person {email: row.email})
+                SET p.pagerank = row.pagerank, p.betweenness = row.betweenness, p.community = row.community
+            """, batch=batch).consume(), rows[i:i + batch_size])
+
 class GraphAnalytics:
     def __init__(self, uri, user, password):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
@@ -19,60 +52,125 @@ class GraphAnalytics:
         self.driver.close()
     
     def get_network_metrics(self):
-        """Calculate key network metrics"""
+        """Top communicators and the most central people.
+
+        Centrality is read from the pagerank / betweenness properties written
+        by store_graph_scores, not recomputed per call.
+        """
         with self.driver.session() as session:
-            # Degree centrality
+            # Degree centrality (messages sent), summed over pre-aggregated pair edges
             result = session.run("""
-                MATCH (p:Person)-[r:SENT]->()
-                RETURN p.email AS person, count(r) AS degree
+                MATCH (p:Person)-[c:COMMUNICATES]->()
+                RETURN p.email AS person, sum(c.count) AS degree
                 ORDER BY degree DESC
                 LIMIT 10
             """)
             degree_data = [{"person": r["person"], "degree": r["degree"]} for r in result]
             
-            # Betweenness centrality (simplified)
+            # Sampled betweenness and PageRank over the full graph
             result = session.run("""
-                MATCH (p:Person)
-                OPTIONAL MATCH (p)-[:SENT]->(other)
-                RETURN p.email AS person, count(other) AS connections
-                ORDER BY connections DESC
+                MATCH (p:Person) WHERE p.betweenness IS NOT NULL
+                RETURN p.email AS person, p.betweenness AS betweenness, p.pagerank AS pagerank
+                ORDER BY betweenness DESC
                 LIMIT 10
             """)
-            centrality_data = [{"person": r["person"], "connections": r["connections"]} for r in result]
+            centrality_data = [{"person": r["person"], "betweenness": r["betweenness"], "pagerank": r["pagerank"]}
+                               for r in result]
             
             return degree_data, centrality_data
-    
-    def find_communities(self):
-        """Detect communication communities"""
+
+    def store_graph_scores(self, graph, batch_size=5000):
+        """Write the CSR graph's per-person PageRank, betweenness and community to the Person nodes"""
+        write_graph_scores(self.driver, graph, batch_size)
+
+    def find_communities(self, min_size=2):
+        """Communication communities over the whole graph, largest first.
+
+        Membership is the community property written by store_graph_scores
+        (Louvain over the full weighted graph), grouped in one pass.
+        """
         with self.driver.session() as session:
             result = session.run("""
-                MATCH (p1:Person)-[:SENT]->(p2:Person)
-                RETURN p1.email AS source, p2.email AS target, count(*) AS weight
-                LIMIT 100
-            """)
-            
-            # Build graph in NetworkX
-            G = nx.Graph()
-            for record in result:
-                G.add_edge(record["source"], record["target"], weight=record["weight"])
-            
-            # Detect communities
-            if len(G.nodes()) > 0:
-                communities = nx.community.greedy_modularity_communities(G)
-                return communities
-            return []
-    
-    def get_temporal_patterns(self):
-        """Analyze communication patterns over time"""
+                MATCH (p:Person) WHERE p.community IS NOT NULL
+                WITH p.community AS community, collect(p.email) AS members
+                WHERE size(members) >= $min_size
+                RETURN community, members
+                ORDER BY size(members) DESC
+            """, min_size=min_size)
+            return [set(r["members"]) for r in result]
+
+    def get_temporal_patterns(self, date_from=None, date_to=None, limit=None):
+        """Analyze communication patterns over time (messages per day).
+
+        Served from the materialized rollups when they exist; otherwise an
+        index range scan over the native SENT.date datetimes. limit caps the
+        number of days returned (all days by default).
+        """
+        patterns = rollup_patterns(date_from, date_to, limit=limit)
+        if patterns is not None:
+            return patterns
+        # Only the bounds that are given, compared to r.date directly so the sent_date index is used
+        conditions = ["r.date IS NOT NULL"]
+        if date_from is not None:
+            conditions.append("r.date >= datetime($date_from)")
+        if date_to is not None:
+            conditions.append("r.date < datetime($date_to)")
+        query = f"""
+            MATCH ()-[r:SENT]->()
+            WHERE {' AND '.join(conditions)}
+            RETURN date(r.date) AS day, count(*) AS count
+            ORDER BY day
+        """ + ("LIMIT $limit" if limit is not None else "")
         with self.driver.session() as session:
-            result = session.run("""
-                MATCH ()-[r:SENT]->()
-                WHERE r.date IS NOT NULL
-                RETURN r.date AS date, count(*) AS count
-                ORDER BY date
-                LIMIT 50
-            """)
-            return [{"date": r["date"], "count": r["count"]} for r in result]
+            result = session.run(query, date_from=date_from, date_to=date_to, limit=limit)
+            return [{"date": str(r["day"]), "count": r["count"]} for r in result]
+
+class LocalGraphAnalytics:
+    """Same operations as GraphAnalytics, answered in-process from the CSR graph (no database)"""
+
+    def __init__(self, corpus_dir=None, graph_dir=None):
+        from csr_graph import load_graph
+        self.corpus_dir = corpus_dir
+        self.graph = load_graph(corpus_dir, graph_dir)
+
+    def close(self):
+        pass
+
+    def neighbors(self, email, limit=25):
+        """[(email, messages)] of a person's heaviest contacts in either direction"""
+        return self.graph.neighbors(email, limit)
+
+    def get_network_metrics(self):
+        """Top senders by messages sent, and the most central people by stored betweenness"""
+        degree_data = [{"person": p, "degree": d} for p, d in self.graph.top(self.graph.out_degree(), 10)]
+        scores = self.graph.scores
+        centrality_data = []
+        if 'betweenness' in scores:
+            centrality_data = [{"person": p, "betweenness": b, "pagerank": self.graph.centrality(p).get('pagerank')}
+                               for p, b in self.graph.top(scores['betweenness'], 10)]
+        return degree_data, centrality_data
+
+    def find_communities(self, min_size=2):
+        """Stored Louvain communities over the whole graph, largest first"""
+        return self.graph.communities(min_size=min_size)
+
+    def get_temporal_patterns(self, date_from=None, date_to=None, limit=None):
+        """Messages per day, from the rollups (or the corpus timestamps if they are not built)"""
+        patterns = rollup_patterns(date_from, date_to, limit=limit)
+        if patterns is not None:
+            return patterns
+        import path_config
+        from corpus_store import read_corpus
+        ts = read_corpus(self.corpus_dir or path_config.CORPUS_DIR, columns=['timestamp'])['timestamp']
+        days = pd.to_datetime(ts.dropna().astype('int64'), unit='s', utc=True).dt.floor('D')
+        if date_from is not None:
+            days = days[days >= pd.Timestamp(date_from, tz='UTC')]
+        if date_to is not None:
+            days = days[days < pd.Timestamp(date_to, tz='UTC')]
+        counts = days.value_counts().sort_index()
+        if limit is not None:
+            counts = counts.head(limit)
+        return [{"date": str(d.date()), "count": int(c)} for d, c in counts.items()]
 
 # 2. Usage example with Secure Credential Loading
 if __name__ == "__main__":
@@ -82,11 +180,18 @@ if __name__ == "__main__":
     PASSWORD = os.getenv("NEO4J_PASSWORD")
 
     if not all([URI, USER, PASSWORD]):
-        print("❌ ERROR: Neo4j credentials missing in .env file.")
+        print("ℹ️ Neo4j credentials missing in .env file - using the local graph engine.")
+        analytics = LocalGraphAnalytics()
+        degree, centrality = analytics.get_network_metrics()
+        print("Top Communicators:", degree[:5])
     else:
         print(f"Connecting to Neo4j Analytics Engine at {URI}...")
         analytics = GraphAnalytics(URI, USER, PASSWORD)
-        
+
+        # Scores and communities are computed in-process over the whole graph and stored on the Person nodes,
+        # where get_network_metrics and find_communities read them
+        analytics.store_graph_scores(LocalGraphAnalytics().graph)
+
         # Get metrics
         degree, centrality = analytics.get_network_metrics()
         print("Top Communicators:", degree[:5])
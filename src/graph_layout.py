@@ -0,0 +1,182 @@
+# graph_layout.py - CACHED FORCE-DIRECTED LAYOUT
+"""
+Node positions for the Knowledge Graph panel.
+
+Layouts are computed with a vectorized Fruchterman-Reingold (same forces
+and cooling as networkx.spring_layout, repulsion as one n x n NumPy pass per
+iteration instead of Python loops) and cached by a fingerprint of the
+graph's nodes and weighted edges, so a rerun of the same view costs one
+hash.
+
+The engine also remembers the last position of every node it has placed.
+A graph that shares nodes with an earlier one starts from those positions
+and only runs a short, cool refinement. New nodes start next to their
+already-placed neighbors. The picture therefore stays put between reruns
+instead of being re-randomized. Nodes never seen before get a starting
+point seeded from their name, so the same graph always gets the same
+layout.
+
+Above EXACT_REPULSION_NODES the repulsion of each node is estimated from a
+random sample of the others (scaled up), keeping every iteration linear in
+the sample size.
+"""
+
+import os
+import hashlib
+import numpy as np
+
+from query_cache import LRUCache
+
+LAYOUT_CACHE_SIZE = int(os.getenv('GRAPH_LAYOUT_CACHE_SIZE', '256'))
+POSITION_MEMORY = int(os.getenv('GRAPH_POSITION_MEMORY', '50000'))
+ITERATIONS = 50
+WARM_ITERATIONS = 15
+# Warm start when at least this fraction of the nodes has a remembered position
+WARM_FRACTION = 0.5
+EXACT_REPULSION_NODES = 1000
+REPULSION_SAMPLES = 256
+
+def graph_fingerprint(nodes, edges):
+    """Stable hash of a graph's node set and (undirected) weighted edge set"""
+    h = hashlib.blake2b(digest_size=16)
+    for node in sorted(map(str, nodes)):
+        h.update(node.encode('utf-8', 'replace') + b'\0')
+    h.update(b'\1')
+    for u, v, w in sorted((min(str(u), str(v)), max(str(u), str(v)), float(w)) for u, v, w in edges):
+        h.update(f"{u}\0{v}\0{w:g}\0".encode('utf-8', 'replace'))
+    return h.hexdigest()
+
+def _seeded_point(node):
+    """Deterministic starting point in [0, 1)^2 derived from the node name"""
+    digest = hashlib.blake2b(str(node).encode('utf-8', 'replace'), digest_size=8).digest()
+    return np.frombuffer(digest, dtype=np.uint32).astype(np.float64) / 2**32
+
+def rescale(pos, scale=1.0):
+    """Center on the origin and scale the largest coordinate to `scale` (as networkx.rescale_layout)"""
+    pos = pos - pos.mean(axis=0)
+    extent = np.abs(pos).max() if len(pos) else 0.0
+    return pos * (scale / extent) if extent > 0 else pos
+
+def align(pos, reference, mask):
+    """Translate and scale pos so that its masked rows best match reference (no rotation)"""
+    moved, target = pos[mask], reference[mask]
+    moved_center, target_center = moved.mean(axis=0), target.mean(axis=0)
+    spread = np.sqrt(((moved - moved_center) ** 2).sum(axis=1).mean())
+    target_spread = np.sqrt(((target - target_center) ** 2).sum(axis=1).mean())
+    scale = target_spread / spread if spread > 0 and target_spread > 0 else 1.0
+    return (pos - moved_center) * scale + target_center
+
+def fruchterman_reingold(pos, src, dst, weight, k=None, iterations=ITERATIONS, temperature=0.1, seed=0):
+    """Vectorized Fruchterman-Reingold on n x 2 positions; src/dst/weight describe undirected edges.
+
+    temperature is the initial maximum step as a fraction of the layout's extent;
+    it cools linearly to zero over the iterations.
+    """
+    pos = np.array(pos, dtype=np.float64)
+    n = len(pos)
+    if n <= 1:
+        return pos
+    k = np.sqrt(1.0 / n) if k is None else k
+    rng = np.random.default_rng(seed)
+    t = max(np.ptp(pos[:, 0]), np.ptp(pos[:, 1]), 1e-3) * temperature
+    dt = t / (iterations + 1)
+    sampled = n > EXACT_REPULSION_NODES
+
+    for _ in range(iterations):
+        # Repulsion k^2 / d along every pair (or a scaled-up sample of pairs)
+        others = rng.choice(n, REPULSION_SAMPLES, replace=False) if sampled else slice(None)
+        dx = pos[:, 0, None] - pos[None, others, 0]
+        dy = pos[:, 1, None] - pos[None, others, 1]
+        dist2 = np.maximum(dx * dx + dy * dy, 1e-4)
+        factor = k * k / dist2
+        disp = np.stack([(dx * factor).sum(axis=1), (dy * factor).sum(axis=1)], axis=1)
+        if sampled:
+            disp *= n / REPULSION_SAMPLES
+
+        # Attraction w * d^2 / k along the edges, pulling both ends together
+        if len(src):
+            delta = pos[src] - pos[dst]
+            dist = np.maximum(np.sqrt((delta * delta).sum(axis=1)), 1e-2)
+            pull = delta * (weight * dist / k)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] -= np.bincount(src, pull[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(dst, pull[:, axis], minlength=n)
+
+        length = np.maximum(np.sqrt((disp * disp).sum(axis=1)), 1e-2)
+        pos += disp * (t / length)[:, None]
+        t -= dt
+    return pos
+
+def edge_coordinates(pos, edges):
+    """x, y arrays for drawing every edge as one line trace (NaN gaps between segments)"""
+    m = len(edges)
+    x = np.full(3 * m, np.nan)
+    y = np.full(3 * m, np.nan)
+    if m:
+        ends = np.array([(pos[e[0]], pos[e[1]]) for e in edges], dtype=np.float64)
+        x[0::3], x[1::3] = ends[:, 0, 0], ends[:, 1, 0]
+        y[0::3], y[1::3] = ends[:, 0, 1], ends[:, 1, 1]
+    return x, y
+
+class GraphLayout:
+    def __init__(self, cache_size=LAYOUT_CACHE_SIZE, memory_size=POSITION_MEMORY):
+        self.layouts = LRUCache(cache_size)
+        self.memory = LRUCache(memory_size)
+        self.warm_starts = self.cold_starts = 0
+
+    def _initial(self, nodes, index, src, dst):
+        """Remembered positions, else next to placed neighbors, else a name-seeded point"""
+        pos = np.empty((len(nodes), 2))
+        known = np.zeros(len(nodes), dtype=bool)
+        for i, node in enumerate(nodes):
+            remembered = self.memory.get(node)
+            if remembered is not None:
+                pos[i], known[i] = remembered, True
+            else:
+                pos[i] = _seeded_point(node) * 2 - 1
+        if known.any() and not known.all():
+            # Neighbor centroid of every new node (edges in both directions)
+            a, b = np.concatenate([src, dst]), np.concatenate([dst, src])
+            from_known = known[b] & ~known[a]
+            counts = np.bincount(a[from_known], minlength=len(nodes))
+            placed = counts > 0
+            for axis in (0, 1):
+                sums = np.bincount(a[from_known], pos[b[from_known], axis], minlength=len(nodes))
+                # Jitter from the seeded point so siblings do not coincide
+                pos[placed, axis] = sums[placed] / counts[placed] + 0.05 * pos[placed, axis]
+        return pos, known
+
+    def layout(self, nodes, edges, k=None):
+        """{node: (x, y)} for nodes and (u, v, weight) edges, roughly within [-1, 1]"""
+        nodes = list(nodes)
+        edges = [(u, v, 1 if w is None else w) for u, v, w in edges]
+        key = graph_fingerprint(nodes, edges)
+        cached = self.layouts.get(key)
+        if cached is not None:
+            return cached
+
+        index = {node: i for i, node in enumerate(nodes)}
+        src = np.array([index[u] for u, _, _ in edges], dtype=np.int64)
+        dst = np.array([index[v] for _, v, _ in edges], dtype=np.int64)
+        # Message counts span orders of magnitude; log-damped so heavy pairs don't collapse
+        weight = 1.0 + np.log1p(np.array([max(float(w), 0.0) for _, _, w in edges]))
+
+        start, known = self._initial(nodes, index, src, dst)
+        if len(nodes) > 1 and known.mean() >= WARM_FRACTION:
+            # Short, cool refinement, then mapped back onto the remembered frame so the view doesn't jump
+            self.warm_starts += 1
+            pos = fruchterman_reingold(start, src, dst, weight, k=k, iterations=WARM_ITERATIONS, temperature=0.02)
+            pos = align(pos, start, known)
+        else:
+            self.cold_starts += 1
+            pos = rescale(fruchterman_reingold(start, src, dst, weight, k=k, iterations=ITERATIONS, temperature=0.1))
+
+        result = {node: tuple(pos[i]) for i, node in enumerate(nodes)}
+        for node, xy in result.items():
+            self.memory.put(node, xy)
+        self.layouts.put(key, result)
+        return result
+
+    def stats(self):
+        return {'layouts': self.layouts.stats(), 'remembered_nodes': len(self.memory.data),
+                'warm_starts': self.warm_starts, 'cold_starts': self.cold_starts}
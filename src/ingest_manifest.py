@@ -0,0 +1,206 @@
+# ingest_manifest.py - INCREMENTAL INGESTION MANIFEST
+"""
+Bookkeeping for incremental, resumable ingestion.
+
+The manifest remembers every message that made it into the corpus (by a
+stable message key and a content hash), how far into the source file the
+last committed chunk reached, and a per-stage watermark so downstream stages
+(graph build, embedding, Pinecone upload) can ask for just the rows they
+have not processed yet. Everything lives in one SQLite file so a chunk is
+committed atomically.
+"""
+
+import os
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    msg_key      TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    msg_id       INTEGER NOT NULL,
+    thread_id    TEXT
+);
+CREATE TABLE IF NOT EXISTS superseded (
+    msg_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS retracted (
+    stage  TEXT NOT NULL,
+    msg_id INTEGER NOT NULL,
+    PRIMARY KEY (stage, msg_id)
+);
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def source_signature(path):
+    """Identifies one version of the input file (path, size, mtime)"""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{int(stat.st_mtime)}"
+
+class IngestManifest:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # --- state helpers ---
+    def _get(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set(self, key, value):
+        self.conn.execute(
+            "INSERT INTO state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    @property
+    def watermark(self):
+        """Number of corpus rows committed so far (= next msg_id to assign)"""
+        return int(self._get('next_msg_id', 0))
+
+    @property
+    def parts_committed(self):
+        """Number of part files per corpus table that belong to committed chunks"""
+        return int(self._get('parts_committed', 0))
+
+    # --- ingestion side ---
+    def reset(self):
+        """Forget everything (used for a full rebuild)"""
+        with self.conn:
+            self.conn.execute("DELETE FROM messages")
+            self.conn.execute("DELETE FROM superseded")
+            self.conn.execute("DELETE FROM retracted")
+            self.conn.execute("DELETE FROM state")
+
+    def begin_run(self, signature):
+        """Start an ingestion run and return how many source messages to skip.
+
+        If the previous run on the same input was interrupted, ingestion
+        resumes after the last committed chunk; otherwise the whole input is
+        scanned and unchanged messages are skipped by hash.
+        """
+        resume = self._get('run_status') == 'running' and self._get('source_signature') == signature
+        with self.conn:
+            self._set('run_status', 'running')
+            self._set('source_signature', signature)
+            if not resume:
+                self._set('source_offset', 0)
+        return int(self._get('source_offset', 0))
+
+    def finish_run(self):
+        with self.conn:
+            self._set('run_status', 'complete')
+
+    def known_hashes(self, msg_keys):
+        """msg_key -> (content_hash, msg_id) for keys already in the corpus"""
+        found = {}
+        keys = list(msg_keys)
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT msg_key, content_hash, msg_id FROM messages WHERE msg_key IN ({placeholders})",
+                batch
+            )
+            for key, content_hash, msg_id in rows:
+                found[key] = (content_hash, msg_id)
+        return found
+
+    def commit_chunk(self, records, superseded_ids, next_msg_id, source_offset, parts_committed):
+        """Record one written chunk in a single transaction.
+
+        records: iterable of (msg_key, content_hash, msg_id, thread_id)
+        superseded_ids: msg_ids replaced by a newer version in this chunk
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO messages (msg_key, content_hash, msg_id, thread_id) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(msg_key) DO UPDATE SET content_hash = excluded.content_hash, "
+                "msg_id = excluded.msg_id, thread_id = excluded.thread_id",
+                records
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO superseded (msg_id) VALUES (?)",
+                [(int(m),) for m in superseded_ids]
+            )
+            self._set('next_msg_id', next_msg_id)
+            self._set('source_offset', source_offset)
+            self._set('parts_committed', parts_committed)
+
+    def advance_source(self, source_offset):
+        """Move the resume point past a chunk that had nothing new to write"""
+        with self.conn:
+            self._set('source_offset', source_offset)
+
+    # --- downstream side ---
+    def delta(self, stage):
+        """(start, stop) msg_id range that stage has not processed yet"""
+        return int(self._get(f'watermark:{stage}', 0)), self.watermark
+
+    def pinned_delta(self, stage, stop):
+        """Like delta, but a range that was started and not finished is reused.
+
+        For stages whose writes are not idempotent (e.g. incrementing counters)
+        a retry after a failure must cover exactly the same rows as the failed run.
+        """
+        start = int(self._get(f'watermark:{stage}', 0))
+        pinned = self._get(f'pinned:{stage}')
+        if pinned is not None and int(pinned) > start:
+            return start, int(pinned)
+        with self.conn:
+            self._set(f'pinned:{stage}', int(stop))
+        return start, int(stop)
+
+    def mark_done(self, stage, stop):
+        """Record that stage has processed every row below stop"""
+        with self.conn:
+            self._set(f'watermark:{stage}', int(stop))
+
+    def superseded_ids(self, start=0, stop=None):
+        """msg_ids in [start, stop) that were replaced by a newer version"""
+        stop = self.watermark if stop is None else stop
+        rows = self.conn.execute(
+            "SELECT msg_id FROM superseded WHERE msg_id >= ? AND msg_id < ? ORDER BY msg_id",
+            (int(start), int(stop))
+        )
+        return [r[0] for r in rows]
+
+    def pending_retractions(self, stage, stop=None):
+        """Superseded msg_ids below stop that stage loaded earlier and has not removed yet.
+
+        Stages that keep their own copy of each message (Neo4j, the vector
+        stores) delete these and then call mark_retracted.
+        """
+        stop = self.watermark if stop is None else stop
+        rows = self.conn.execute(
+            "SELECT s.msg_id FROM superseded s WHERE s.msg_id < ? AND NOT EXISTS "
+            "(SELECT 1 FROM retracted r WHERE r.stage = ? AND r.msg_id = s.msg_id) ORDER BY s.msg_id",
+            (int(stop), stage)
+        )
+        return [r[0] for r in rows]
+
+    def mark_retracted(self, stage, msg_ids):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO retracted (stage, msg_id) VALUES (?, ?)",
+                [(stage, int(m)) for m in msg_ids]
+            )
+
+def corpus_superseded(corpus_dir):
+    """Superseded msg_ids recorded in a corpus's manifest ([] if it has none)"""
+    path = os.path.join(corpus_dir, 'manifest.sqlite')
+    if not os.path.exists(path):
+        return []
+    manifest = IngestManifest(path)
+    try:
+        return manifest.superseded_ids()
+    finally:
+        manifest.close()
@@ -0,0 +1,311 @@
+# lexical_index.py - BM25 INVERTED INDEX
+"""
+Keyword (BM25) search over subjects, bodies and addresses, for the queries
+dense vectors are bad at: exact names, deal codes and email addresses.
+
+Text is lower-cased and split into word tokens. Email addresses and dotted
+or hyphenated codes are kept whole, and their parts are indexed as well, so
+"john.arnold@enron.com", "arnold" and "EOL-12345" all find the message.
+Subject tokens count SUBJECT_WEIGHT times. The From and To addresses are
+indexed with the text.
+
+An index directory holds one .npy file per array, all memory-mapped on load:
+
+    terms.npy      - 64-bit hash of each term, sorted (term id = position)
+    offsets.npy    - postings of term t are offsets[t]:offsets[t+1]
+    docs.npy       - document number per posting, ascending within a term
+    impacts.npy    - BM25 score contribution per posting (idf x length-normalized tf)
+    idf.npy        - BM25 idf per term
+    msg_ids.npy    - msg_id per document number
+    meta.json      - document count, average length, k1 / b, corpus size
+
+A query only reads the postings of its own terms. Very common terms are
+not scanned when the query has rarer ones: they are looked up only for the
+documents the rarer terms found. Every posting is scored after all when that
+yields fewer than k documents, or when a document with only common terms
+could still make the top k, so the result is always the exact BM25 top k.
+
+Usage:
+    python lexical_index.py build          # index the corpus
+    python lexical_index.py "query" [k]    # keyword search
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+SUBJECT_WEIGHT = 2
+RRF_K = 60
+# Terms in more than this fraction of documents are scored only for candidates found by rarer terms
+COMMON_TERM_FRACTION = 0.02
+META_FILE = 'meta.json'
+ARRAYS = ('terms', 'offsets', 'docs', 'impacts', 'idf', 'msg_ids')
+TEXT_LIMIT = 1000
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9._%+-]*@[a-z0-9-]+(?:\.[a-z0-9-]+)+|[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Lower-cased tokens; compound tokens (emails, codes) are followed by their parts"""
+    if not isinstance(text, str):
+        return []
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART_RE.findall(token))
+    return tokens
+
+def term_hash(term):
+    """Stable 64-bit hash of a term (the same in every process and build)"""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def document_tokens(row):
+    """Tokens of one message: subject (weighted), addresses and body"""
+    subject = tokenize(row.get('Subject'))
+    return subject * SUBJECT_WEIGHT + tokenize(row.get('From')) + tokenize(row.get('To')) + tokenize(row.get('Body'))
+
+def reciprocal_rank_fusion(rankings, k=RRF_K, top_k=None):
+    """Fuse several ranked lists of match dicts into one.
+
+    Matches are identified by metadata msg_id (or their id for legacy
+    vectors). Each list adds 1 / (k + rank) to a match's fused score; the
+    first list a match appears in supplies its metadata. The returned
+    'score' is the fused score scaled so that ranking first in every list
+    is 1.0, and 'sources' names the lists that found the match.
+    """
+    fused, order = {}, []
+    for source, matches in rankings.items():
+        for rank, match in enumerate(matches, start=1):
+            msg_id = (match.get('metadata') or {}).get('msg_id')
+            key = ('msg', int(msg_id)) if msg_id is not None else ('id', match.get('id'))
+            if key not in fused:
+                fused[key] = dict(match, score=0.0, sources=[])
+                order.append(key)
+            fused[key]['score'] += 1.0 / (k + rank)
+            fused[key]['sources'].append(source)
+    best = len(rankings) / (k + 1) if rankings else 1.0
+    results = sorted((fused[key] for key in order), key=lambda m: -m['score'])
+    for match in results:
+        match['score'] /= best
+    return results[:top_k] if top_k else results
+
+class LexicalIndex:
+    def __init__(self, terms, offsets, docs, impacts, idf, msg_ids, meta=None):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.impacts = impacts
+        self.idf = idf
+        self.msg_ids = msg_ids
+        self.meta = meta or {}
+        self.rows = None
+
+    @property
+    def num_docs(self):
+        return len(self.msg_ids)
+
+    # --- construction ---
+    @classmethod
+    def from_corpus(cls, corpus_dir, superseded=(), k1=K1, b=B):
+        """Tokenize the corpus part by part and invert it into BM25 postings"""
+        from corpus_store import iter_corpus, corpus_columns, corpus_num_rows
+
+        columns = [c for c in ('msg_id', 'Subject', 'From', 'To', 'Body') if c in corpus_columns(corpus_dir)]
+        superseded = set(superseded)
+        vocab = {}
+        term_parts, doc_parts, tf_parts, lengths, msg_ids = [], [], [], [], []
+        for part in iter_corpus(corpus_dir, columns=columns):
+            part = part[~part['msg_id'].isin(superseded)]
+            doc_terms, doc_numbers = [], []
+            for row in part.to_dict('records'):
+                tokens = document_tokens(row)
+                doc = len(msg_ids)
+                msg_ids.append(row['msg_id'])
+                lengths.append(len(tokens))
+                doc_terms.extend(vocab.setdefault(t, len(vocab)) for t in tokens)
+                doc_numbers.extend([doc] * len(tokens))
+            if not doc_terms:
+                continue
+            # Collapse (term, doc) occurrences into term frequencies
+            keys = np.array(doc_terms, dtype=np.int64) << 32 | np.array(doc_numbers, dtype=np.int64)
+            keys, tf = np.unique(keys, return_counts=True)
+            term_parts.append((keys >> 32).astype(np.int32))
+            doc_parts.append((keys & 0xFFFFFFFF).astype(np.int32))
+            tf_parts.append(tf.astype(np.float32))
+
+        n_docs = len(msg_ids)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        avgdl = float(lengths.mean()) if n_docs else 0.0
+
+        # Term ids are positions in the sorted hash array, so a query term is one binary search
+        hashes = np.fromiter((term_hash(t) for t in vocab), dtype=np.uint64, count=len(vocab))
+        order = np.argsort(hashes, kind='stable')
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[order] = np.arange(len(vocab))
+
+        term_ids = rank[np.concatenate(term_parts)] if term_parts else np.empty(0, np.int64)
+        docs = np.concatenate(doc_parts) if doc_parts else np.empty(0, np.int32)
+        tf = np.concatenate(tf_parts) if tf_parts else np.empty(0, np.float32)
+        # Parts are in document order and sorted within, so a stable sort keeps docs ascending per term
+        by_term = np.argsort(term_ids, kind='stable')
+        term_ids, docs, tf = term_ids[by_term], docs[by_term], tf[by_term]
+
+        df = np.bincount(term_ids, minlength=len(vocab))
+        offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths[docs] / avgdl) if n_docs else np.empty(0, np.float32)
+        impacts = (idf[term_ids] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+        meta = {'documents': n_docs, 'terms': len(vocab), 'postings': int(len(docs)), 'avgdl': avgdl,
+                'k1': k1, 'b': b, 'subject_weight': SUBJECT_WEIGHT,
+                'messages': corpus_num_rows(corpus_dir), 'superseded': len(superseded), 'built_at': time.time()}
+        return cls(hashes[order], offsets, docs, impacts, idf, np.asarray(msg_ids, dtype=np.int64), meta)
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        # Replace files instead of overwriting them: readers may still have the old ones memory-mapped
+        for name in ARRAYS:
+            path = os.path.join(index_dir, f'{name}.npy')
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, getattr(self, name))
+            os.replace(path + '.tmp', path)
+        path = os.path.join(index_dir, META_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        with open(os.path.join(index_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(index_dir, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in ARRAYS]
+        return cls(*arrays, meta=meta)
+
+    # --- search ---
+    def search(self, query, k=10):
+        """[(msg_id, bm25 score)] of the k best matching messages"""
+        hashes = np.unique(np.fromiter((term_hash(t) for t in tokenize(query)), dtype=np.uint64))
+        if not len(hashes) or not len(self.terms):
+            return []
+        pos = np.minimum(np.searchsorted(self.terms, hashes), len(self.terms) - 1)
+        term_ids = pos[self.terms[pos] == hashes]
+        if not len(term_ids):
+            return []
+
+        df = self.offsets[term_ids + 1] - self.offsets[term_ids]
+        common = df > self.num_docs * COMMON_TERM_FRACTION
+        if common.all() or not common.any():
+            return self._top(*self._accumulate(term_ids), k)
+
+        # Rare terms pick the candidates; common terms are only looked up for those candidates
+        # (binary search in their doc-sorted postings). A document matching common terms alone
+        # scores at most the sum of their upper bounds: if the rare terms give a full top k that
+        # beats it the result is exact, otherwise every posting is scored.
+        candidates, scores = self._accumulate(term_ids[~common])
+        for t in term_ids[common]:
+            s, e = self.offsets[t], self.offsets[t + 1]
+            postings = self.docs[s:e]
+            pos = np.minimum(np.searchsorted(postings, candidates), len(postings) - 1)
+            hit = postings[pos] == candidates
+            scores[hit] += self.impacts[s:e][pos[hit]]
+        hits = self._top(candidates, scores, k)
+        bound = float(np.sum(self.idf[term_ids[common]])) * (self.meta.get('k1', K1) + 1)
+        if len(hits) == k and hits[-1][1] >= bound:
+            return hits
+        return self._top(*self._accumulate(term_ids), k)
+
+    def _accumulate(self, term_ids):
+        """(doc numbers, scores) summed over the postings of term_ids"""
+        starts, stops = self.offsets[term_ids], self.offsets[term_ids + 1]
+        docs = np.concatenate([self.docs[s:e] for s, e in zip(starts, stops)])
+        weights = np.concatenate([self.impacts[s:e] for s, e in zip(starts, stops)])
+        # Few postings: score only the docs that occur; many: one dense accumulation over all docs
+        if len(docs) < self.num_docs // 8:
+            candidates, inverse = np.unique(docs, return_inverse=True)
+            return candidates, np.bincount(inverse, weights=weights)
+        return np.arange(self.num_docs), np.bincount(docs, weights=weights, minlength=self.num_docs)
+
+    def _top(self, candidates, scores, k):
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]
+        return [(int(self.msg_ids[d]), float(s)) for d, s in zip(candidates[top], scores[top])]
+
+    def query(self, text, top_k=10, corpus_dir=None):
+        """Matches in the same shape as VectorStore.query (id, score, metadata)"""
+        hits = self.search(text, top_k)
+        if not hits:
+            return []
+        if self.rows is None:
+            import corpus_store
+            if corpus_dir is None:
+                import path_config
+                corpus_dir = path_config.CORPUS_DIR
+            available = corpus_store.corpus_columns(corpus_dir)
+            self.rows = corpus_store.open_corpus(corpus_dir, columns=[c for c in ('From', 'To', 'Subject', 'Date', 'Body')
+                                                                       if c in available])
+        # Zero-copy one-row slices: take() on the multi-part table would concatenate whole columns
+        rows = [self.rows.slice(msg_id, 1).to_pylist()[0] for msg_id, _ in hits]
+        return [{
+            'id': str(msg_id), 'score': score,
+            'metadata': {
+                'From': row.get('From') or '', 'To': row.get('To') or '', 'Subject': row.get('Subject') or '',
+                'Date': row.get('Date') or '', 'text': (row.get('Body') or '')[:TEXT_LIMIT],
+                'email_id': str(msg_id), 'msg_id': msg_id,
+            },
+        } for (msg_id, score), row in zip(hits, rows)]
+
+def load_lexical_index(corpus_dir=None, index_dir=None, rebuild=False):
+    """Memory-map the BM25 index, rebuilding it first if the corpus has changed since"""
+    from corpus_store import corpus_num_rows
+    from ingest_manifest import IngestManifest
+
+    if corpus_dir is None or index_dir is None:
+        import path_config
+        corpus_dir = corpus_dir or path_config.CORPUS_DIR
+        index_dir = index_dir or path_config.LEXICAL_INDEX_DIR
+
+    superseded = []
+    manifest_path = os.path.join(corpus_dir, 'manifest.sqlite')
+    if os.path.exists(manifest_path):
+        manifest = IngestManifest(manifest_path)
+        superseded = manifest.superseded_ids()
+        manifest.close()
+
+    if not rebuild and os.path.exists(os.path.join(index_dir, META_FILE)):
+        index = LexicalIndex.load(index_dir)
+        if index.meta.get('messages') == corpus_num_rows(corpus_dir) \
+                and index.meta.get('superseded') == len(superseded):
+            return index
+
+    start_time = time.time()
+    index = LexicalIndex.from_corpus(corpus_dir, superseded)
+    index.save(index_dir)
+    print(f"Built BM25 index: {index.meta['documents']} documents, {index.meta['terms']} terms, "
+          f"{index.meta['postings']} postings in {time.time() - start_time:.1f}s -> {index_dir}")
+    return LexicalIndex.load(index_dir)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'build':
+        load_lexical_index(rebuild=True)
+    elif len(sys.argv) > 1:
+        index = load_lexical_index()
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        start_time = time.time()
+        matches = index.query(sys.argv[1], k)
+        print(f"{len(matches)} matches in {(time.time() - start_time) * 1000:.1f} ms")
+        for m in matches:
+            print(f"{m['score']:8.3f}  {m['metadata']['From']:<35} {m['metadata']['Subject'][:60]}")
+    else:
+        print(__doc__)
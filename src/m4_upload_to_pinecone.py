@@ -1,13 +1,14 @@
 # m4_upload_to_pinecone.py - SECURED & BLINDED
 import os
 import path_config
-import pandas as pd
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone, ServerlessSpec
+import argparse
 import sys
-import hashlib
-import time
+from dedup import cluster_emails
+from embedding_cache import open_cache
+from embedding_engine import EmbeddingEngine
+from lexical_index import load_lexical_index
+from query_cache import bump_index_version
+from vector_store import PINECONE_INDEX, DEFAULT_BACKEND, get_vector_store, make_metadata, vector_id
 from dotenv import load_dotenv  # Added for security
 
 # 1. Load the Shield (Environment Variables)
@@ -18,70 +19,70 @@ if sys.platform == 'win32':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
-# 2. Get Pinecone API Key securely from .env
-api_key = os.getenv('PINECONE_API_KEY')
+index_name = PINECONE_INDEX
+MODEL_NAME = "all-MiniLM-L6-v2"
 
-if not api_key:
-    print("❌ ERROR: PINECONE_API_KEY not found in .env file.")
-    sys.exit(1)
+# Near-duplicate similarity threshold (MinHash Jaccard estimate)
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.8'))
 
-os.environ['PINECONE_API_KEY'] = api_key
-index_name = "enron-enterprise-kg"
+def open_store(backend):
+    """Vector store to upload into; Pinecone needs the API key from .env"""
+    if backend == 'pinecone':
+        # 2. Get Pinecone API Key securely from .env
+        api_key = os.getenv('PINECONE_API_KEY')
+        if not api_key:
+            print("❌ ERROR: PINECONE_API_KEY not found in .env file.")
+            sys.exit(1)
+        store = get_vector_store('pinecone', index_name=index_name, api_key=api_key)
+        store.create_index_if_not_exists()
+        return store
+    return get_vector_store(backend)
 
-# Initialize Pinecone with secure key
-pc = Pinecone(api_key=api_key)
-
-def create_index_if_not_exists():
-    """Create Pinecone index if it doesn't exist"""
-    indexes = pc.list_indexes().names()
-    print(f"Existing indexes: {indexes}")
-    
-    if index_name not in indexes:
-        print(f"Creating new index: {index_name}")
-        pc.create_index(
-            name=index_name,
-            dimension=384,
-            metric='cosine',
-            spec=ServerlessSpec(
-                cloud='aws',
-                region='us-east-1'
-            )
-        )
-        print("Waiting for index to initialize...")
-        time.sleep(15)
-        print("✅ Index created successfully!")
-    else:
-        print(f"ℹ️ Index '{index_name}' already exists")
-
-def remove_duplicate_emails(df):
-    """Remove duplicate emails based on content hash"""
+def remove_duplicate_emails(df, threshold=DEDUP_THRESHOLD):
+    """Keep one representative per exact or near-duplicate cluster"""
     print(f"Initial rows: {len(df)}")
-    df['content_hash'] = df['Body'].astype(str).apply(
-        lambda x: hashlib.md5(x.encode('utf-8', errors='ignore')).hexdigest()
-    )
-    df_unique = df.drop_duplicates(subset=['content_hash'], keep='first')
-    df_unique = df_unique.drop_duplicates(
-        subset=['From', 'To', 'Subject', 'Body'], 
-        keep='first'
-    )
+    df = cluster_emails(df, text_column='Body', threshold=threshold)
+    exact_dupes = len(df) - df['content_hash'].nunique()
+    df_unique = df[df['is_representative']]
+    print(f"Exact duplicates: {exact_dupes} | Near-duplicate clusters (>= {threshold:.0%} similar): "
+          f"{int((df_unique['cluster_size'] > 1).sum())}")
     print(f"After deduplication: {len(df_unique)} rows")
     return df_unique
 
-def upload_to_cloud():
-    print("--- Enterprise Cloud Upload Started ---")
-    create_index_if_not_exists()
-    
-    csv_path = path_config.PROCESSED_EMAILS_CSV
-    print(f"Loading data from: {csv_path}")
+def upload_to_cloud(backend=DEFAULT_BACKEND):
+    print(f"--- Enterprise Cloud Upload Started ({backend}) ---")
+    store = open_store(backend)
+
+    corpus_dir = path_config.CORPUS_DIR
+    print(f"Loading data from: {corpus_dir}")
     
-    if not os.path.exists(csv_path):
-        print(f"ERROR: File not found at {csv_path}")
+    if not os.path.isdir(corpus_dir):
+        print(f"ERROR: Corpus not found at {corpus_dir}")
         return
     
+    # Only upload messages that arrived since the last upload (the manifest delta)
+    manifest = path_config.open_manifest()
+    start, stop = manifest.delta(backend)
+
+    # Messages replaced by a newer version: drop their old vectors (the new version is in a delta)
+    retracted = manifest.pending_retractions(backend, start)
+    if retracted:
+        print(f"Removing {len(retracted)} superseded vectors...")
+        store.delete([vector_id(m) for m in retracted])
+        manifest.mark_retracted(backend, retracted)
+
+    if stop <= start:
+        print(f"{backend} index is up to date - no new messages to upload.")
+        manifest.close()
+        return
+    print(f"New messages since last upload: {stop - start} (msg_id {start} to {stop - 1})")
+
     print("Loading and deduplicating data...")
-    df = pd.read_csv(csv_path)
+    df = path_config.load_corpus(columns=['msg_id', 'From', 'To', 'Subject', 'Date', 'Body'], rows=(start, stop))
+    df = df[~df['msg_id'].isin(manifest.superseded_ids(start, stop))]
     df = df.dropna(subset=['Body'])
     df = remove_duplicate_emails(df)
+    truncated = len(df) > 500
     df = df.head(500).fillna("")
     
     print(f"Final upload count: {len(df)} unique emails")
@@ -90,36 +91,35 @@ def upload_to_cloud():
     metadatas = []
     ids = []
     
-    for idx, row in df.iterrows():
-        email_id = hashlib.md5(
-            f"{row.get('From', '')}_{row.get('To', '')}_{row.get('Subject', '')}_{idx}".encode()
-        ).hexdigest()[:16]
+    for _, row in df.iterrows():
+        # msg_id is stable across runs; the DataFrame index restarts at 0 in every delta
+        email_id = vector_id(row['msg_id'])
         
         ids.append(email_id)
-        metadatas.append({
-            'From': str(row.get('From', ''))[:100],
-            'To': str(row.get('To', ''))[:100],
-            'Subject': str(row.get('Subject', ''))[:100],
-            'Date': str(row.get('Date', ''))[:50],
-            'email_id': email_id
-        })
-
-    print("Loading the all-MiniLM-L6-v2 embedding model...")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-    print(f"Uploading {len(texts)} unique vectors to Pinecone index: '{index_name}'...")
-    
-    vectorstore = PineconeVectorStore.from_texts(
-        texts=texts,
-        embedding=embeddings,
-        index_name=index_name,
-        metadatas=metadatas,
-        ids=ids
-    )
+        metadatas.append(make_metadata(row, email_id))
+
+    print(f"Loading the {MODEL_NAME} embedding model...")
+    with EmbeddingEngine(MODEL_NAME) as engine:
+        cache = open_cache(MODEL_NAME, backend=engine.backend, model=engine.model)
+        vectors = cache.get_or_compute(texts, engine.encode)
+
+    print(f"Uploading {len(texts)} unique vectors to the {backend} store...")
+    store.upsert(ids, vectors, metadatas)
     
+    # Anything past the 500-row cap is picked up by the next run
+    done = int(df['msg_id'].max()) + 1 if truncated else stop
+    manifest.mark_done(backend, done)
+    manifest.close()
+
+    # Keep the BM25 keyword index in step with the corpus (rebuilt only if it has changed)
+    load_lexical_index(corpus_dir)
+    bump_index_version(f'{backend} upload')
+
     print("\n" + "="*50)
     print("✅ Upload Complete!")
     print("="*50)
 
 if __name__ == "__main__":
-    upload_to_cloud()
+    parser = argparse.ArgumentParser(description="Upload new messages to the vector store")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND, choices=['pinecone', 'faiss'])
+    upload_to_cloud(parser.parse_args().backend)
@@ -1,10 +1,216 @@
 # milestone1_preprocessing.py - FIXED for Windows
 
 import json
+import ijson
+import re
+import hashlib
+import itertools
 import pandas as pd
 import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import getaddresses
+from corpus_store import CorpusWriter, MESSAGES_TABLE, truncate_parts
+from ingest_manifest import IngestManifest, source_signature
 
-def process_huge_json(input_file, output_csv):
+# Rows cleaned and written per step in streaming mode. Peak memory is bounded by
+# this number (times the number of chunks in flight), not by the size of the input.
+DEFAULT_CHUNK_SIZE = 10000
+EDGES_TABLE = 'edges'
+EPOCH = pd.Timestamp('1970-01-01', tz='UTC')
+REQUIRED_COLUMNS = ['From', 'To', 'Body']
+MANIFEST_FILE = 'manifest.sqlite'
+
+def clean_emails(df):
+    """Drop rows where critical fields are NaN or empty"""
+    df = df.dropna(subset=['From', 'To', 'Body'])
+    df = df[(df['From'] != "") & (df['To'] != "")]
+    return df
+
+def split_addresses(field):
+    """Parse an address header into a list of (display_name, email) pairs.
+
+    Emails are lower-cased and stripped of whitespace, quotes and angle
+    brackets; duplicates within the header are dropped.
+    """
+    if not isinstance(field, str) or not field.strip():
+        return []
+    field = re.sub(r'\s+', ' ', field)
+    seen = set()
+    pairs = []
+    for name, addr in getaddresses([field]):
+        addr = addr.strip().strip('\'"<>').lower()
+        if not addr or addr in seen:
+            continue
+        seen.add(addr)
+        pairs.append((name.strip().strip('\'"'), addr))
+    return pairs
+
+def parse_timestamps(dates):
+    """Parse RFC 2822 style Date headers into epoch seconds (nullable Int64)"""
+    # Enron dates look like "Mon, 14 May 2001 16:39:00 -0700 (PDT)"
+    cleaned = dates.astype('string').str.replace(r'\s*\([^)]*\)\s*$', '', regex=True)
+    parsed = pd.to_datetime(cleaned, utc=True, errors='coerce', format='mixed')
+    return ((parsed - EPOCH) // pd.Timedelta(seconds=1)).astype('Int64')
+
+def _digest(*fields):
+    """Short, stable hex digest of a tuple of field values"""
+    h = hashlib.blake2b(digest_size=16)
+    for field in fields:
+        h.update(str(field).encode('utf-8', errors='ignore'))
+        h.update(b'\x1f')
+    return h.hexdigest()
+
+def message_keys(df):
+    """Stable identity of each message: its Message-ID if present, else a header digest"""
+    message_ids = df['Message-ID'] if 'Message-ID' in df.columns else pd.Series([None] * len(df), index=df.index)
+    thread_ids = df['thread_id'] if 'thread_id' in df.columns else pd.Series([""] * len(df), index=df.index)
+    dates = df['Date'] if 'Date' in df.columns else thread_ids
+    subjects = df['Subject'] if 'Subject' in df.columns else thread_ids
+    return [
+        str(mid) if isinstance(mid, str) and mid else _digest(tid, sender, date, subject)
+        for mid, tid, sender, date, subject in zip(message_ids, thread_ids, df['From'], dates, subjects)
+    ]
+
+def prepare_chunk(messages, columns=None):
+    """Clean and normalize one chunk of raw messages.
+
+    Returns (messages_df, edges_df). Senders and recipients are normalized,
+    Date is parsed into a ``timestamp`` column and every sender->recipient
+    pair becomes one edge row. Edge rows refer to messages by their position
+    in messages_df (``row``); the caller turns that into a global msg_id.
+    """
+    df = pd.DataFrame(messages)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    df = clean_emails(df).reset_index(drop=True)
+
+    senders = [split_addresses(f) for f in df['From']]
+    recipients = [split_addresses(t) for t in df['To']]
+    df['From'] = [p[0][1] if p else "" for p in senders]
+    df['From_name'] = [p[0][0] if p else "" for p in senders]
+    df['To'] = [", ".join(addr for _, addr in p) for p in recipients]
+    df = df[(df['From'] != "") & (df['To'] != "")]
+    keep = df.index
+    df = df.reset_index(drop=True)
+
+    if 'Date' in df.columns:
+        df['timestamp'] = parse_timestamps(df['Date'])
+    else:
+        df['timestamp'] = pd.array([None] * len(df), dtype='Int64')
+
+    # Identity and content hashes drive incremental ingestion (see ingest_manifest)
+    subjects = df['Subject'] if 'Subject' in df.columns else df['To']
+    df['msg_key'] = message_keys(df)
+    df['content_hash'] = [_digest(*f) for f in zip(df['From'], df['To'], subjects, df['Body'])]
+
+    rows, edge_senders, edge_recipients = [], [], []
+    for row, orig in enumerate(keep):
+        sender = df.at[row, 'From']
+        for _, addr in recipients[orig]:
+            if addr != sender:
+                rows.append(row)
+                edge_senders.append(sender)
+                edge_recipients.append(addr)
+    edges = pd.DataFrame({'row': pd.Series(rows, dtype='int64'),
+                          'sender': pd.Series(edge_senders, dtype=object),
+                          'recipient': pd.Series(edge_recipients, dtype=object)})
+    edges['timestamp'] = df['timestamp'].take(edges['row']).reset_index(drop=True)
+    return df, edges
+
+def _chunk_columns(chunk):
+    """Column layout taken from the first chunk, used for every later chunk"""
+    columns = list(dict.fromkeys(key for msg in chunk for key in msg))
+    for col in REQUIRED_COLUMNS:
+        if col not in columns:
+            columns.append(col)
+    return columns
+
+def _prepare_chunk_args(args):
+    messages, columns = args
+    df, edges = prepare_chunk(messages, columns)
+    return df, edges, len(messages)
+
+def _bounded_map(executor, fn, iterable, max_pending):
+    """Like executor.map but keeps at most max_pending chunks in flight"""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+class ChunkSink:
+    """Writes prepared chunks to the message and edge tables with global msg_ids.
+
+    Only messages that are new or whose content changed since the last run
+    are written; each chunk is then committed to the manifest, which is what
+    makes an interrupted run resumable.
+    """
+
+    def __init__(self, corpus_dir, manifest, output_csv=None):
+        # Parts written after the last manifest commit belong to an interrupted chunk
+        for table in (MESSAGES_TABLE, EDGES_TABLE):
+            truncate_parts(corpus_dir, manifest.parts_committed, table)
+        self.messages = CorpusWriter(corpus_dir, MESSAGES_TABLE)
+        self.edges = CorpusWriter(corpus_dir, EDGES_TABLE)
+        self.manifest = manifest
+        self.next_msg_id = manifest.watermark
+        mode = 'a' if self.next_msg_id else 'w'
+        self.csv_out = open(output_csv, mode, encoding='utf-8', newline='') if output_csv else None
+        self.rows_written = 0
+        self.edges_written = 0
+        self.unchanged = 0
+
+    def write(self, df, edges, source_offset):
+        df = df.drop_duplicates(subset=['msg_key'], keep='last')
+        known = self.manifest.known_hashes(df['msg_key'])
+        changed = [known.get(k, (None, None))[0] != h for k, h in zip(df['msg_key'], df['content_hash'])]
+        self.unchanged += len(df) - sum(changed)
+        df = df[changed]
+        if df.empty:
+            self.manifest.advance_source(source_offset)
+            return
+
+        superseded = [known[k][1] for k in df['msg_key'] if k in known]
+        edges = edges[edges['row'].isin(df.index)]
+        positions = pd.Series(range(len(df)), index=df.index)
+        df = df.reset_index(drop=True)
+        edges = edges.assign(row=positions.loc[edges['row']].values).reset_index(drop=True)
+
+        df.insert(0, 'msg_id', range(self.next_msg_id, self.next_msg_id + len(df)))
+        edges.insert(0, 'msg_id', edges.pop('row') + self.next_msg_id)
+        self.messages.write(df)
+        self.edges.write(edges)
+        if self.csv_out:
+            df.to_csv(self.csv_out, index=False, header=self.next_msg_id == 0)
+        self.next_msg_id += len(df)
+        self.rows_written += len(df)
+        self.edges_written += len(edges)
+
+        thread_ids = df['thread_id'] if 'thread_id' in df.columns else [None] * len(df)
+        records = [
+            (key, content_hash, int(msg_id), None if pd.isna(tid) else str(tid))
+            for key, content_hash, msg_id, tid in zip(df['msg_key'], df['content_hash'], df['msg_id'], thread_ids)
+        ]
+        self.manifest.commit_chunk(records, superseded, self.next_msg_id, source_offset, self.messages.next_part)
+
+    def close(self):
+        if self.csv_out:
+            self.csv_out.close()
+
+def open_manifest(corpus_dir, full_rebuild=False):
+    """Open the corpus manifest; full_rebuild forgets previous runs"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    manifest = IngestManifest(os.path.join(corpus_dir, MANIFEST_FILE))
+    if full_rebuild:
+        manifest.reset()
+    return manifest
+
+def process_huge_json(input_file, corpus_dir, output_csv=None, full_rebuild=False):
     # 1. Load the raw data (Ingestion)
     if not os.path.exists(input_file):
         print(f"Error: {input_file} not found.")
@@ -14,7 +220,7 @@ def process_huge_json(input_file, output_csv):
 
     with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    
+
     all_emails = []
 
     # 2. Handle Data Variety (Transformation)
@@ -26,30 +232,133 @@ def process_huge_json(input_file, output_csv):
     else:
         all_emails = data
 
-    # 3. Data Quality & Cleaning
-    df = pd.DataFrame(all_emails)
+    # 3. Data Quality & Cleaning (normalize addresses, parse dates, split recipients)
+    df, edges = prepare_chunk(all_emails)
 
-    # Drop rows where critical fields are NaN or empty
-    df = df.dropna(subset=['From', 'To', 'Body'])
-    df = df[(df['From'] != "") & (df['To'] != "")]
-    
-    # 4. Save to CSV
-    df.to_csv(output_csv, index=False, encoding='utf-8')
-    print(f"Milestone 1 Complete: {output_csv} created with {len(df)} cleaned rows.")
-    print(f"File saved at: {os.path.abspath(output_csv)}")
+    # 4. Append new/changed messages to the columnar corpus store (and optionally a CSV export)
+    manifest = open_manifest(corpus_dir, full_rebuild)
+    manifest.begin_run(source_signature(input_file))
+    sink = ChunkSink(corpus_dir, manifest, output_csv)
+    sink.write(df, edges, len(all_emails))
+    sink.close()
+    manifest.finish_run()
+    manifest.close()
+    print(f"Milestone 1 Complete: {sink.rows_written} new or changed rows and {sink.edges_written} edges "
+          f"written ({sink.unchanged} unchanged skipped).")
+    print(f"Corpus saved at: {os.path.abspath(corpus_dir)}")
+
+def iter_messages(input_file):
+    """Yield messages one at a time without loading the whole JSON file.
+
+    Handles both layouts of the input: a dict of thread_id -> [messages]
+    (each message gets its thread_id attached) and a flat array of messages.
+    """
+    with open(input_file, 'rb') as f:
+        # Peek at the first non-whitespace byte to tell the two layouts apart
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+
+        if first == b'{':
+            for thread_id, messages in ijson.kvitems(f, '', use_float=True):
+                for msg in messages:
+                    msg['thread_id'] = thread_id
+                    yield msg
+        else:
+            for msg in ijson.items(f, 'item', use_float=True):
+                yield msg
+
+def iter_chunks(messages, chunk_size):
+    """Group an iterator of messages into lists of at most chunk_size"""
+    chunk = []
+    for msg in messages:
+        chunk.append(msg)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def process_huge_json_streaming(input_file, corpus_dir, output_csv=None,
+                                chunk_size=DEFAULT_CHUNK_SIZE, workers=None, full_rebuild=False):
+    """Streaming version of process_huge_json with bounded memory.
+
+    Parses the input incrementally and prepares chunk_size messages at a time
+    on a pool of worker processes, appending new or changed messages to the
+    message and edge tables (and output_csv if given) in input order and
+    reporting throughput as it goes. An interrupted run on the same input
+    resumes after the last committed chunk.
+    """
+    if not os.path.exists(input_file):
+        print(f"Error: {input_file} not found.")
+        print(f"Looking for file at: {os.path.abspath(input_file)}")
+        return
+
+    workers = workers or os.cpu_count() or 1
+    manifest = open_manifest(corpus_dir, full_rebuild)
+    resume_offset = manifest.begin_run(source_signature(input_file))
+    if resume_offset:
+        print(f"Resuming interrupted run after {resume_offset:,} source messages")
+    sink = ChunkSink(corpus_dir, manifest, output_csv)
+    rows_in = 0
+    source_offset = resume_offset
+    start_time = time.time()
+
+    def tasks():
+        # The output columns are fixed by the first chunk so every part has the same layout
+        nonlocal rows_in
+        columns = None
+        messages = itertools.islice(iter_messages(input_file), resume_offset, None)
+        for chunk in iter_chunks(messages, chunk_size):
+            if columns is None:
+                columns = _chunk_columns(chunk)
+            rows_in += len(chunk)
+            yield chunk, columns
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for df, edges, raw_count in _bounded_map(executor, _prepare_chunk_args, tasks(), workers * 2):
+                source_offset += raw_count
+                sink.write(df, edges, source_offset)
+                elapsed = max(time.time() - start_time, 1e-9)
+                print(f"  {rows_in:,} parsed | {sink.rows_written:,} written | {sink.unchanged:,} unchanged | "
+                      f"{sink.edges_written:,} edges | {rows_in / elapsed:,.0f} rows/sec")
+        manifest.finish_run()
+    finally:
+        sink.close()
+        manifest.close()
+
+    elapsed = time.time() - start_time
+    print(f"Milestone 1 Complete: {sink.rows_written} new or changed rows and {sink.edges_written} edges "
+          f"written, {sink.unchanged} unchanged skipped ({rows_in} parsed in {elapsed:.1f}s, {workers} workers).")
+    print(f"Corpus saved at: {os.path.abspath(corpus_dir)}")
 
 if __name__ == "__main__":
     # Get the directory where this script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(script_dir, 'data')
-    
+
     # Ensure the data directory exists
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
         print(f"Created data directory: {data_dir}")
-    
+
     input_file = os.path.join(data_dir, 'cleaned_enron_emails.json')
-    output_file = os.path.join(data_dir, 'processed_emails.csv')
-    
+    corpus_dir = os.path.join(data_dir, 'corpus')
+
     print(f"Looking for input file: {input_file}")
-    process_huge_json(input_file, output_file)
+    full_rebuild = '--full' in sys.argv
+    if '--stream' in sys.argv:
+        process_huge_json_streaming(input_file, corpus_dir, full_rebuild=full_rebuild)
+    else:
+        process_huge_json(input_file, corpus_dir, full_rebuild=full_rebuild)
+
+    # Keep the day/week/month rollups in step with the corpus
+    from temporal_rollups import update_rollups
+    added = update_rollups(corpus_dir, os.path.join(data_dir, 'rollups.sqlite'), full_rebuild=full_rebuild)
+    print(f"Rollups updated: {added} new messages")
+
+    # Rebuild conversation threads over the whole corpus (graph build and search join on them)
+    from thread_index import load_threads
+    load_threads(corpus_dir, os.path.join(data_dir, 'threads'), rebuild=True)
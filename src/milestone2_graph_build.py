@@ -1,7 +1,16 @@
 # milestone2_graph_build.py - SECURED & BLINDED
 import pandas as pd
 import path_config  # Auto-added for path configuration
+from corpus_store import read_corpus, open_corpus, corpus_columns, list_parts
+from thread_index import load_threads, message_threads
+from ingest_manifest import corpus_superseded
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from neo4j import GraphDatabase
+from neo4j.time import Duration
+import numpy as np
+import argparse
+import hashlib
+import json
 import time
 import os
 import sys
@@ -16,42 +25,580 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+# Bulk load tuning: edge rows per transaction, concurrent transactions, retry budget
+BATCH_SIZE = int(os.getenv('GRAPH_BATCH_SIZE', '5000'))
+WORKERS = int(os.getenv('GRAPH_WORKERS', '4'))
+MAX_RETRY_TIME = float(os.getenv('GRAPH_MAX_RETRY_TIME', '60'))
+
+# Created before every load; MERGE/MATCH on Person.email and date range scans rely on them
+SCHEMA_QUERIES = [
+    "CREATE CONSTRAINT person_email IF NOT EXISTS FOR (p:Person) REQUIRE p.email IS UNIQUE",
+    "CREATE INDEX sent_thread_id IF NOT EXISTS FOR ()-[r:SENT]-() ON (r.thread_id)",
+    "CREATE INDEX sent_date IF NOT EXISTS FOR ()-[r:SENT]-() ON (r.date)",
+    # SENT edges are merged, retracted and re-threaded by msg_id
+    "CREATE INDEX sent_msg_id IF NOT EXISTS FOR ()-[r:SENT]-() ON (r.msg_id)",
+]
+
+# Read paths timed before and after each load (see --profile)
+PROFILE_QUERIES = {
+    'neighbors': """
+        MATCH (p:Person {email: $email})-[c:COMMUNICATES]-(connected)
+        RETURN connected.email AS target, sum(c.count) AS weight
+        ORDER BY weight DESC LIMIT 25
+    """,
+    'thread': """
+        MATCH (a:Person)-[r:SENT]->(b:Person) WHERE r.thread_id = $thread_id
+        RETURN a.email, b.email, r.date ORDER BY r.date
+    """,
+    'date_range': """
+        MATCH ()-[r:SENT]->() WHERE r.date >= $date_from AND r.date < $date_to
+        RETURN count(r) AS count
+    """,
+}
+TIMINGS_FILE = path_config.get_data_path('graph_timings.json')
+# Thread id per msg_id as last written to Neo4j, compared with the thread index after a rebuild
+GRAPH_THREADS_FILE = path_config.get_data_path('graph_threads.npy')
+
+PERSON_QUERY = """
+UNWIND $batch AS email
+MERGE (:Person {email: email})
+"""
+
+# SENT is merged on msg_id so a batch that is replayed after a failure does not duplicate edges
+SENT_QUERY = """
+UNWIND $batch AS row
+MATCH (s:Person {email: row.sender})
+MATCH (r:Person {email: row.recipient})
+MERGE (s)-[e:SENT {msg_id: row.msg_id}]->(r)
+SET e.subject = toString(row.Subject),
+    e.date = CASE WHEN row.timestamp IS NULL THEN null ELSE datetime({epochSeconds: row.timestamp}) END,
+    e.thread_id = toString(row.thread)
+"""
+
+# One aggregated edge per sender/recipient pair. A pair's delta is applied only if the
+# edge has not seen those messages yet (msg_hi), so a retried batch is not double counted.
+COMMUNICATES_QUERY = """
+UNWIND $batch AS row
+MATCH (s:Person {email: row.sender})
+MATCH (r:Person {email: row.recipient})
+MERGE (s)-[c:COMMUNICATES]->(r)
+ON CREATE SET c.count = 0, c.threads = [], c.msg_hi = -1
+WITH c, row WHERE c.msg_hi < row.msg_lo
+SET c.count = c.count + row.count,
+    c.first_ts = CASE WHEN c.first_ts IS NULL OR row.first_ts < c.first_ts THEN row.first_ts ELSE c.first_ts END,
+    c.last_ts = CASE WHEN c.last_ts IS NULL OR row.last_ts > c.last_ts THEN row.last_ts ELSE c.last_ts END,
+    c.threads = c.threads + [t IN row.threads WHERE NOT t IN c.threads],
+    c.msg_hi = row.msg_hi
+SET c.thread_count = size(c.threads)
+"""
+
+# A message replaced by a newer version loses its SENT edges. Its pair count is only
+# decremented if COMMUNICATES already folded it in (msg_hi), which keeps this in step
+# with a pinned COMMUNICATES retry that leaves superseded messages out.
+RETRACT_QUERY = """
+UNWIND $batch AS id
+MATCH (s:Person)-[e:SENT {msg_id: id}]->(r:Person)
+OPTIONAL MATCH (s)-[c:COMMUNICATES]->(r)
+DELETE e
+WITH c, id WHERE c IS NOT NULL AND c.msg_hi >= id
+SET c.count = c.count - 1
+WITH c WHERE c.count <= 0
+DELETE c
+"""
+
+# A thread index rebuild can merge threads and so renumber messages that are already loaded
+RETHREAD_QUERY = """
+UNWIND $batch AS row
+MATCH ()-[e:SENT {msg_id: row.msg_id}]->()
+SET e.thread_id = row.thread
+"""
+
+# Thread list of a pair from its SENT edges, limited to the messages COMMUNICATES has folded in
+PAIR_THREADS_QUERY = """
+UNWIND $batch AS row
+MATCH (s:Person {email: row.sender})-[c:COMMUNICATES]->(r:Person {email: row.recipient})
+OPTIONAL MATCH (s)-[e:SENT]->(r) WHERE e.msg_id <= c.msg_hi AND e.thread_id IS NOT NULL
+WITH c, collect(DISTINCT e.thread_id) AS threads
+SET c.threads = threads, c.thread_count = size(threads)
+"""
+
+def aggregate_pairs(edges):
+    """One row per (sender, recipient) with message count, first/last timestamp,
+    distinct thread ids and the msg_id range the row covers.
+
+    edges: msg_id, sender, recipient, timestamp and (optional) thread columns
+    """
+    pairs = edges.groupby(['sender', 'recipient'], sort=False).agg(
+        count=('msg_id', 'size'), first_ts=('timestamp', 'min'), last_ts=('timestamp', 'max'),
+        msg_lo=('msg_id', 'min'), msg_hi=('msg_id', 'max'))
+    if 'thread' in edges.columns:
+        threads = edges.dropna(subset=['thread']).groupby(['sender', 'recipient'])['thread'].unique()
+        pairs['threads'] = threads.reindex(pairs.index)
+    else:
+        pairs['threads'] = None
+    arrays = (np.ndarray, pd.api.extensions.ExtensionArray)
+    pairs['threads'] = [sorted(map(str, t)) if isinstance(t, arrays) else [] for t in pairs['threads']]
+    return pairs.reset_index()
+
+def read_edges(corpus_dir, lo, hi, headers=(), threads=None, superseded=()):
+    """Edge rows lo:hi with each message's thread id (and any other header columns).
+
+    threads: thread id per msg_id from the thread index (message_threads());
+    without it the input's own thread id column is used, if there is one.
+    superseded: msg_ids replaced by a newer version, whose rows are dropped.
+    """
+    edges = read_corpus(corpus_dir, columns=['msg_id', 'sender', 'recipient', 'timestamp'],
+                        rows=(lo, hi), table='edges')
+    if len(superseded):
+        edges = edges[~edges['msg_id'].isin(superseded)].reset_index(drop=True)
+    available = corpus_columns(corpus_dir)
+    thread_column = None
+    if threads is not None and len(edges) and int(edges['msg_id'].iloc[-1]) < len(threads):
+        thread_ids = np.asarray(threads[edges['msg_id'].values])
+        edges['thread'] = pd.Series(thread_ids, dtype='Int64').mask(thread_ids < 0)
+    else:
+        thread_column = next((c for c in ('threadId', 'thread_id') if c in available), None)
+    columns = [c for c in headers if c in available] + ([thread_column] if thread_column else [])
+    if columns and len(edges):
+        first = int(edges['msg_id'].iloc[0])
+        messages = read_corpus(corpus_dir, columns=columns, rows=(first, int(edges['msg_id'].iloc[-1]) + 1))
+        for column in columns:
+            edges['thread' if column == thread_column else column] = \
+                messages[column].values[edges['msg_id'].values - first]
+    return edges
+
+def save_graph_threads(threads, path=GRAPH_THREADS_FILE):
+    """Record the thread ids the graph now holds (thread id per msg_id below the graph watermark)"""
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, np.asarray(threads, dtype=np.int64))
+    os.replace(path + '.tmp', path)
+
+def changed_threads(threads, loaded, path=GRAPH_THREADS_FILE):
+    """msg_ids below loaded whose thread id differs from the one last written to the graph.
+
+    Without a record every loaded message counts as changed.
+    """
+    current = np.asarray(threads[:loaded], dtype=np.int64)
+    written = np.load(path)[:loaded] if os.path.exists(path) else np.empty(0, dtype=np.int64)
+    written = np.concatenate([written, np.full(len(current) - len(written), -2, dtype=np.int64)])
+    return np.flatnonzero(written != current)
+
+def current_threads(corpus_dir):
+    """Thread id per msg_id from the thread index (rebuilt first if the corpus changed), or None"""
+    try:
+        return load_threads(corpus_dir).message_thread
+    except Exception as e:
+        print(f"Thread index unavailable ({e}) - using the input's thread ids.")
+        return None
+
+def _records(df):
+    """DataFrame rows as driver-friendly dicts (python scalars, None for missing)"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def record_timings(entry, path=TIMINGS_FILE):
+    """Append one timing entry to the JSON timing log"""
+    log = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            log = json.load(f)
+    log.append(dict(entry, at=time.strftime('%Y-%m-%dT%H:%M:%S')))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(log, f, indent=2)
+
+# --- Offline bulk import (neo4j-admin database import) ---
+EXPORT_CHUNK_ROWS = 1_000_000
+EXPORT_META_FILE = 'export_meta.json'
+
+# Header files are separate so the data part files can be written in parallel without headers
+EXPORT_HEADERS = {
+    'persons_header.csv': ['personId:ID(Person)', 'email'],
+    'sent_header.csv': [':START_ID(Person)', ':END_ID(Person)', 'msg_id:long', 'subject',
+                        'date:datetime', 'thread_id'],
+    'communicates_header.csv': [':START_ID(Person)', ':END_ID(Person)', 'count:long', 'first_ts:long',
+                                'last_ts:long', 'msg_hi:long', 'thread_count:int', 'threads:string[]'],
+}
+
+def person_ids(emails):
+    """Stable 63-bit integer id per email, the same in every export"""
+    return np.array([int.from_bytes(hashlib.blake2b(e.encode('utf-8'), digest_size=8).digest(), 'big') >> 1
+                     for e in emails], dtype=np.int64)
+
+def _export_chunk(corpus_dir, out_dir, part, lo, hi, superseded=()):
+    """Write SENT rows for edge rows lo:hi; return the chunk's emails and pair aggregates"""
+    edges = read_edges(corpus_dir, lo, hi, headers=['Subject'], threads=message_threads(), superseded=superseded)
+    dates = pd.to_datetime(edges['timestamp'].astype('float64'), unit='s', utc=True)
+    sent = pd.DataFrame({
+        'start': person_ids(edges['sender']),
+        'end': person_ids(edges['recipient']),
+        'msg_id': edges['msg_id'],
+        'subject': edges['Subject'] if 'Subject' in edges else None,
+        'date': dates.dt.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'thread_id': edges['thread'] if 'thread' in edges else None,
+    })
+    sent.to_csv(os.path.join(out_dir, f'sent-{part:05d}.csv'), header=False, index=False)
+    emails = pd.unique(pd.concat([edges['sender'], edges['recipient']]).dropna())
+    return emails, aggregate_pairs(edges)
+
+def export_import_files(corpus_dir, out_dir, workers=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write node and relationship CSVs for neo4j-admin database import.
+
+    SENT part files are written in parallel straight from the corpus edge
+    table; Person nodes are deduplicated and COMMUNICATES edges aggregated
+    from the per-chunk results. Messages replaced by a newer version are
+    left out. Node ids are hashes of the email, so they are stable across
+    exports. Returns the number of messages exported.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for name, header in EXPORT_HEADERS.items():
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+            f.write(','.join(header) + '\n')
+
+    stop = open_corpus(corpus_dir, columns=['msg_id']).num_rows
+    n_edges = open_corpus(corpus_dir, columns=['msg_id'], table='edges').num_rows
+    chunks = [(lo, min(lo + chunk_rows, n_edges)) for lo in range(0, n_edges, chunk_rows)]
+    print(f"--- Exporting {n_edges} edges from {stop} messages in {len(chunks)} chunks -> {out_dir} ---")
+
+    start_time = time.time()
+    current_threads(corpus_dir)  # build the thread index once; the workers memory-map it
+    superseded = corpus_superseded(corpus_dir)
+    emails, pair_parts = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_export_chunk, corpus_dir, out_dir, part, lo, hi, superseded)
+                   for part, (lo, hi) in enumerate(chunks)]
+        for future in as_completed(futures):
+            chunk_emails, chunk_pairs = future.result()
+            emails.append(chunk_emails)
+            pair_parts.append(chunk_pairs)
+    print(f"SENT files written in {time.time() - start_time:.1f}s")
+
+    emails = pd.unique(np.concatenate(emails)) if emails else np.array([], dtype=object)
+    pd.DataFrame({'id': person_ids(emails), 'email': emails}).to_csv(
+        os.path.join(out_dir, 'persons.csv'), header=False, index=False)
+
+    # A pair can span chunks: combine the per-chunk aggregates
+    pairs = pd.concat(pair_parts, ignore_index=True) if pair_parts else aggregate_pairs(read_edges(corpus_dir, 0, 0))
+    pairs = pairs.groupby(['sender', 'recipient'], sort=False).agg(
+        count=('count', 'sum'), first_ts=('first_ts', 'min'), last_ts=('last_ts', 'max'),
+        msg_hi=('msg_hi', 'max'), threads=('threads', lambda ts: sorted(set().union(*ts)))).reset_index()
+    pd.DataFrame({
+        'start': person_ids(pairs['sender']),
+        'end': person_ids(pairs['recipient']),
+        'count': pairs['count'],
+        'first_ts': pairs['first_ts'],
+        'last_ts': pairs['last_ts'],
+        'msg_hi': pairs['msg_hi'],
+        'thread_count': pairs['threads'].map(len),
+        'threads': pairs['threads'].map(';'.join),
+    }).to_csv(os.path.join(out_dir, 'communicates.csv'), header=False, index=False)
+
+    threads = message_threads()
+    if threads is not None:
+        save_graph_threads(threads[:stop], os.path.join(out_dir, 'threads.npy'))
+    with open(os.path.join(out_dir, EXPORT_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'messages': stop, 'edges': n_edges, 'persons': len(emails), 'pairs': len(pairs),
+                   'superseded_ids': superseded}, f, indent=2)
+    print(f"Exported {len(emails)} people, {n_edges} SENT and {len(pairs)} COMMUNICATES edges "
+          f"in {time.time() - start_time:.1f}s")
+    print("\nImport into an empty, stopped database with:")
+    print(f"  neo4j-admin database import full neo4j --id-type=INTEGER --array-delimiter=';' \\\n"
+          f"    --nodes=Person={out_dir}/persons_header.csv,{out_dir}/persons.csv \\\n"
+          f"    --relationships=SENT={out_dir}/sent_header.csv,{out_dir}/sent-.*\\.csv \\\n"
+          f"    --relationships=COMMUNICATES={out_dir}/communicates_header.csv,{out_dir}/communicates.csv")
+    print(f"then run this script with --mark-imported {out_dir} so later loads only send the delta.")
+    return stop
+
+def mark_imported(out_dir, manifest):
+    """Advance the graph watermarks to what an export covered, once it has been imported"""
+    with open(os.path.join(out_dir, EXPORT_META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    stop = meta['messages']
+    manifest.mark_done('graph', stop)
+    manifest.mark_done('communicates', stop)
+    # The export left these out, so there is nothing to retract for them
+    manifest.mark_retracted('graph', meta.get('superseded_ids', []))
+    if os.path.exists(os.path.join(out_dir, 'threads.npy')):
+        save_graph_threads(np.load(os.path.join(out_dir, 'threads.npy')))
+    print(f"Graph watermarks set to msg_id {stop}; the transactional loader takes it from here.")
+
+def _write_batch(tx, query, batch):
+    """Managed transaction body: run one UNWIND batch and return its counters"""
+    counters = tx.run(query, batch=batch).consume().counters
+    return counters.nodes_created, counters.relationships_created
+
 class EnronGraphBuilder:
     def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.driver = GraphDatabase.driver(uri, auth=(user, password), max_transaction_retry_time=MAX_RETRY_TIME)
 
     def close(self):
         self.driver.close()
 
-    def build_graph(self, csv_path):
-        print(f"Reading data from {csv_path}...")
+    def _run_batch(self, query, batch):
+        # One session per task: the driver is thread-safe, sessions are not.
+        # execute_write retries transient errors (deadlocks, leader switches, dropped connections).
+        with self.driver.session() as session:
+            return session.execute_write(_write_batch, query, batch)
+
+    def ensure_schema(self):
+        """Create the constraint and indexes the loader and read paths need, then wait for them"""
+        with self.driver.session() as session:
+            for query in SCHEMA_QUERIES:
+                session.run(query).consume()
+            session.run("CALL db.awaitIndexes(300)").consume()
+
+    def profile_queries(self, repeats=3):
+        """Median latency (ms) of the dashboard/analytics read paths on the current graph"""
+        with self.driver.session() as session:
+            sample = session.run("""
+                MATCH (p:Person)-[r:SENT]->() WHERE r.date IS NOT NULL
+                RETURN p.email AS email, r.thread_id AS thread_id, r.date AS date LIMIT 1
+            """).single()
+            if sample is None:
+                return {}
+            params = {'email': sample['email'], 'thread_id': sample['thread_id'],
+                      'date_from': sample['date'], 'date_to': sample['date'] + Duration(days=30)}
+            timings = {}
+            for name, query in PROFILE_QUERIES.items():
+                runs = []
+                for _ in range(repeats):
+                    start_time = time.perf_counter()
+                    session.run(query, **params).consume()
+                    runs.append((time.perf_counter() - start_time) * 1000)
+                timings[name] = round(float(np.median(runs)), 2)
+        return timings
+
+    def _edge_batch(self, corpus_dir, headers, threads, superseded, lo, hi):
+        """Edge rows lo:hi joined with their message headers and thread ids"""
+        return _records(read_edges(corpus_dir, lo, hi, headers=headers, threads=threads, superseded=superseded))
+
+    def build_graph(self, corpus_dir, manifest=None, batch_size=BATCH_SIZE, workers=WORKERS, profile=False):
+        """Load new messages as SENT edges, fold them into the COMMUNICATES edges,
+        then store the per-person graph scores the analytics read.
+
+        profile: also time the read queries before and after the load; all
+        timings are appended to TIMINGS_FILE.
+        """
+        print(f"Reading data from {corpus_dir}...")
         
-        if not os.path.exists(csv_path):
-            print(f"ERROR: File not found at {csv_path}")
+        if not list_parts(corpus_dir):
+            print(f"ERROR: Corpus not found at {corpus_dir}")
             return
-            
-        df = pd.read_csv(csv_path).dropna(subset=['From', 'To'])
-        data_list = df.head(2000).to_dict('records') 
-
-        query = """
-        UNWIND $batch AS row
-        MERGE (s:Person {email: row.From})
-        MERGE (r:Person {email: row.To})
-        CREATE (s)-[:SENT {
-            subject: toString(row.Subject), 
-            date: toString(row.Date),
-            thread_id: toString(row.threadId)
-        }]->(r)
+
+        timings = {}
+        start_time = time.time()
+        self.ensure_schema()
+        timings['schema_s'] = round(time.time() - start_time, 3)
+        if profile:
+            timings['queries_before_ms'] = self.profile_queries()
+
+        start_time = time.time()
+        self.load_sent(corpus_dir, manifest, batch_size, workers)
+        timings['sent_s'] = round(time.time() - start_time, 3)
+        start_time = time.time()
+        self.retract_superseded(manifest, batch_size)
+        timings['retract_s'] = round(time.time() - start_time, 3)
+        start_time = time.time()
+        self.sync_threads(corpus_dir, manifest, batch_size, workers)
+        timings['rethread_s'] = round(time.time() - start_time, 3)
+        start_time = time.time()
+        self.update_communicates(corpus_dir, manifest, batch_size, workers)
+        timings['communicates_s'] = round(time.time() - start_time, 3)
+        start_time = time.time()
+        self.store_graph_scores(corpus_dir)
+        timings['scores_s'] = round(time.time() - start_time, 3)
+
+        if profile:
+            timings['queries_after_ms'] = self.profile_queries()
+            print(f"Query latency (ms) before: {timings['queries_before_ms']} | after: {timings['queries_after_ms']}")
+        record_timings(timings)
+
+    def store_graph_scores(self, corpus_dir):
+        """Write PageRank, betweenness and community from the CSR graph (rebuilt if stale) to the Person nodes"""
+        from csr_graph import load_graph
+        from graph_insights import write_graph_scores
+
+        graph = load_graph(corpus_dir)
+        write_graph_scores(self.driver, graph, BATCH_SIZE)
+        print(f"Stored centrality and communities of {graph.num_nodes} people")
+
+    def load_sent(self, corpus_dir, manifest=None, batch_size=BATCH_SIZE, workers=WORKERS):
+        """Bulk-load the manifest delta into Neo4j.
+
+        Persons are merged first, then SENT edges are written in batches of
+        batch_size edge rows, `workers` transactions at a time. The graph
+        watermark advances as each contiguous prefix of batches commits, so
+        a failed load resumes at the first batch that did not finish.
         """
+        # Only load messages the graph has not seen yet (the manifest delta)
+        start, stop = manifest.delta('graph') if manifest else (0, None)
+        if stop is None:
+            stop = open_corpus(corpus_dir, columns=['msg_id']).num_rows
+        if stop <= start:
+            print("Graph is up to date - no new messages to load.")
+            return
 
-        with self.driver.session() as session:
-            print(f"--- Starting Batch Upload of {len(data_list)} records to Neo4j AuraDB ---")
+        # Only the header columns are read; email bodies stay on disk.
+        # Recipients come pre-split from the edge table written by milestone 1,
+        # which is ordered by msg_id, so the delta is one contiguous row range.
+        headers = ['Subject', 'Date']
+        threads = current_threads(corpus_dir)
+        superseded = manifest.superseded_ids(start, stop) if manifest else corpus_superseded(corpus_dir)
+        edge_ids = open_corpus(corpus_dir, columns=['msg_id'], table='edges').column('msg_id').to_numpy()
+        lo, hi = np.searchsorted(edge_ids, start, 'left'), np.searchsorted(edge_ids, stop, 'left')
+        bounds = list(range(lo, hi, batch_size)) + [hi]
+        batches = list(zip(bounds[:-1], bounds[1:]))
+        print(f"--- Bulk loading {hi - lo} edges from {stop - start} messages "
+              f"({len(batches)} batches of {batch_size}, {workers} workers) ---")
+
+        start_time = time.time()
+        nodes = rels = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # 1. Persons. Each email is in exactly one batch, so concurrent MERGEs never collide.
+            people = read_corpus(corpus_dir, columns=['sender', 'recipient'], rows=(lo, hi), table='edges')
+            emails = pd.unique(pd.concat([people['sender'], people['recipient']]).dropna()).tolist()
+            del people
+            futures = [pool.submit(self._run_batch, PERSON_QUERY, emails[i:i + batch_size])
+                       for i in range(0, len(emails), batch_size)]
+            for future in as_completed(futures):
+                nodes += future.result()[0]
+            print(f"Merged {len(emails)} people ({nodes} new) in {time.time() - start_time:.1f}s")
+
+            # 2. SENT edges, checkpointing the contiguous prefix of committed batches
+            def load(lo_hi):
+                return self._run_batch(SENT_QUERY, self._edge_batch(corpus_dir, headers, threads, superseded, *lo_hi))
+
+            futures = {pool.submit(load, b): i for i, b in enumerate(batches)}
+            done, next_pending, failed = set(), 0, None
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    rels += future.result()[1]
+                except Exception as e:
+                    failed = failed or e
+                    for other in futures:
+                        other.cancel()
+                    continue
+                done.add(i)
+                while next_pending in done:
+                    next_pending += 1
+                if manifest:
+                    # Rows of a message split across batches are replayed on resume (SENT is merged)
+                    checkpoint = stop if next_pending == len(batches) else int(edge_ids[batches[next_pending][0]])
+                    manifest.mark_done('graph', checkpoint)
+                elapsed = time.time() - start_time
+                print(f"  batch {len(done)}/{len(batches)} | {nodes / elapsed:,.0f} nodes/s | "
+                      f"{rels / elapsed:,.0f} rels/s")
+
+        elapsed = time.time() - start_time
+        if failed:
+            print(f"Load stopped after {len(done)} of {len(batches)} batches - rerun to resume.")
+            raise failed
+        print(f"Successfully built the Knowledge Graph in {elapsed:.2f} seconds: "
+              f"{nodes} nodes ({nodes / elapsed:,.0f}/s), {rels} relationships ({rels / elapsed:,.0f}/s).")
+
+        if manifest:
+            manifest.mark_done('graph', stop)
+
+    def retract_superseded(self, manifest, batch_size=BATCH_SIZE):
+        """Delete the SENT edges of loaded messages that were replaced by a newer version.
+
+        Runs before update_communicates. Batches run one at a time because
+        they can decrement the same COMMUNICATES edge.
+        """
+        if manifest is None:
+            return
+        pending = manifest.pending_retractions('graph', manifest.delta('graph')[0])
+        if not pending:
+            return
+        start_time = time.time()
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i + batch_size]
+            self._run_batch(RETRACT_QUERY, batch)
+            manifest.mark_retracted('graph', batch)
+        print(f"Retracted {len(pending)} superseded messages in {time.time() - start_time:.2f}s")
+
+    def sync_threads(self, corpus_dir, manifest=None, batch_size=BATCH_SIZE, workers=WORKERS):
+        """Bring the thread ids of loaded messages in line with the current thread index.
+
+        Changed SENT.thread_id values are rewritten by msg_id, then the
+        thread lists of the affected COMMUNICATES pairs are rebuilt from
+        their SENT edges. Runs before update_communicates.
+        """
+        threads = current_threads(corpus_dir)
+        if manifest is None or threads is None:
+            return
+        loaded = min(manifest.delta('graph')[0], len(threads))
+        changed = changed_threads(threads, loaded)
+        if len(changed):
             start_time = time.time()
-            session.run(query, batch=data_list)
-            end_time = time.time()
-            print(f"Successfully built the Knowledge Graph in {round(end_time - start_time, 2)} seconds.")
+            rows = [{'msg_id': int(m), 'thread': str(int(threads[m])) if threads[m] >= 0 else None} for m in changed]
+            edge_ids = open_corpus(corpus_dir, columns=['msg_id'], table='edges').column('msg_id').to_numpy()
+            edges = open_corpus(corpus_dir, columns=['sender', 'recipient'], table='edges') \
+                .take(np.flatnonzero(np.isin(edge_ids, changed))).to_pandas().dropna()
+            pairs = _records(edges[['sender', 'recipient']].drop_duplicates())
+            # Each message / pair is in exactly one batch, so concurrent batches never write the same edge
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for query, batch in ((RETHREAD_QUERY, rows), (PAIR_THREADS_QUERY, pairs)):
+                    futures = [pool.submit(self._run_batch, query, batch[i:i + batch_size])
+                               for i in range(0, len(batch), batch_size)]
+                    for future in as_completed(futures):
+                        future.result()
+            print(f"Updated thread ids of {len(changed)} messages and {len(pairs)} pairs "
+                  f"in {time.time() - start_time:.2f}s")
+        save_graph_threads(threads[:loaded])
+
+    def update_communicates(self, corpus_dir, manifest=None, batch_size=BATCH_SIZE, workers=WORKERS):
+        """Fold messages already loaded as SENT edges into the per-pair COMMUNICATES edges.
+
+        The delta is aggregated in pandas first, so Neo4j receives one row per
+        pair instead of one per message.
+        """
+        # Only messages whose SENT edges are in the graph; a failed run is retried over the same range
+        loaded = manifest.delta('graph')[0] if manifest else open_corpus(corpus_dir, columns=['msg_id']).num_rows
+        start, stop = manifest.pinned_delta('communicates', loaded) if manifest else (0, loaded)
+        if stop <= start:
+            print("COMMUNICATES edges are up to date.")
+            return
+
+        edge_ids = open_corpus(corpus_dir, columns=['msg_id'], table='edges').column('msg_id').to_numpy()
+        lo, hi = np.searchsorted(edge_ids, start, 'left'), np.searchsorted(edge_ids, stop, 'left')
+        superseded = manifest.superseded_ids(start, stop) if manifest else corpus_superseded(corpus_dir)
+        edges = read_edges(corpus_dir, lo, hi, threads=current_threads(corpus_dir), superseded=superseded)
+
+        start_time = time.time()
+        pairs = _records(aggregate_pairs(edges))
+        print(f"--- Aggregated {len(edges)} edges into {len(pairs)} sender/recipient pairs "
+              f"in {time.time() - start_time:.2f}s ---")
+
+        # Each pair is in exactly one batch, so concurrent batches never write the same edge
+        rels = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._run_batch, COMMUNICATES_QUERY, pairs[i:i + batch_size])
+                       for i in range(0, len(pairs), batch_size)]
+            for future in as_completed(futures):
+                rels += future.result()[1]
+
+        elapsed = time.time() - start_time
+        print(f"Updated {len(pairs)} COMMUNICATES edges ({rels} new) in {elapsed:.2f} seconds.")
+        if manifest:
+            manifest.mark_done('communicates', stop)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the corpus into Neo4j")
+    parser.add_argument('--profile', action='store_true', help="time read queries before and after the load")
+    parser.add_argument('--export', metavar='DIR', help="write neo4j-admin import files instead of loading")
+    parser.add_argument('--mark-imported', metavar='DIR', help="record that an export in DIR was imported")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.export or args.mark_imported:
+        if args.export:
+            export_import_files(path_config.CORPUS_DIR, args.export, args.workers)
+        else:
+            manifest = path_config.open_manifest()
+            mark_imported(args.mark_imported, manifest)
+            manifest.close()
+        sys.exit(0)
+
     # 2. Load credentials securely from .env instead of hardcoding
     URI = os.getenv("NEO4J_URI")
     USER = os.getenv("NEO4J_USER")
@@ -67,13 +614,11 @@ if __name__ == "__main__":
             builder.driver.verify_connectivity()
             print("Authentication Successful!")
             
-            # Get the correct path
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            data_dir = os.path.join(os.path.dirname(script_dir), 'data')
-            csv_path = os.path.join(data_dir, 'processed_emails.csv')
-            
-            print(f"Looking for data at: {csv_path}")
-            builder.build_graph(csv_path)
+            corpus_dir = path_config.CORPUS_DIR
+            print(f"Looking for data at: {corpus_dir}")
+            manifest = path_config.open_manifest()
+            builder.build_graph(corpus_dir, manifest, profile=args.profile)
+            manifest.close()
             builder.close()
             print("\n--- MISSION COMPLETE ---")
             
@@ -1,58 +1,212 @@
 # milestone3_semantic_search.py - FIXED with correct data path
+#
+# Two steps:
+#   python milestone3_semantic_search.py build [--type hnsw|ivf|flat] [--limit N]
+#       embeds the corpus and writes a FAISS index + id map to data/semantic_index
+#   python milestone3_semantic_search.py "query" [--k N] [--sender X] [--recipient X]
+#                                        [--date-from YYYY-MM-DD] [--date-to YYYY-MM-DD] [--nprobe N] [--ef N]
+#       memory-maps the saved index and answers the query
+#
+# For batch evaluation import search() and pass a list of queries: they are
+# encoded in one batch and answered by a single index.search call.
 
-from sentence_transformers import SentenceTransformer
 import path_config  # Auto-added for path configuration
-import faiss
+from embedding_cache import open_cache
+from lexical_index import load_lexical_index
+from query_cache import bump_index_version
+from corpus_store import iter_corpus
+import corpus_store
+import faiss_index
 import numpy as np
 import pandas as pd
+import argparse
 import os
 import sys
+import time
 
 # Fix Windows encoding
 if sys.platform == 'win32':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
-# Get the correct path - data is in parent directory
-script_dir = os.path.dirname(os.path.abspath(__file__))
-data_dir = os.path.join(os.path.dirname(script_dir), 'data')
-csv_path = os.path.join(data_dir, 'processed_emails.csv')
+MODEL_NAME = "all-MiniLM-L6-v2"
+INDEX_DIR = path_config.SEMANTIC_INDEX_DIR
 
-print(f"Loading data from: {csv_path}")
+def build_semantic_index(index_type='hnsw', limit=None, nlist=None):
+    """Embed the corpus (through the embedding cache) and save a FAISS index to disk"""
+    from embedding_engine import EmbeddingEngine
 
-# Check if file exists
-if not os.path.exists(csv_path):
-    print(f"ERROR: File not found at {csv_path}")
-    print(f"Please ensure processed_emails.csv is in: {data_dir}")
-    sys.exit(1)
+    corpus_dir = path_config.CORPUS_DIR
+    print(f"Loading data from: {corpus_dir}")
+    if not os.path.isdir(corpus_dir):
+        print(f"ERROR: Corpus not found at {corpus_dir}")
+        print(f"Please run milestone 1 to create it in: {path_config.DATA_DIR}")
+        sys.exit(1)
 
-# Load processed data
-df = pd.read_csv(csv_path).head(1000)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+    manifest = path_config.open_manifest()
+    superseded = set(manifest.superseded_ids())
+    manifest.close()
 
-# Generate Embeddings
-print("Generating embeddings...")
-embeddings = model.encode(df['Body'].tolist(), show_progress_bar=True)
-index = faiss.IndexFlatL2(embeddings.shape[1])
-index.add(np.array(embeddings))
-print(f"Indexed {len(df)} documents with {embeddings.shape[1]}-dimension vectors\n")
+    with EmbeddingEngine(MODEL_NAME) as engine:
+        cache = open_cache(MODEL_NAME, backend=engine.backend, model=engine.model)
 
-def ask_intelligence_system(query):
+        # Embed part by part so only one part's bodies are in memory at a time
+        print("Generating embeddings...")
+        all_ids, all_vectors, all_senders, all_timestamps = [], [], [], []
+        total = 0
+        for part in iter_corpus(corpus_dir, columns=['msg_id', 'From', 'timestamp', 'Body']):
+            part = part[~part['msg_id'].isin(superseded)]
+            if limit is not None:
+                part = part.head(limit - total)
+            if part.empty:
+                continue
+            all_vectors.append(cache.get_or_compute(part['Body'].tolist(), engine.encode))
+            all_ids.append(part['msg_id'].values)
+            all_senders.append(part['From'].values)
+            all_timestamps.append(part['timestamp'].astype('float64').values)
+            total += len(part)
+            if limit is not None and total >= limit:
+                break
+
+    if not all_vectors:
+        print("ERROR: Corpus is empty - nothing to index")
+        return
+    vectors = faiss_index.normalize(np.vstack(all_vectors))
+    ids = np.concatenate(all_ids)
+
+    print(f"Building {index_type} index over {len(ids)} documents...")
+    start_time = time.time()
+    index = faiss_index.build_index(vectors, index_type, nlist=nlist)
+    meta = faiss_index.save_index(index, ids, INDEX_DIR, index_type, {'model': MODEL_NAME})
+
+    # Sender / recipient / date id sets for filtered search
+    edges = path_config.load_corpus(columns=['msg_id', 'recipient'], table='edges')
+    faiss_index.save_filters(INDEX_DIR, ids, np.concatenate(all_senders),
+                             edges['msg_id'].values, edges['recipient'].values,
+                             np.concatenate(all_timestamps))
+    print(f"Indexed {meta['size']} documents with {meta['dim']}-dimension vectors "
+          f"in {time.time() - start_time:.1f}s -> {INDEX_DIR}")
+
+    # BM25 keyword index over the same corpus, fused with the vector results at query time
+    load_lexical_index(corpus_dir, path_config.LEXICAL_INDEX_DIR, rebuild=True)
+    bump_index_version('semantic index build')
+    print()
+
+# Loaded on first query, not at import
+_state = {}
+
+def _search_state(nprobe=None, ef_search=None):
+    if 'index' not in _state:
+        start_time = time.time()
+        index, ids, meta = faiss_index.load_index(INDEX_DIR)
+        filters = faiss_index.SearchFilters(INDEX_DIR)
+        # Header columns for result rows, memory-mapped; bodies are fetched per hit
+        headers = corpus_store.open_corpus(path_config.CORPUS_DIR, columns=['From', 'To', 'Subject', 'Date'])
+        print(f"Loaded {meta['index_type']} index ({meta['size']} docs) in {(time.time() - start_time)*1000:.0f} ms")
+        from sentence_transformers import SentenceTransformer
+        # Vectors deleted by the uploader since this index was built (see faiss_index.TOMBSTONE)
+        tombstones = int((np.asarray(ids) == faiss_index.TOMBSTONE).sum())
+        _state.update(index=index, ids=ids, meta=meta, filters=filters, headers=headers, tombstones=tombstones,
+                      model=SentenceTransformer(MODEL_NAME))
+    faiss_index.set_search_params(_state['index'], nprobe, ef_search)
+    return _state
+
+def _to_epoch(value):
+    """Epoch seconds for a date filter given as a string, datetime or number"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return pd.Timestamp(value, tz='UTC').timestamp()
+
+def search(queries, k=5, sender=None, recipient=None, date_from=None, date_to=None,
+           nprobe=None, ef_search=None, with_metadata=True):
+    """Top-k semantic search for a batch of queries.
+
+    Filters (sender, recipient, date_from <= Date < date_to) are resolved to
+    index positions from the precomputed id sets and applied inside the
+    index search. Returns one list of hits per query; each hit is a dict
+    with msg_id, score and (with_metadata) From/To/Subject/Date.
+    """
+    if isinstance(queries, str):
+        queries = [queries]
+    state = _search_state(nprobe, ef_search)
+    index = state['index']
+
+    q_emb = faiss_index.normalize(state['model'].encode(list(queries), batch_size=64))
+    selected = state['filters'].select(sender, recipient, _to_epoch(date_from), _to_epoch(date_to))
+
+    if selected is not None and len(selected) == 0:
+        return [[] for _ in queries]
+    search_k = k + (state['tombstones'] if selected is None else 0)
+    result = None
+    if selected is not None and len(selected) <= faiss_index.EXACT_SUBSET_LIMIT:
+        result = faiss_index.subset_search(index, q_emb, selected, search_k)
+    if result is None:
+        params = faiss_index.search_params(index, selected, nprobe, ef_search)
+        result = index.search(q_emb, search_k, params=params) if params else index.search(q_emb, search_k)
+    D, I = faiss_index.drop_tombstones(*result, state['ids'], k)
+
+    valid = I >= 0
+    msg_ids = np.where(valid, np.asarray(state['ids'])[np.where(valid, I, 0)], -1)
+    rows = None
+    if with_metadata and valid.any():
+        # Zero-copy one-row slices: take() on the multi-part table would concatenate whole columns
+        headers = state['headers']
+        rows = [headers.slice(m, 1).to_pylist()[0] for m in msg_ids[valid].tolist()]
+
+    results, cursor = [], 0
+    for qi in range(len(queries)):
+        hits = []
+        for j in range(I.shape[1]):
+            if not valid[qi, j]:
+                continue
+            hit = {'msg_id': int(msg_ids[qi, j]), 'score': float(D[qi, j])}
+            if rows is not None:
+                hit.update(rows[cursor])
+            cursor += 1
+            hits.append(hit)
+        results.append(hits)
+    return results
+
+def ask_intelligence_system(query, nprobe=None, ef_search=None, k=1, **filters):
     print(f"\nSearching for: '{query}'")
-    q_emb = model.encode([query])
-    D, I = index.search(np.array(q_emb), k=1)
-    result = df.iloc[I[0][0]]
+    hits = search([query], k=k, nprobe=nprobe, ef_search=ef_search, **filters)[0]
+    if not hits:
+        print("No match found.")
+        return
     print("\n" + "="*60)
-    print("TOP MATCH FOUND:")
-    print("="*60)
-    print(f"From: {result['From']}")
-    print(f"Subject: {result['Subject']}")
-    print(f"Body: {result['Body'][:200]}...")
+    print("TOP MATCH FOUND:" if k == 1 else f"TOP {len(hits)} MATCHES:")
     print("="*60)
+    for hit in hits:
+        body = path_config.load_corpus(columns=['Body'], rows=(hit['msg_id'], hit['msg_id'] + 1))['Body'].iloc[0]
+        print(f"From: {hit['From']}")
+        print(f"Subject: {hit['Subject']}")
+        print(f"Body: {str(body)[:200]}...")
+        print(f"Score: {hit['score']:.3f}")
+        print("="*60)
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        query = sys.argv[1]
+    if len(sys.argv) > 1 and sys.argv[1] == 'build':
+        parser = argparse.ArgumentParser(description="Build the semantic search index")
+        parser.add_argument('--type', default='hnsw', choices=faiss_index.INDEX_TYPES)
+        parser.add_argument('--limit', type=int, default=None, help="index only the first N messages")
+        parser.add_argument('--nlist', type=int, default=None, help="IVF list count (default ~4*sqrt(n))")
+        args = parser.parse_args(sys.argv[2:])
+        build_semantic_index(args.type, args.limit, args.nlist)
     else:
-        query = input("\nEnter your search query: ")
-    ask_intelligence_system(query)
+        parser = argparse.ArgumentParser(description="Query the semantic search index")
+        parser.add_argument('query', nargs='?')
+        parser.add_argument('--k', type=int, default=1)
+        parser.add_argument('--sender', default=None)
+        parser.add_argument('--recipient', default=None)
+        parser.add_argument('--date-from', default=None)
+        parser.add_argument('--date-to', default=None)
+        parser.add_argument('--nprobe', type=int, default=None)
+        parser.add_argument('--ef', type=int, default=None)
+        args = parser.parse_args()
+
+        if not os.path.exists(os.path.join(INDEX_DIR, faiss_index.INDEX_FILE)):
+            print("No saved index yet - building it first...")
+            build_semantic_index()
+        query = args.query or input("\nEnter your search query: ")
+        ask_intelligence_system(query, args.nprobe, args.ef, k=args.k, sender=args.sender,
+                                recipient=args.recipient, date_from=args.date_from, date_to=args.date_to)
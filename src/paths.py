@@ -29,5 +29,30 @@ def ensure_data_dir():
 PROCESSED_EMAILS_CSV = get_data_path('processed_emails.csv')
 CLEANED_ENRON_JSON = get_data_path('cleaned_enron_emails.json')
 THREADED_EMAILS_JSON = get_data_path('threaded_emails.json')
+CORPUS_DIR = get_data_path('corpus')
+EMBEDDING_CACHE_DIR = get_data_path('embedding_cache')
+SEMANTIC_INDEX_DIR = get_data_path('semantic_index')
+GRAPH_DIR = get_data_path('graph')
+ROLLUPS_DB = get_data_path('rollups.sqlite')
+THREADS_DIR = get_data_path('threads')
+LEXICAL_INDEX_DIR = get_data_path('lexical_index')
+INDEX_VERSION_FILE = get_data_path('index_version.json')
+SEARCH_TIMINGS_FILE = get_data_path('search_timings.jsonl')
+ENTITY_INDEX_DIR = get_data_path('entity_index')
+STARTUP_LOG_FILE = get_data_path('startup_timings.jsonl')
+
+def load_corpus(columns=None, rows=None, table='messages', memory_map=True):
+    """Load the columnar corpus written by milestone 1.
+
+    columns: list of columns to read (the rest are never loaded)
+    rows: optional (start, stop) row range
+    """
+    from corpus_store import read_corpus
+    return read_corpus(CORPUS_DIR, columns=columns, rows=rows, table=table, memory_map=memory_map)
+
+def open_manifest():
+    """Open the ingestion manifest (use .delta(stage) / .mark_done(stage, stop))"""
+    from ingest_manifest import IngestManifest
+    return IngestManifest(os.path.join(CORPUS_DIR, 'manifest.sqlite'))
 
 print(f"📁 Path config loaded - Data directory: {DATA_DIR}")
@@ -0,0 +1,149 @@
+# query_cache.py - IN-PROCESS QUERY CACHES
+"""
+Caches for the interactive search path, shared by every session in the
+process.
+
+    embeddings - LRU of normalized query text -> query embedding, so a repeated
+                 query skips model inference
+    results    - LRU with a time-to-live of (query, top_k, filters, sources) ->
+                 fused matches, so a repeated search skips the vector store
+                 round trip as well
+
+Both are bounded and count hits, misses, evictions and expirations.
+
+Whenever an index is rebuilt or re-uploaded, the writer bumps a version
+stamp file (bump_index_version). Before each lookup the cache checks the
+stamp's mtime, which costs one stat call. If it has moved, both caches
+are cleared, so a cache never serves results from an older index.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+RESULT_CACHE_SIZE = int(os.getenv('QUERY_RESULT_CACHE_SIZE', '512'))
+RESULT_TTL = float(os.getenv('QUERY_RESULT_TTL', '600'))
+
+def normalize_query(query):
+    """Cache key form of a query: lower-cased with whitespace collapsed"""
+    return ' '.join(str(query).lower().split())
+
+def _version_path(path=None):
+    if path is None:
+        import path_config
+        path = path_config.INDEX_VERSION_FILE
+    return path
+
+def index_version(path=None):
+    """Current index version stamp (0 if nothing has been built yet)"""
+    path = _version_path(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('version', 0)
+    except (OSError, ValueError):
+        return 0
+
+def bump_index_version(reason, path=None):
+    """Record that a search index changed; every query cache drops its entries"""
+    path = _version_path(path)
+    stamp = {'version': index_version(path) + 1, 'reason': reason, 'updated_at': time.time()}
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return stamp['version']
+
+class LRUCache:
+    """Thread-safe bounded mapping; entries optionally expire ttl seconds after insertion"""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self.data[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic())
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self.data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'expired': self.expired}
+
+class QueryCache:
+    def __init__(self, embedding_size=EMBEDDING_CACHE_SIZE, result_size=RESULT_CACHE_SIZE,
+                 result_ttl=RESULT_TTL, version_path=None):
+        self.embeddings = LRUCache(embedding_size)
+        self.results = LRUCache(result_size, ttl=result_ttl)
+        self.version_path = _version_path(version_path)
+        self.invalidations = 0
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def check_version(self):
+        """Drop everything if an index was rebuilt since the last check"""
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.embeddings.clear()
+            self.results.clear()
+            self.invalidations += 1
+
+    def embedding(self, query, encode_fn):
+        """Embedding of a query, encoded only on a cache miss"""
+        self.check_version()
+        key = normalize_query(query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = encode_fn(query)
+            self.embeddings.put(key, vector)
+        return vector
+
+    @staticmethod
+    def result_key(query, top_k, filters=None, sources=()):
+        return (normalize_query(query), int(top_k), tuple(sorted((filters or {}).items())), tuple(sources))
+
+    def get_results(self, query, top_k, filters=None, sources=()):
+        """Cached matches for this search, or None (treat the returned list as read-only)"""
+        self.check_version()
+        return self.results.get(self.result_key(query, top_k, filters, sources))
+
+    def put_results(self, query, top_k, matches, filters=None, sources=()):
+        self.results.put(self.result_key(query, top_k, filters, sources), matches)
+
+    def stats(self):
+        return {'embeddings': self.embeddings.stats(), 'results': self.results.stats(),
+                'invalidations': self.invalidations}
@@ -61,6 +61,31 @@ def ensure_data_dir():
 PROCESSED_EMAILS_CSV = get_data_path('processed_emails.csv')
 CLEANED_ENRON_JSON = get_data_path('cleaned_enron_emails.json')
 THREADED_EMAILS_JSON = get_data_path('threaded_emails.json')
+CORPUS_DIR = get_data_path('corpus')
+EMBEDDING_CACHE_DIR = get_data_path('embedding_cache')
+SEMANTIC_INDEX_DIR = get_data_path('semantic_index')
+GRAPH_DIR = get_data_path('graph')
+ROLLUPS_DB = get_data_path('rollups.sqlite')
+THREADS_DIR = get_data_path('threads')
+LEXICAL_INDEX_DIR = get_data_path('lexical_index')
+INDEX_VERSION_FILE = get_data_path('index_version.json')
+SEARCH_TIMINGS_FILE = get_data_path('search_timings.jsonl')
+ENTITY_INDEX_DIR = get_data_path('entity_index')
+STARTUP_LOG_FILE = get_data_path('startup_timings.jsonl')
+
+def load_corpus(columns=None, rows=None, table='messages', memory_map=True):
+    """Load the columnar corpus written by milestone 1.
+
+    columns: list of columns to read (the rest are never loaded)
+    rows: optional (start, stop) row range
+    """
+    from corpus_store import read_corpus
+    return read_corpus(CORPUS_DIR, columns=columns, rows=rows, table=table, memory_map=memory_map)
+
+def open_manifest():
+    """Open the ingestion manifest (use .delta(stage) / .mark_done(stage, stop))"""
+    from ingest_manifest import IngestManifest
+    return IngestManifest(os.path.join(CORPUS_DIR, 'manifest.sqlite'))
 
 print(f"📁 Path config loaded - Data directory: {{DATA_DIR}}")
 ''')
@@ -74,7 +99,7 @@ def print_header(text):
     print(f" {text}")
     print("="*80)
 
-def run_script(script_name, description):
+def run_script(script_name, description, args=None):
     """Run a Python script from src folder"""
     print_header(f"Running: {description}")
     
@@ -94,7 +119,7 @@ def run_script(script_name, description):
         env['PYTHONPATH'] = SRC_DIR + os.pathsep + env.get('PYTHONPATH', '')
         
         # Run the script
-        result = subprocess.run([sys.executable, script_path], 
+        result = subprocess.run([sys.executable, script_path] + (args or []), 
                               capture_output=True, text=True, cwd=SRC_DIR,
                               env=env, encoding='utf-8', errors='replace')
         
@@ -152,11 +177,12 @@ def check_files():
             print(f"❌ cleaned_enron_emails.json not found in {DATA_DIR}")
             all_good = False
         
-        # Check for processed emails
-        csv_path = os.path.join(DATA_DIR, 'processed_emails.csv')
-        if os.path.exists(csv_path):
-            size = os.path.getsize(csv_path) / (1024*1024)
-            print(f"✅ processed_emails.csv ({size:.2f} MB)")
+        # Check for the processed corpus
+        corpus_dir = os.path.join(DATA_DIR, 'corpus')
+        if os.path.exists(corpus_dir):
+            size = sum(os.path.getsize(os.path.join(root, f))
+                       for root, _, files in os.walk(corpus_dir) for f in files) / (1024*1024)
+            print(f"✅ corpus/ ({size:.2f} MB)")
     else:
         print(f"❌ data/ directory not found at: {DATA_DIR}")
         all_good = False
@@ -239,14 +265,14 @@ from milestone1_preprocessing import process_huge_json
 
 # Use paths from config
 input_file = path_config.CLEANED_ENRON_JSON
-output_file = path_config.PROCESSED_EMAILS_CSV
+corpus_dir = path_config.CORPUS_DIR
 
 print(f"Input file: {{input_file}}")
-print(f"Output file: {{output_file}}")
+print(f"Corpus directory: {{corpus_dir}}")
 print(f"Data directory: {{path_config.DATA_DIR}}")
 
 if os.path.exists(input_file):
-    process_huge_json(input_file, output_file)
+    process_huge_json(input_file, corpus_dir)
     print(f"\\n✅ Milestone 1 completed successfully!")
 else:
     print(f"❌ ERROR: Input file not found at {{input_file}}")
@@ -332,7 +358,9 @@ def main():
     
     # Milestone 3
     input("\n👉 Press Enter to start Milestone 3: Local Semantic Search Demo...")
-    run_script('milestone3_semantic_search.py', 'Milestone 3: Semantic Search')
+    run_script('milestone3_semantic_search.py', 'Milestone 3: Build Semantic Index', ['build'])
+    run_script('milestone3_semantic_search.py', 'Milestone 3: Semantic Search',
+               ['natural gas market analysis and trading'])
     
     # Milestone 4
     input("\n👉 Press Enter to start Milestone 4: Pinecone Cloud Upload...")
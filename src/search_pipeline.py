@@ -0,0 +1,226 @@
+# search_pipeline.py - CONCURRENT SEARCH REQUESTS
+"""
+Runs one dashboard search as concurrent stages on thread pools:
+
+    encode -> vector search --+
+    BM25 search --------------+--> rank fusion --> entity --> its neighborhood
+                              |
+                              +--> neighborhood prefetch for the top senders,
+                                   started as soon as either retriever returns
+
+Every backend has a deadline. A backend that misses it is reported in
+errors and the request continues with what has arrived. The graph
+neighborhood of the detected entity is usually already fetched by the
+time fusion finishes, because the senders of the top hits are prefetched
+while ranking is still running. Prefetches run on their own smaller pool,
+so speculative graph queries never hold up retrieval, and the ones that
+have not started by the time the request returns are cancelled.
+
+Each request records its per-stage latency in ms:
+    cache, encode, vector, bm25, fusion, entity, graph_wait, total
+and whether the entity's neighborhood came from a prefetch. The last
+requests are kept in memory (recent()), and every request is appended as
+one JSON line to the timings file.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+VECTOR_DEADLINE = float(os.getenv('SEARCH_VECTOR_DEADLINE', '3.0'))
+LEXICAL_DEADLINE = float(os.getenv('SEARCH_LEXICAL_DEADLINE', '0.5'))
+GRAPH_DEADLINE = float(os.getenv('SEARCH_GRAPH_DEADLINE', '2.0'))
+PREFETCH_SENDERS = int(os.getenv('SEARCH_PREFETCH_SENDERS', '3'))
+WORKERS = int(os.getenv('SEARCH_WORKERS', '8'))
+PREFETCH_WORKERS = int(os.getenv('SEARCH_PREFETCH_WORKERS', '4'))
+HISTORY = 200
+
+class SearchResponse:
+    def __init__(self, matches, errors, entity, neighborhoods, timings, cached=False):
+        self.matches = matches            # fused matches (None if every retriever failed)
+        self.errors = errors              # "backend: reason" strings
+        self.entity = entity              # detected entity email or None
+        self.neighborhoods = neighborhoods  # email -> [(source, target, weight)] fetched in time
+        self.timings = timings            # stage -> ms, plus prefetch_hit / cached flags
+        self.cached = cached
+
+class SearchPipeline:
+    def __init__(self, model=None, vector_stores=(), lexical=None, neighborhood_fn=None, cache=None,
+                 top_k=5, candidates=20, workers=WORKERS, prefetch_workers=PREFETCH_WORKERS, timings_file=None):
+        self.model = model
+        self.vector_stores = list(vector_stores)
+        self.lexical = lexical
+        self.neighborhood_fn = neighborhood_fn
+        self.cache = cache
+        self.top_k = top_k
+        self.candidates = candidates
+        self.timings_file = timings_file
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='search')
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='prefetch')
+        self.history = deque(maxlen=HISTORY)
+        self.lock = threading.Lock()
+
+    def set_backends(self, model=None, vector_stores=(), lexical=None, neighborhood_fn=None):
+        """Swap in the backends that are ready now; the pools and the latency history are kept"""
+        self.model = model
+        self.vector_stores = list(vector_stores)
+        self.lexical = lexical
+        self.neighborhood_fn = neighborhood_fn
+
+    @property
+    def sources(self):
+        names = [store.name for store in self.vector_stores] if self.model else []
+        return names + (['bm25'] if self.lexical is not None else [])
+
+    # --- stages (run on the pools) ---
+    def _vector(self, query, timings):
+        start = time.perf_counter()
+        if self.cache is not None:
+            vector = self.cache.embedding(query, self.model.encode)
+        else:
+            vector = self.model.encode(query)
+        timings['encode'] = (time.perf_counter() - start) * 1000
+
+        start, errors = time.perf_counter(), []
+        top_k = self.candidates if self.lexical is not None else self.top_k
+        try:
+            for store in self.vector_stores:
+                try:
+                    return store.query(vector, top_k=top_k)
+                except Exception as e:
+                    # Backend unreachable: fall through to the next one (local FAISS)
+                    errors.append(f"{store.name}: {e}")
+            raise RuntimeError('; '.join(errors))
+        finally:
+            timings['vector'] = (time.perf_counter() - start) * 1000
+
+    def _bm25(self, query, timings):
+        start = time.perf_counter()
+        try:
+            return self.lexical.query(query, top_k=self.candidates)
+        finally:
+            timings['bm25'] = (time.perf_counter() - start) * 1000
+
+    def _prefetch(self, emails, futures):
+        """Start neighborhood fetches for emails not already requested"""
+        if self.neighborhood_fn is None:
+            return
+        for email in emails:
+            if email and email not in futures:
+                futures[email] = self.prefetch_pool.submit(self.neighborhood_fn, email)
+
+    @staticmethod
+    def _senders(matches, limit=PREFETCH_SENDERS):
+        senders = []
+        for match in matches or []:
+            sender = str((match.get('metadata') or {}).get('From', '')).strip().lower()
+            if sender and sender not in senders:
+                senders.append(sender)
+            if len(senders) >= limit:
+                break
+        return senders
+
+    # --- request ---
+    def run(self, query, entity_fn=None):
+        """Search, detect the entity and fetch its neighborhood, concurrently and within deadlines"""
+        request_start = time.perf_counter()
+        timings, errors, neighborhoods = {}, [], {}
+
+        start = time.perf_counter()
+        sources = self.sources
+        matches = self.cache.get_results(query, self.top_k, sources=sources) if self.cache is not None else None
+        cached = matches is not None
+        timings['cache'] = (time.perf_counter() - start) * 1000
+
+        if not cached:
+            pending = {}
+            if self.model and self.vector_stores:
+                pending[self.pool.submit(self._vector, query, timings)] = ('vector', request_start + VECTOR_DEADLINE)
+            if self.lexical is not None:
+                pending[self.pool.submit(self._bm25, query, timings)] = ('bm25', request_start + LEXICAL_DEADLINE)
+
+            ranked = {}
+            while pending:
+                timeout = max(0.0, min(deadline for _, deadline in pending.values()) - time.perf_counter())
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, _ = pending.pop(future)
+                    try:
+                        ranked[name] = future.result()
+                        # Speculative: the entity is usually one of the top senders
+                        self._prefetch(self._senders(ranked[name]), neighborhoods)
+                    except Exception as e:
+                        errors.append(f"{name}: {e}")
+                now = time.perf_counter()
+                for future, (name, deadline) in list(pending.items()):
+                    if now >= deadline:
+                        future.cancel()
+                        pending.pop(future)
+                        errors.append(f"{name}: no answer within {deadline - request_start:.1f}s")
+
+            from lexical_index import reciprocal_rank_fusion
+            start = time.perf_counter()
+            if 'bm25' in ranked:
+                matches = reciprocal_rank_fusion({'vector': ranked.get('vector', []), 'bm25': ranked['bm25']},
+                                                 top_k=self.top_k)
+            elif 'vector' in ranked:
+                matches = ranked['vector'][:self.top_k]
+            timings['fusion'] = (time.perf_counter() - start) * 1000
+
+            # Only complete answers are cached, never one degraded by a failing or slow backend
+            if self.cache is not None and matches is not None and not errors:
+                self.cache.put_results(query, self.top_k, matches, sources=sources)
+        else:
+            self._prefetch(self._senders(matches), neighborhoods)
+
+        start = time.perf_counter()
+        entity = entity_fn(matches or []) if entity_fn else None
+        timings['entity'] = (time.perf_counter() - start) * 1000
+
+        fetched = {}
+        if entity and self.neighborhood_fn is not None:
+            timings['prefetch_hit'] = entity in neighborhoods
+            self._prefetch([entity], neighborhoods)
+            start = time.perf_counter()
+            wait([neighborhoods[entity]], timeout=GRAPH_DEADLINE)
+            timings['graph_wait'] = (time.perf_counter() - start) * 1000
+            if not neighborhoods[entity].done():
+                errors.append(f"graph: no answer within {GRAPH_DEADLINE:.1f}s")
+        # Keep whatever neighborhoods have arrived; queued ones are cancelled, running ones finish and are dropped
+        for email, future in neighborhoods.items():
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled() and future.exception() is None:
+                fetched[email] = future.result()
+
+        timings['total'] = (time.perf_counter() - request_start) * 1000
+        timings['cached'] = cached
+        # Snapshot: a stage that missed its deadline may still write into the original dict
+        timings = dict(timings)
+        self._record(query, timings, errors)
+        return SearchResponse(matches, errors, entity, fetched, timings, cached)
+
+    # --- latency log ---
+    def _record(self, query, timings, errors):
+        entry = {'time': time.time(), 'query': query, 'errors': errors,
+                 **{k: round(v, 2) if isinstance(v, float) else v for k, v in timings.items()}}
+        with self.lock:
+            self.history.append(entry)
+            if self.timings_file:
+                try:
+                    with open(self.timings_file, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry) + '\n')
+                except OSError:
+                    pass
+
+    def recent(self, n=20):
+        """The last n request timing entries, newest last"""
+        with self.lock:
+            return list(self.history)[-n:]
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.prefetch_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,141 @@
+# startup.py - DASHBOARD COLD START
+"""
+Background start-up of the dashboard's subsystems.
+
+The dashboard draws its page before any heavy work is done. Each subsystem
+is a loader function that runs on its own background thread: the
+embedding model (sentence_transformers / torch), the Pinecone client and
+vector stores, the Neo4j connection check, and the local graph and
+indexes. Heavy packages are imported inside the loaders through
+timed_import, so neither the import nor a slow backend blocks the first
+paint. A loader that needs another subsystem calls startup.wait(name).
+
+Each subsystem moves through these states:
+
+    loading -> ready        loader returned a value
+            -> unavailable  loader returned None (e.g. not configured)
+            -> failed       loader raised
+
+The page reads whatever is ready (snapshot()), so it works with partial
+systems and picks up the rest on a later rerun.
+
+Once every subsystem has settled and the page has marked its first paint,
+one JSON line with the timing breakdown is appended to the startup log:
+first paint, seconds per subsystem, seconds per imported module.
+"""
+
+import os
+import json
+import time
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+PROCESS_START = time.perf_counter()
+FIRST_PAINT = 'first_paint'
+IMPORT_TIMES = {}
+_import_lock = threading.Lock()
+
+def timed_import(name):
+    """importlib.import_module, recording how long the first import took"""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    with _import_lock:
+        # Later calls hit sys.modules; only the first (real) import is kept
+        IMPORT_TIMES.setdefault(name, round(elapsed, 4))
+    return module
+
+class Subsystem:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = 'loading'
+        self.value = None
+        self.error = None
+        self.seconds = None
+        self.done = threading.Event()
+
+class Startup:
+    def __init__(self, loaders, log_file=None):
+        """loaders: ordered {name: fn(startup) -> value or None}"""
+        self.subsystems = {name: Subsystem(name, fn) for name, fn in loaders.items()}
+        self.log_file = log_file
+        self.marks = {}
+        self.started_at = time.time()
+        self.pool = ThreadPoolExecutor(max_workers=max(len(loaders), 1), thread_name_prefix='startup')
+        self._logged = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        for subsystem in self.subsystems.values():
+            self.pool.submit(self._run, subsystem)
+        return self
+
+    def _run(self, subsystem):
+        start = time.perf_counter()
+        try:
+            subsystem.value = subsystem.loader(self)
+            subsystem.state = 'ready' if subsystem.value is not None else 'unavailable'
+        except Exception as e:
+            subsystem.state, subsystem.error = 'failed', f"{type(e).__name__}: {e}"
+        subsystem.seconds = time.perf_counter() - start
+        subsystem.done.set()
+        self._maybe_log()
+
+    # --- reading ---
+    def wait(self, name, timeout=None):
+        """Value of a subsystem once it has settled (None if unavailable, failed or still loading at timeout)"""
+        subsystem = self.subsystems[name]
+        subsystem.done.wait(timeout)
+        return subsystem.value
+
+    def get(self, name):
+        """Value of a subsystem if it is ready now, else None"""
+        return self.subsystems[name].value
+
+    def snapshot(self):
+        return {name: subsystem.value for name, subsystem in self.subsystems.items()}
+
+    @property
+    def settled(self):
+        return all(subsystem.done.is_set() for subsystem in self.subsystems.values())
+
+    def ready(self):
+        """Names of the ready subsystems (changes whenever a rerun would see more)"""
+        return tuple(name for name, subsystem in self.subsystems.items() if subsystem.state == 'ready')
+
+    def status(self):
+        """[(name, state, seconds, error)] in loader order"""
+        return [(s.name, s.state, s.seconds, s.error) for s in self.subsystems.values()]
+
+    # --- timing log ---
+    def mark(self, event):
+        """Record the first time an event (e.g. 'first_paint') happened, in seconds since process start"""
+        with self._lock:
+            self.marks.setdefault(event, round(time.perf_counter() - PROCESS_START, 4))
+        self._maybe_log()
+
+    def timings(self):
+        return {'started_at': self.started_at, 'pid': os.getpid(), **self.marks,
+                'total': round(time.perf_counter() - PROCESS_START, 4),
+                'subsystems': {s.name: {'state': s.state, 'seconds': None if s.seconds is None else round(s.seconds, 4),
+                                        **({'error': s.error} if s.error else {})}
+                               for s in self.subsystems.values()},
+                'imports': dict(sorted(IMPORT_TIMES.items(), key=lambda x: -x[1]))}
+
+    def _maybe_log(self):
+        """Write the log once, when every subsystem has settled and the page has painted"""
+        with self._lock:
+            if self._logged or not self.settled or FIRST_PAINT not in self.marks:
+                return
+            self._logged = True
+        entry = self.timings()
+        print(f"Startup settled in {entry['total']:.2f}s: " +
+              ", ".join(f"{name} {info['state']} {info['seconds'] or 0:.2f}s" for name, info in entry['subsystems'].items()))
+        if self.log_file:
+            try:
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except OSError:
+                pass
@@ -0,0 +1,298 @@
+# temporal_rollups.py - MATERIALIZED TIME ROLLUPS
+"""
+Message counts per day / week / month, kept in a small SQLite table.
+
+One row per (grain, scope, key, bucket):
+    grain   - 'day', 'week' (Monday start) or 'month'
+    scope   - 'all'      messages, key ''
+              'sent'     messages sent by key (an email address)
+              'received' messages received by key
+              'pair'     messages from sender to recipient, key 'sender|recipient'
+    bucket  - bucket start, epoch seconds (UTC)
+    count   - number of messages
+
+The table is keyed for range scans on bucket, so a series or a period total
+is one index range read. A second table keeps the first bucket in which
+each person sent or received mail, per grain, so counting newcomers is one
+index lookup too. Rows are added incrementally from the ingest
+manifest delta; the rollup watermark is committed in the same transaction as
+the counts, and messages superseded by a newer version are subtracted once.
+
+Usage:
+    python temporal_rollups.py update          # fold newly ingested messages into the rollups
+    python temporal_rollups.py update --full   # recount from scratch
+"""
+
+import os
+import sys
+import sqlite3
+import numpy as np
+import pandas as pd
+
+GRAINS = ('day', 'week', 'month')
+SCOPES = ('all', 'sent', 'received', 'pair')
+# Scopes whose key is one person
+PEOPLE_SCOPES = ('sent', 'received')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    grain  TEXT NOT NULL,
+    scope  TEXT NOT NULL,
+    key    TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count  INTEGER NOT NULL,
+    PRIMARY KEY (grain, scope, key, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rollups_by_bucket ON rollups (grain, scope, bucket);
+CREATE TABLE IF NOT EXISTS first_seen (
+    grain  TEXT NOT NULL,
+    key    TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    PRIMARY KEY (grain, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS first_seen_by_bucket ON first_seen (grain, bucket);
+CREATE TABLE IF NOT EXISTS subtracted (
+    msg_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+DAY = 86400
+
+def bucket_starts(timestamps, grain):
+    """Start of the day / week / month containing each epoch-second timestamp"""
+    ts = np.asarray(timestamps, dtype=np.int64)
+    if grain == 'day':
+        return ts // DAY * DAY
+    if grain == 'week':
+        # 1970-01-01 was a Thursday: shift by 3 days so weeks start on Monday
+        return ((ts // DAY + 3) // 7 * 7 - 3) * DAY
+    if grain == 'month':
+        return ts.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype(np.int64)
+    raise ValueError(f"Unknown grain '{grain}', expected one of {GRAINS}")
+
+def _to_epoch(value):
+    """Epoch seconds for a bound given as a string, datetime or number (None passes through)"""
+    if value is None or isinstance(value, (int, float, np.integer)):
+        return value
+    return int(pd.Timestamp(value, tz='UTC').timestamp())
+
+def rollup_rows(messages, edges, sign=1):
+    """(grain, scope, key, bucket, count) rows for a batch of messages.
+
+    messages: msg_id, From, timestamp (one row per message)
+    edges: msg_id, sender, recipient, timestamp (one row per recipient)
+    """
+    frames = []
+    messages = messages.dropna(subset=['timestamp'])
+    edges = edges.dropna(subset=['timestamp'])
+    sources = [
+        ('all', pd.Series('', index=messages.index), messages['timestamp']),
+        ('sent', messages['From'].astype(str), messages['timestamp']),
+        ('received', edges['recipient'].astype(str), edges['timestamp']),
+        ('pair', edges['sender'].astype(str) + '|' + edges['recipient'].astype(str), edges['timestamp']),
+    ]
+    for grain in GRAINS:
+        for scope, keys, timestamps in sources:
+            if keys.empty:
+                continue
+            df = pd.DataFrame({'key': keys.values, 'bucket': bucket_starts(timestamps.values, grain)})
+            counts = df.groupby(['key', 'bucket'], sort=False).size().reset_index(name='count')
+            counts.insert(0, 'scope', scope)
+            counts.insert(0, 'grain', grain)
+            frames.append(counts)
+    if not frames:
+        return []
+    rows = pd.concat(frames, ignore_index=True)
+    rows['count'] *= sign
+    return list(rows.itertuples(index=False, name=None))
+
+class TemporalRollups:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        if self.conn.execute("SELECT 1 FROM first_seen LIMIT 1").fetchone() is None:
+            # Rollups written before first_seen existed: derive it once
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO first_seen (grain, key, bucket) SELECT grain, key, min(bucket) FROM rollups "
+                    "WHERE scope IN ('sent', 'received') AND count > 0 GROUP BY grain, key")
+
+    def close(self):
+        self.conn.close()
+
+    @property
+    def watermark(self):
+        """Messages below this msg_id are in the rollups"""
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'watermark'").fetchone()
+        return int(row[0]) if row else 0
+
+    # --- maintenance ---
+    def reset(self):
+        """Drop all counts (used after a full corpus rebuild)"""
+        with self.conn:
+            self.conn.execute("DELETE FROM rollups")
+            self.conn.execute("DELETE FROM first_seen")
+            self.conn.execute("DELETE FROM subtracted")
+            self.conn.execute("DELETE FROM state")
+
+    def _apply(self, rows):
+        self.conn.executemany(
+            "INSERT INTO rollups (grain, scope, key, bucket, count) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(grain, scope, key, bucket) DO UPDATE SET count = count + excluded.count",
+            ((g, s, k, int(b), int(c)) for g, s, k, b, c in rows)
+        )
+
+        # First bucket per person: new counts can only move it earlier
+        first, retracted = {}, set()
+        for g, s, k, b, c in rows:
+            if s not in PEOPLE_SCOPES:
+                continue
+            if c > 0:
+                first[(g, k)] = min(int(b), first.get((g, k), int(b)))
+            else:
+                retracted.add((g, k))
+        self.conn.executemany(
+            "INSERT INTO first_seen (grain, key, bucket) VALUES (?, ?, ?) "
+            "ON CONFLICT(grain, key) DO UPDATE SET bucket = min(bucket, excluded.bucket)",
+            ((g, k, b) for (g, k), b in first.items())
+        )
+        # ...while taking messages back out can empty it: look those people up again
+        for g, k in retracted:
+            row = self.conn.execute(
+                "SELECT min(bucket) FROM rollups WHERE grain = ? AND scope IN ('sent', 'received') "
+                "AND key = ? AND count > 0", (g, k)
+            ).fetchone()
+            if row[0] is None:
+                self.conn.execute("DELETE FROM first_seen WHERE grain = ? AND key = ?", (g, k))
+            else:
+                self.conn.execute("UPDATE first_seen SET bucket = ? WHERE grain = ? AND key = ?", (row[0], g, k))
+
+    def update(self, corpus_dir, manifest):
+        """Fold messages ingested since the last update into the rollups.
+
+        Returns the number of messages added.
+        """
+        from corpus_store import read_corpus, open_corpus
+
+        if self.watermark > manifest.watermark:
+            self.reset()  # the corpus was rebuilt from scratch
+        start, stop = self.watermark, manifest.watermark
+        superseded = set(manifest.superseded_ids(0, stop))
+        done = {r[0] for r in self.conn.execute("SELECT msg_id FROM subtracted")}
+        newly_superseded = sorted(superseded - done)
+
+        edge_ids = open_corpus(corpus_dir, columns=['msg_id'], table='edges').column('msg_id').to_numpy()
+
+        def load(lo_id, hi_id):
+            messages = read_corpus(corpus_dir, columns=['msg_id', 'From', 'timestamp'], rows=(lo_id, hi_id))
+            lo, hi = np.searchsorted(edge_ids, lo_id, 'left'), np.searchsorted(edge_ids, hi_id, 'left')
+            edges = read_corpus(corpus_dir, columns=['msg_id', 'sender', 'recipient', 'timestamp'],
+                                rows=(lo, hi), table='edges')
+            return messages, edges
+
+        rows = []
+        if stop > start:
+            messages, edges = load(start, stop)
+            messages = messages[~messages['msg_id'].isin(superseded)]
+            edges = edges[~edges['msg_id'].isin(superseded)]
+            rows += rollup_rows(messages, edges)
+        # Messages counted by an earlier update and replaced since: take them back out
+        for msg_id in (m for m in newly_superseded if m < start):
+            rows += rollup_rows(*load(msg_id, msg_id + 1), sign=-1)
+
+        with self.conn:
+            self._apply(rows)
+            self.conn.executemany("INSERT OR IGNORE INTO subtracted (msg_id) VALUES (?)",
+                                  [(int(m),) for m in newly_superseded])
+            self.conn.execute(
+                "INSERT INTO state (key, value) VALUES ('watermark', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (str(stop),))
+        return max(stop - start, 0)
+
+    # --- queries ---
+    def series(self, grain='day', scope='all', key='', start=None, stop=None, limit=None):
+        """[(bucket_start, count)] for start <= bucket < stop, in time order"""
+        start, stop = _to_epoch(start), _to_epoch(stop)
+        return self.conn.execute(
+            "SELECT bucket, count FROM rollups WHERE grain = ? AND scope = ? AND key = ? "
+            "AND bucket >= ? AND bucket < ? AND count != 0 ORDER BY bucket LIMIT ?",
+            (grain, scope, key, -2**62 if start is None else start, 2**62 if stop is None else stop,
+             -1 if limit is None else int(limit))
+        ).fetchall()
+
+    def total(self, scope='all', key='', start=None, stop=None, grain='day'):
+        """Messages in [start, stop) (bounds are rounded to the grain)"""
+        return sum(count for _, count in self.series(grain, scope, key, start, stop))
+
+    def bounds(self, grain='day'):
+        """(first, last) bucket with any messages, or (None, None)"""
+        return self.conn.execute(
+            "SELECT min(bucket), max(bucket) FROM rollups WHERE grain = ? AND scope = 'all' AND count > 0",
+            (grain,)
+        ).fetchone()
+
+    def active_people(self, grain, bucket):
+        """Distinct people who sent or received mail in one bucket"""
+        return self.conn.execute(
+            "SELECT count(DISTINCT key) FROM rollups WHERE grain = ? AND scope IN ('sent', 'received') "
+            "AND bucket = ? AND count > 0", (grain, int(bucket))
+        ).fetchone()[0]
+
+    def new_people(self, grain, bucket):
+        """People whose first message (sent or received) falls in this bucket"""
+        return self.conn.execute(
+            "SELECT count(*) FROM first_seen WHERE grain = ? AND bucket = ?", (grain, int(bucket))
+        ).fetchone()[0]
+
+    def kpis(self):
+        """Dashboard KPIs relative to the latest month / week in the data"""
+        _, last_month = self.bounds('month')
+        _, last_week = self.bounds('week')
+        if last_month is None:
+            return None
+        month_counts = dict(self.series('month'))
+        previous_month = bucket_starts([last_month - DAY], 'month')[0]
+        current, previous = month_counts.get(last_month, 0), month_counts.get(int(previous_month), 0)
+        return {
+            'total': self.total(grain='month'),
+            'month_change_pct': (current - previous) / previous * 100 if previous else None,
+            'active_people': self.active_people('month', last_month),
+            'new_people_week': self.new_people('week', last_week),
+        }
+
+def open_rollups(path=None):
+    """Open the rollup table (defaults to data/rollups.sqlite)"""
+    if path is None:
+        import path_config
+        path = path_config.ROLLUPS_DB
+    return TemporalRollups(path)
+
+def update_rollups(corpus_dir=None, path=None, full_rebuild=False):
+    """Bring the rollups up to date with the corpus; returns the number of messages added"""
+    from ingest_manifest import IngestManifest
+
+    if corpus_dir is None:
+        import path_config
+        corpus_dir = path_config.CORPUS_DIR
+    rollups = open_rollups(path)
+    manifest = IngestManifest(os.path.join(corpus_dir, 'manifest.sqlite'))
+    try:
+        if full_rebuild:
+            rollups.reset()
+        return rollups.update(corpus_dir, manifest)
+    finally:
+        manifest.close()
+        rollups.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'update':
+        added = update_rollups(full_rebuild='--full' in sys.argv)
+        print(f"Rollups updated: {added} new messages")
+    else:
+        print(__doc__)
@@ -0,0 +1,332 @@
+# thread_index.py - THREAD RECONSTRUCTION
+"""
+Rebuilds conversation threads from the flat message corpus.
+
+Messages are joined with union-find over msg_id, in one pass over the
+corpus. Three kinds of evidence are used:
+
+    1. reply headers      - In-Reply-To / References naming a Message-ID in the corpus
+    2. source thread ids  - a thread_id / threadId column already present in the input
+    3. subject + people   - a Re:/Fw: message joins a conversation on the same subject
+                            (prefixes stripped) that it shares a participant with and
+                            that started no more than THREAD_WINDOW_DAYS before it
+
+A thread's id is the msg_id of its earliest message. Superseded messages
+belong to no thread (-1). The index directory holds:
+
+    message_thread.npy  - thread id per msg_id, memory-mapped for joins by msg_id
+    threads.arrow       - one row per thread, sorted by thread_id: size, subject,
+                          participants, participant_count, first_ts, last_ts
+    meta.json           - corpus size the index was built from
+
+Usage:
+    python thread_index.py build     # (re)build the index from the corpus
+"""
+
+import os
+import re
+import sys
+import json
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+THREAD_WINDOW_DAYS = int(os.getenv('THREAD_WINDOW_DAYS', '30'))
+META_FILE = 'meta.json'
+MESSAGE_THREAD_FILE = 'message_thread.npy'
+THREADS_FILE = 'threads.arrow'
+REPLY_COLUMNS = ('In-Reply-To', 'References')
+SOURCE_THREAD_COLUMNS = ('thread_id', 'threadId')
+
+_PREFIX_RE = re.compile(r'^\s*((re|fw|fwd|aw|sv|wg)\s*(\[\d+\]|\(\d+\))?\s*:\s*)+', re.IGNORECASE)
+_MESSAGE_ID_RE = re.compile(r'<[^<>\s]+>|[^<>\s,]+@[^<>\s,]+')
+
+def normalize_subject(subject):
+    """Subject with reply/forward prefixes, case and extra whitespace removed"""
+    if not isinstance(subject, str):
+        return ''
+    return ' '.join(_PREFIX_RE.sub('', subject).lower().split())
+
+class UnionFind:
+    """Disjoint sets over 0..n-1; the smallest member is always the root"""
+
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, x, y):
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            if rx < ry:
+                self.parent[ry] = rx
+            else:
+                self.parent[rx] = ry
+
+    def union_pairs(self, a, b):
+        for x, y in zip(a.tolist(), b.tolist()):
+            self.union(x, y)
+
+    def roots(self):
+        # Roots are the smallest members, so one ascending pass resolves every row
+        parent = self.parent
+        for i in range(len(parent)):
+            parent[i] = parent[parent[i]]
+        return parent
+
+def reply_pairs(messages):
+    """(row, row) pairs linking a message to the messages its reply headers name"""
+    if 'Message-ID' not in messages.columns:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    ids = messages['Message-ID'].astype('string').str.strip().str.strip('<>')
+    by_id = pd.Series(messages.index.values, index=ids.values)
+    by_id = by_id[by_id.index.notna()]
+    by_id = by_id[~by_id.index.duplicated()]
+
+    a, b = [], []
+    for column in REPLY_COLUMNS:
+        if column not in messages.columns:
+            continue
+        refs = messages[column].astype('string').str.findall(_MESSAGE_ID_RE).explode().dropna()
+        refs = refs.str.strip('<>')
+        targets = by_id.reindex(refs.values).values
+        found = ~pd.isna(targets)
+        a.append(refs.index.values[found])
+        b.append(targets[found])
+    if not a:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(a).astype(np.int64), np.concatenate(b).astype(np.int64)
+
+def source_thread_pairs(messages):
+    """(row, row) pairs linking each message to the first message with the same source thread id"""
+    column = next((c for c in SOURCE_THREAD_COLUMNS if c in messages.columns), None)
+    if column is None:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    tids = messages[column].astype('string').str.strip().replace('', pd.NA).dropna()
+    first = pd.Series(tids.index.values, index=tids.index).groupby(tids.values).transform('first')
+    keep = first.values != first.index.values
+    return first.index.values[keep].astype(np.int64), first.values[keep].astype(np.int64)
+
+def subject_pairs(messages, window_days=THREAD_WINDOW_DAYS):
+    """(row, row) pairs linking reply / forward messages to the conversation they continue.
+
+    Messages on one normalized subject are walked in time order. A message
+    without a Re:/Fw: prefix starts a new conversation, so a recurring
+    subject such as "meeting" or "update" is not one long thread. A prefixed
+    message joins the latest conversation on its subject that it shares a
+    participant with and that started at most window_days before it (the
+    window counts from the conversation's first message, not the previous
+    reply); if there is none it starts a conversation of its own.
+    """
+    if 'Subject' not in messages.columns:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    raw = messages['Subject']
+    df = pd.DataFrame({
+        'row': messages.index.values,
+        'subject': raw.map(normalize_subject).values,
+        'prefixed': raw.map(lambda s: isinstance(s, str) and _PREFIX_RE.match(s) is not None).values,
+        'people': (messages['From'].astype('string') + ', ' + messages['To'].astype('string').fillna('')).values,
+        'ts': messages['timestamp'].astype('float64').values,
+    })
+    df = df[df['subject'] != '']
+    # Only subjects with a reply or forward can produce links
+    df = df[df['subject'].isin(df.loc[df['prefixed'], 'subject'].unique())]
+    df = df.sort_values(['subject', 'ts', 'row'], kind='stable')
+
+    window = window_days * 86400
+    a, b = [], []
+    subject, conversations = None, deque()
+    for row, subj, prefixed, people, ts in df[['row', 'subject', 'prefixed', 'people', 'ts']].itertuples(index=False):
+        if subj != subject:
+            subject, conversations = subj, deque()
+        # Conversations are in start order; those started before the window can take no more replies.
+        # Undated messages sort last and are only matched by subject and participants.
+        dated = not np.isnan(ts)
+        while dated and conversations and conversations[0][0] < ts - window:
+            conversations.popleft()
+        people = {p.strip() for p in people.split(',') if p.strip()} if isinstance(people, str) else set()
+        joined = None
+        if prefixed:
+            joined = next((c for c in reversed(conversations) if c[1] & people), None)
+        if joined is None:
+            conversations.append((ts, people, row))
+        else:
+            joined[1].update(people)
+            a.append(row)
+            b.append(joined[2])
+    return np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+
+THREAD_SCHEMA = pa.schema([
+    ('thread_id', pa.int64()), ('size', pa.int64()), ('first_ts', pa.float64()), ('last_ts', pa.float64()),
+    ('subject', pa.string()), ('participants', pa.list_(pa.string())), ('participant_count', pa.int64())])
+
+def thread_table(messages, thread_of):
+    """One row per thread (an Arrow table sorted by thread_id) from the messages and their thread ids"""
+    member = thread_of >= 0
+    df = pd.DataFrame({
+        'thread_id': thread_of[member],
+        'msg_id': messages.index.values[member],
+        'ts': messages['timestamp'].astype('float64').values[member],
+    })
+    table = df.groupby('thread_id').agg(size=('msg_id', 'size'), first_ts=('ts', 'min'), last_ts=('ts', 'max'))
+    subjects = messages['Subject'] if 'Subject' in messages.columns else pd.Series('', index=messages.index)
+
+    # Distinct participants per thread as one flat sorted array plus offsets (an Arrow list column)
+    people = (messages['From'].astype('string') + ', ' + messages['To'].astype('string').fillna(''))[member]
+    exploded = pd.DataFrame({'thread_id': df['thread_id'].values,
+                             'person': people.str.split(r',\s*').values}).explode('person')
+    exploded = exploded[exploded['person'].notna() & (exploded['person'] != '')].drop_duplicates()
+    exploded = exploded.sort_values(['thread_id', 'person'], kind='stable')
+    counts = exploded.groupby('thread_id').size().reindex(table.index, fill_value=0).values
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+    participants = pa.ListArray.from_arrays(pa.array(offsets), pa.array(exploded['person'].values, pa.string()))
+
+    return pa.Table.from_arrays([
+        pa.array(table.index.values, pa.int64()),
+        pa.array(table['size'].values, pa.int64()),
+        pa.array(table['first_ts'].values, pa.float64()),
+        pa.array(table['last_ts'].values, pa.float64()),
+        pa.array(subjects.reindex(table.index).astype('string').fillna('').values, pa.string()),
+        participants,
+        pa.array(counts, pa.int64()),
+    ], schema=THREAD_SCHEMA)
+
+def build_threads(corpus_dir, superseded=(), window_days=THREAD_WINDOW_DAYS):
+    """(thread id per msg_id, thread table) for the whole corpus"""
+    from corpus_store import read_corpus, corpus_columns
+
+    available = corpus_columns(corpus_dir)
+    wanted = ['msg_id', 'From', 'To', 'Subject', 'timestamp', 'Message-ID', *REPLY_COLUMNS, *SOURCE_THREAD_COLUMNS]
+    messages = read_corpus(corpus_dir, columns=[c for c in wanted if c in available]).set_index('msg_id')
+    live = ~messages.index.isin(list(superseded))
+
+    uf = UnionFind(len(messages))
+    for a, b in (reply_pairs(messages[live]), source_thread_pairs(messages[live]),
+                 subject_pairs(messages[live], window_days)):
+        uf.union_pairs(a, b)
+    thread_of = np.where(live, uf.roots(), -1).astype(np.int64)
+    return thread_of, thread_table(messages, thread_of)
+
+class ThreadIndex:
+    """Thread id per message plus the per-thread aggregates, memory-mapped"""
+
+    def __init__(self, message_thread, threads, meta=None):
+        self.message_thread = message_thread
+        self.threads = threads
+        self.meta = meta or {}
+        self._ids = threads.column('thread_id').to_numpy()
+
+    @property
+    def num_threads(self):
+        return self.threads.num_rows
+
+    def thread_of(self, msg_ids):
+        """Thread id of each msg_id (-1 if unknown or superseded)"""
+        msg_ids = np.asarray(msg_ids, dtype=np.int64)
+        known = (msg_ids >= 0) & (msg_ids < len(self.message_thread))
+        return np.where(known, self.message_thread[np.where(known, msg_ids, 0)], -1)
+
+    def lookup(self, thread_ids):
+        """{thread_id: row dict} for the given threads (unknown ids are left out)"""
+        thread_ids = np.unique(np.asarray(thread_ids, dtype=np.int64))
+        pos = np.searchsorted(self._ids, thread_ids)
+        inside = pos < len(self._ids)
+        pos, thread_ids = pos[inside], thread_ids[inside]
+        found = pos[self._ids[pos] == thread_ids]
+        rows = self.threads.take(pa.array(found)).to_pylist()
+        return {row['thread_id']: row for row in rows}
+
+    def for_message(self, msg_id):
+        """Thread row of one message, or None"""
+        tid = int(self.thread_of([msg_id])[0])
+        return self.lookup([tid]).get(tid) if tid >= 0 else None
+
+    def save(self, threads_dir):
+        os.makedirs(threads_dir, exist_ok=True)
+        # Replace files instead of overwriting them: readers may still have the old ones memory-mapped
+        path = os.path.join(threads_dir, MESSAGE_THREAD_FILE)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, self.message_thread)
+        os.replace(path + '.tmp', path)
+        path = os.path.join(threads_dir, THREADS_FILE)
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, self.threads.schema) as writer:
+                writer.write_table(self.threads)
+        os.replace(path + '.tmp', path)
+        path = os.path.join(threads_dir, META_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(dict(self.meta, threads=self.num_threads), f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, threads_dir, mmap=True):
+        with open(os.path.join(threads_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        message_thread = np.load(os.path.join(threads_dir, MESSAGE_THREAD_FILE), mmap_mode='r' if mmap else None)
+        path = os.path.join(threads_dir, THREADS_FILE)
+        source = pa.memory_map(path, 'r') if mmap else pa.OSFile(path, 'rb')
+        return cls(message_thread, pa.ipc.open_file(source).read_all(), meta)
+
+    @classmethod
+    def from_corpus(cls, corpus_dir, superseded=(), window_days=THREAD_WINDOW_DAYS):
+        from corpus_store import corpus_num_rows
+
+        thread_of, threads = build_threads(corpus_dir, superseded, window_days)
+        meta = {'messages': corpus_num_rows(corpus_dir), 'superseded': len(superseded),
+                'window_days': window_days, 'built_at': time.time()}
+        return cls(thread_of, threads, meta)
+
+def message_threads(threads_dir=None):
+    """Memory-mapped thread id per msg_id, or None if the index has not been built"""
+    if threads_dir is None:
+        import path_config
+        threads_dir = path_config.THREADS_DIR
+    path = os.path.join(threads_dir, MESSAGE_THREAD_FILE)
+    return np.load(path, mmap_mode='r') if os.path.exists(path) else None
+
+def load_threads(corpus_dir=None, threads_dir=None, rebuild=False):
+    """Memory-map the thread index, rebuilding it first if the corpus has changed since"""
+    from corpus_store import corpus_num_rows
+    from ingest_manifest import IngestManifest
+
+    if corpus_dir is None or threads_dir is None:
+        import path_config
+        corpus_dir = corpus_dir or path_config.CORPUS_DIR
+        threads_dir = threads_dir or path_config.THREADS_DIR
+
+    manifest_path = os.path.join(corpus_dir, 'manifest.sqlite')
+    superseded = []
+    if os.path.exists(manifest_path):
+        manifest = IngestManifest(manifest_path)
+        superseded = manifest.superseded_ids()
+        manifest.close()
+
+    if not rebuild and os.path.exists(os.path.join(threads_dir, META_FILE)):
+        index = ThreadIndex.load(threads_dir)
+        if index.meta.get('messages') == corpus_num_rows(corpus_dir) \
+                and index.meta.get('superseded') == len(superseded):
+            return index
+
+    start_time = time.time()
+    index = ThreadIndex.from_corpus(corpus_dir, superseded)
+    index.save(threads_dir)
+    sizes = index.threads.column('size').to_numpy()
+    print(f"Built thread index: {index.num_threads} threads from {len(index.message_thread)} messages "
+          f"({int((sizes > 1).sum())} with replies, largest {int(sizes.max()) if len(sizes) else 0}) "
+          f"in {time.time() - start_time:.2f}s -> {threads_dir}")
+    return ThreadIndex.load(threads_dir)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'build':
+        load_threads(rebuild=True)
+    else:
+        print(__doc__)
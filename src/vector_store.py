@@ -0,0 +1,280 @@
+# vector_store.py - PLUGGABLE VECTOR STORE BACKENDS
+"""
+One interface for vector search, used by the uploader (m4) and the dashboard.
+
+Backends:
+    pinecone - the managed "enron-enterprise-kg" index (network round trip)
+    faiss    - the local memory-mapped index built by milestone 3 (no network)
+
+Both return matches in the same shape, with the same metadata schema:
+    {'id': str, 'score': float, 'metadata': {From, To, Subject, Date, text,
+                                             email_id, msg_id, cluster_id, cluster_size}}
+
+Pick a backend with VECTOR_BACKEND=pinecone|faiss (default pinecone).
+
+Usage:
+    python vector_store.py bench "query" [repeats]   # latency of both backends side by side
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+PINECONE_INDEX = "enron-enterprise-kg"
+DEFAULT_BACKEND = os.getenv('VECTOR_BACKEND', 'pinecone')
+METADATA_FIELDS = ('From', 'To', 'Subject', 'Date', 'text', 'email_id', 'msg_id', 'cluster_id', 'cluster_size')
+# Same body excerpt length as the BM25 matches (lexical_index.TEXT_LIMIT)
+TEXT_LIMIT = 1000
+
+def vector_id(msg_id):
+    """Vector id of a message: its msg_id, the same in every run and every backend"""
+    return str(int(msg_id))
+
+def make_metadata(row, email_id):
+    """Metadata stored with each vector, identical for every backend"""
+    return {
+        'From': str(row.get('From', ''))[:100],
+        'To': str(row.get('To', ''))[:100],
+        'Subject': str(row.get('Subject', ''))[:100],
+        'Date': str(row.get('Date', ''))[:50],
+        'text': str(row.get('Body', ''))[:TEXT_LIMIT],
+        'email_id': email_id,
+        'msg_id': int(row['msg_id']),
+        'cluster_id': int(row.get('cluster_id', row['msg_id'])),
+        'cluster_size': int(row.get('cluster_size', 1)),
+    }
+
+class VectorStore:
+    """Interface shared by all backends"""
+    name = 'base'
+
+    def upsert(self, ids, vectors, metadatas):
+        """Insert or replace vectors with their metadata"""
+        raise NotImplementedError
+
+    def delete(self, ids):
+        """Remove vectors by id (ids that are not stored are ignored)"""
+        raise NotImplementedError
+
+    def query(self, vector, top_k=5, filter=None):
+        """Top-k matches for one query vector.
+
+        filter: optional dict with any of From, To, date_from, date_to
+        """
+        raise NotImplementedError
+
+class PineconeStore(VectorStore):
+    name = 'pinecone'
+
+    def __init__(self, index_name=PINECONE_INDEX, api_key=None, client=None):
+        if client is None:
+            from pinecone import Pinecone
+            client = Pinecone(api_key=api_key or os.environ['PINECONE_API_KEY'])
+        self.client = client
+        self.index_name = index_name
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self.client.Index(self.index_name)
+        return self._index
+
+    def create_index_if_not_exists(self, dimension=384):
+        """Create the serverless index if it doesn't exist"""
+        from pinecone import ServerlessSpec
+
+        indexes = self.client.list_indexes().names()
+        print(f"Existing indexes: {indexes}")
+        if self.index_name not in indexes:
+            print(f"Creating new index: {self.index_name}")
+            self.client.create_index(
+                name=self.index_name,
+                dimension=dimension,
+                metric='cosine',
+                spec=ServerlessSpec(cloud='aws', region='us-east-1')
+            )
+            print("Waiting for index to initialize...")
+            time.sleep(15)
+            print("✅ Index created successfully!")
+        else:
+            print(f"ℹ️ Index '{self.index_name}' already exists")
+
+    def upsert(self, ids, vectors, metadatas, batch_size=100):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for i in range(0, len(ids), batch_size):
+            self.index.upsert(vectors=[
+                {'id': str(vid), 'values': vec.tolist(), 'metadata': meta}
+                for vid, vec, meta in zip(ids[i:i + batch_size], vectors[i:i + batch_size], metadatas[i:i + batch_size])
+            ])
+
+    def delete(self, ids, batch_size=1000):
+        ids = [str(vid) for vid in ids]
+        for i in range(0, len(ids), batch_size):
+            self.index.delete(ids=ids[i:i + batch_size])
+
+    def query(self, vector, top_k=5, filter=None):
+        pinecone_filter = {}
+        if filter:
+            if filter.get('From'):
+                pinecone_filter['From'] = {'$eq': filter['From']}
+            if filter.get('To'):
+                pinecone_filter['To'] = {'$eq': filter['To']}
+        response = self.index.query(vector=np.asarray(vector, dtype=np.float32).tolist(), top_k=top_k,
+                                    include_metadata=True, filter=pinecone_filter or None)
+        return [
+            {'id': m.get('id'), 'score': m.get('score', 0.0), 'metadata': dict(m.get('metadata') or {})}
+            for m in response.get('matches', [])
+        ]
+
+class FaissStore(VectorStore):
+    """Local backend over the memory-mapped index from milestone 3.
+
+    Metadata is read from the corpus by msg_id instead of being duplicated
+    next to the vectors. Without a milestone 3 index the store starts empty
+    and the first upsert creates one.
+    """
+    name = 'faiss'
+
+    def __init__(self, index_dir=None, corpus_dir=None):
+        if index_dir is None or corpus_dir is None:
+            import path_config
+            index_dir = index_dir or path_config.SEMANTIC_INDEX_DIR
+            corpus_dir = corpus_dir or path_config.CORPUS_DIR
+        self.index_dir = index_dir
+        self.corpus_dir = corpus_dir
+        self._load()
+
+    def _load(self):
+        import faiss_index
+        import corpus_store
+
+        if os.path.exists(os.path.join(self.index_dir, faiss_index.INDEX_FILE)):
+            self.index, self.ids, self.meta = faiss_index.load_index(self.index_dir)
+            self.filters = faiss_index.SearchFilters(self.index_dir)
+        else:
+            self.index, self.ids, self.meta, self.filters = None, np.empty(0, dtype=np.int64), {}, None
+        self.tombstones = int((np.asarray(self.ids) == faiss_index.TOMBSTONE).sum())
+        self.rows = corpus_store.open_corpus(self.corpus_dir, columns=['From', 'To', 'Subject', 'Date', 'Body'])
+
+    def upsert(self, ids, vectors, metadatas):
+        """Add vectors to the local index, keyed by the msg_id in their metadata"""
+        import faiss_index
+
+        msg_ids = np.array([int(m['msg_id']) for m in metadatas], dtype=np.int64)
+        existing = np.asarray(self.ids)
+        new = ~np.isin(msg_ids, existing)
+        if not new.any():
+            return
+
+        vectors = faiss_index.normalize(np.asarray(vectors)[new])
+        if self.index is None:
+            index_type, params = 'hnsw', {}
+            index = faiss_index.build_index(vectors, index_type)
+        else:
+            # The memory-mapped copy is read-only: load a writable one and append
+            index, _, meta = faiss_index.load_index(self.index_dir, mmap=False)
+            index.add(vectors)
+            index_type = meta['index_type']
+            params = {k: v for k, v in meta.items() if k not in ('index_type', 'size', 'dim', 'built_at')}
+        all_ids = np.concatenate([existing, msg_ids[new]])
+        # Written to temporary files and swapped in, so readers keep a consistent mapped copy
+        faiss_index.save_index(index, all_ids, self.index_dir, index_type, params)
+        self._save_filters(all_ids)
+        self._load()
+
+    def delete(self, ids):
+        """Mark vectors as deleted; milestone 3's next full build drops them from the index"""
+        import faiss_index
+
+        all_ids = np.array(self.ids, dtype=np.int64)
+        deleted = np.isin(all_ids, [int(vid) for vid in ids])
+        if not deleted.any():
+            return
+        all_ids[deleted] = faiss_index.TOMBSTONE
+        faiss_index.save_ids(self.index_dir, all_ids)
+        self._save_filters(all_ids)
+        self._load()
+
+    def _save_filters(self, all_ids):
+        import faiss_index
+        import corpus_store
+
+        headers = corpus_store.read_corpus(self.corpus_dir, columns=['From', 'timestamp'])
+        edges = corpus_store.read_corpus(self.corpus_dir, columns=['msg_id', 'recipient'], table='edges')
+        rows = np.maximum(all_ids, 0)  # tombstones get a placeholder row; save_filters skips them
+        faiss_index.save_filters(self.index_dir, all_ids, headers['From'].values[rows],
+                                 edges['msg_id'].values, edges['recipient'].values,
+                                 headers['timestamp'].astype('float64').values[rows])
+
+    def query(self, vector, top_k=5, filter=None):
+        import faiss_index
+
+        if self.index is None or len(self.ids) == self.tombstones:
+            return []
+        q = faiss_index.normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))
+        filter = filter or {}
+        selected = self.filters.select(filter.get('From'), filter.get('To'),
+                                       filter.get('date_from'), filter.get('date_to'))
+        if selected is not None and len(selected) == 0:
+            return []
+        # The filter id sets already leave out deleted vectors; an unfiltered search skips past them
+        k = top_k + (self.tombstones if selected is None else 0)
+        result = None
+        if selected is not None and len(selected) <= faiss_index.EXACT_SUBSET_LIMIT:
+            result = faiss_index.subset_search(self.index, q, selected, k)
+        if result is None:
+            params = faiss_index.search_params(self.index, selected)
+            result = self.index.search(q, k, params=params) if params else self.index.search(q, k)
+        D, I = faiss_index.drop_tombstones(*result, self.ids, top_k)
+
+        positions = I[0][I[0] >= 0]
+        msg_ids = np.asarray(self.ids)[positions]
+        matches = []
+        for msg_id, score in zip(msg_ids.tolist(), D[0][I[0] >= 0]):
+            # Zero-copy one-row slice: take() on the multi-part table would concatenate whole columns
+            row = {k: v or '' for k, v in self.rows.slice(msg_id, 1).to_pylist()[0].items()}
+            # Duplicate clusters are not kept locally: each message is its own cluster, as in make_metadata
+            metadata = make_metadata(dict(row, msg_id=msg_id), vector_id(msg_id))
+            matches.append({'id': vector_id(msg_id), 'score': float(score), 'metadata': metadata})
+        return matches
+
+def get_vector_store(backend=None, **kwargs):
+    """Create the configured backend (VECTOR_BACKEND env var by default)"""
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend == 'pinecone':
+        return PineconeStore(**kwargs)
+    if backend == 'faiss':
+        return FaissStore(**kwargs)
+    raise ValueError(f"Unknown vector backend '{backend}', expected 'pinecone' or 'faiss'")
+
+def benchmark(query, repeats=20, backends=('pinecone', 'faiss')):
+    """Query latency of each backend for the same query vector"""
+    from sentence_transformers import SentenceTransformer
+    vector = SentenceTransformer('all-MiniLM-L6-v2').encode(query)
+
+    print(f"\nQuery: '{query}' ({repeats} repeats)")
+    print(f"{'backend':<10}{'p50 ms':>10}{'p95 ms':>10}   top hit")
+    for backend in backends:
+        try:
+            store = get_vector_store(backend)
+            store.query(vector, top_k=5)  # warm-up
+        except Exception as e:
+            print(f"{backend:<10}  unavailable: {e}")
+            continue
+        timings = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            matches = store.query(vector, top_k=5)
+            timings.append((time.perf_counter() - start_time) * 1000)
+        top = matches[0]['metadata'].get('Subject', '') if matches else '-'
+        print(f"{backend:<10}{np.percentile(timings, 50):>10.1f}{np.percentile(timings, 95):>10.1f}   {top[:50]}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == 'bench':
+        from dotenv import load_dotenv
+        load_dotenv()
+        benchmark(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 20)
+    else:
+        print(__doc__)
@@ -0,0 +1,56 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from corpus_store import CorpusWriter
+from lexical_index import LexicalIndex, document_tokens, tokenize, K1, B
+
+def brute_force(rows, query):
+    """{msg_id: BM25 score} computed straight from the tokens of every document"""
+    docs = {row['msg_id']: Counter(document_tokens(row)) for row in rows}
+    avgdl = np.mean([sum(tf.values()) for tf in docs.values()])
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(term in tf for tf in docs.values())
+        if not df:
+            continue
+        idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        for msg_id, tf in docs.items():
+            if term in tf:
+                norm = K1 * (1 - B + B * sum(tf.values()) / avgdl)
+                scores[msg_id] = scores.get(msg_id, 0.0) + idf * tf[term] * (K1 + 1) / (tf[term] + norm)
+    return scores
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    """400 messages: 'gas' and 'power' are common, the deal codes are rare"""
+    rng = np.random.default_rng(7)
+    words = ['meeting', 'price', 'contract', 'schedule', 'report', 'desk', 'trade', 'volume']
+    rows = []
+    for i in range(400):
+        body = list(rng.choice(words, 12))
+        if i % 2 == 0:
+            body += ['gas'] * int(rng.integers(1, 4))
+        if i % 3 == 0:
+            body.append('power')
+        if i == 17:
+            body.append('EOL-98765')
+        if i in (40, 41):
+            body.append('ENA-4471')
+        rows.append({'msg_id': i, 'Subject': f'note {i}', 'From': f'user{i % 20}@enron.com',
+                     'To': 'desk@enron.com', 'Body': ' '.join(body)})
+    corpus_dir = tmp_path_factory.mktemp('corpus')
+    CorpusWriter(str(corpus_dir)).write(pd.DataFrame(rows))
+    return rows, LexicalIndex.from_corpus(str(corpus_dir))
+
+@pytest.mark.parametrize('query', ['EOL-98765 gas', 'EOL-98765 gas power', 'ENA-4471 power', 'gas', 'EOL-98765'])
+@pytest.mark.parametrize('k', [1, 3, 10])
+def test_mixed_rare_and_common_terms_match_brute_force(corpus, query, k):
+    rows, index = corpus
+    expected = sorted(brute_force(rows, query).values(), reverse=True)[:k]
+    hits = index.search(query, k)
+    assert len(hits) == len(expected)
+    assert [score for _, score in hits] == pytest.approx(expected, rel=1e-4)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from corpus_store import CorpusWriter
+from thread_index import build_threads
+
+DAY = 86400
+START = 978307200  # 2001-01-01
+
+def threads_of(tmp_path, rows, window_days=30):
+    df = pd.DataFrame(rows)
+    df.insert(0, 'msg_id', np.arange(len(df)))
+    CorpusWriter(str(tmp_path)).write(df)
+    thread_of, table = build_threads(str(tmp_path), window_days=window_days)
+    return thread_of, table
+
+def test_recurring_generic_subject_is_not_one_thread(tmp_path):
+    rows = []
+    for week in range(52):
+        ts = float(START + week * 7 * DAY)
+        rows.append({'From': 'a@enron.com', 'To': 'b@enron.com', 'Subject': 'meeting', 'timestamp': ts})
+        rows.append({'From': 'b@enron.com', 'To': 'a@enron.com', 'Subject': 'RE: meeting', 'timestamp': ts + DAY})
+    thread_of, table = threads_of(tmp_path, rows)
+
+    # Every weekly meeting mail starts its own thread, and its reply joins it
+    assert table.num_rows == 52
+    assert set(table.column('size').to_pylist()) == {2}
+    assert all(thread_of[i] == thread_of[i + 1] for i in range(0, len(rows), 2))
+
+def test_thread_span_is_bounded_by_the_window(tmp_path):
+    # A reply every day for 90 days would chain into one thread if the window ran from the previous reply
+    rows = [{'From': 'a@enron.com', 'To': 'b@enron.com', 'Subject': 'update', 'timestamp': float(START)}]
+    rows += [{'From': 'b@enron.com', 'To': 'a@enron.com', 'Subject': 'Re: update', 'timestamp': float(START + d * DAY)}
+             for d in range(1, 90)]
+    _, table = threads_of(tmp_path, rows, window_days=30)
+
+    spans = np.array(table.column('last_ts').to_pylist()) - np.array(table.column('first_ts').to_pylist())
+    assert table.num_rows > 1
+    assert spans.max() <= 30 * DAY
+
+def test_reply_needs_a_shared_participant(tmp_path):
+    rows = [
+        {'From': 'a@enron.com', 'To': 'b@enron.com', 'Subject': 'gas schedule', 'timestamp': float(START)},
+        {'From': 'c@enron.com', 'To': 'd@enron.com', 'Subject': 'Re: gas schedule', 'timestamp': float(START + DAY)},
+        {'From': 'b@enron.com', 'To': 'a@enron.com', 'Subject': 'Fw: gas schedule', 'timestamp': float(START + DAY)},
+    ]
+    thread_of, _ = threads_of(tmp_path, rows)
+    assert thread_of[2] == thread_of[0]
+    assert thread_of[1] != thread_of[0]
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corpus_store import CorpusWriter
+from vector_store import METADATA_FIELDS, FaissStore, PineconeStore, make_metadata, vector_id
+
+class FakePineconeIndex:
+    """Keeps upserted vectors in memory and answers queries by cosine similarity"""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def upsert(self, vectors):
+        for v in vectors:
+            self.vectors[v['id']] = (np.asarray(v['values']), v['metadata'])
+
+    def query(self, vector, top_k, include_metadata, filter=None):
+        q = np.asarray(vector)
+        scored = sorted(((float(q @ v / np.linalg.norm(q) / np.linalg.norm(v)), vid, meta)
+                         for vid, (v, meta) in self.vectors.items()), reverse=True)[:top_k]
+        return {'matches': [{'id': vid, 'score': score, 'metadata': meta} for score, vid, meta in scored]}
+
+class FakePineconeClient:
+    def __init__(self):
+        self.index = FakePineconeIndex()
+
+    def Index(self, name):
+        return self.index
+
+@pytest.fixture
+def corpus(tmp_path):
+    messages = pd.DataFrame({
+        'msg_id': np.arange(6),
+        'From': [f'sender{i}@enron.com' for i in range(6)],
+        'To': ['desk@enron.com'] * 6,
+        'Subject': [f'subject {i}' for i in range(6)],
+        'Date': ['2001-05-01'] * 6,
+        'Body': [f'body of message {i}' for i in range(6)],
+        'timestamp': np.arange(6, dtype='float64') + 988675200,
+    })
+    edges = pd.DataFrame({'msg_id': np.arange(6), 'sender': messages['From'], 'recipient': messages['To'],
+                          'timestamp': messages['timestamp']})
+    CorpusWriter(str(tmp_path / 'corpus')).write(messages)
+    CorpusWriter(str(tmp_path / 'corpus'), table='edges').write(edges)
+    rng = np.random.default_rng(3)
+    return tmp_path, messages, rng.normal(size=(6, 16)).astype(np.float32)
+
+def test_backends_return_the_same_metadata_schema(corpus):
+    tmp_path, messages, vectors = corpus
+    ids = [vector_id(m) for m in messages['msg_id']]
+    metadatas = [make_metadata(row, vid) for row, vid in zip(messages.to_dict('records'), ids)]
+
+    stores = [PineconeStore(client=FakePineconeClient()),
+              FaissStore(index_dir=str(tmp_path / 'index'), corpus_dir=str(tmp_path / 'corpus'))]
+    results = {}
+    for store in stores:
+        store.upsert(ids, vectors, metadatas)
+        matches = store.query(vectors[2], top_k=3)
+        assert matches and matches[0]['id'] == '2'
+        results[store.name] = matches
+
+    for name, matches in results.items():
+        for match in matches:
+            assert set(match['metadata']) == set(METADATA_FIELDS), name
+    assert results['faiss'][0]['metadata'] == results['pinecone'][0]['metadata']